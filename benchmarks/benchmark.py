@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Assembler throughput benchmarks
+
+# ----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Tuple
+
+import gc
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+
+from argparse import ArgumentParser, Namespace
+
+# the compiler packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "compiler"))
+
+from generator import generate
+
+from packages.lexer import Lexer
+from packages.token import TokenStream, TableTokenStream
+from packages.parser import Parser
+from packages.encoder import Encoder
+from packages.disassembler import Disassembler
+
+
+# ----- classes
+class Source:
+    """Minimal configuration pointing the lexer to the benchmark source"""
+    def __init__(self, filename: str, engine: str = "regex") -> None:
+        self.input_file = filename
+        self.engine = engine
+
+
+# ----- functions
+def measure(function: Callable[[], Any], memory: bool, repeat: int) -> Tuple[Any, float, int]:
+    """Run a phase and return (result, best wall time, peak memory)
+
+    The phase is timed repeat times and the minimum is kept, the other
+    runs are slowed down by the noise of the machine. As with timeit, the
+    garbage collector is paused while timing, its passes depend on the
+    objects left by the previous phases. The time is measured without
+    tracemalloc, which slows allocations down, the phase is run once more
+    when the peak memory is requested.
+    """
+    elapsed = float("inf")
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function()
+            elapsed = min(elapsed, time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    peak = 0
+    if memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return (result, elapsed, peak)
+
+def run(filename: str, memory: bool, repeat: int = 1) -> Dict[str, Dict[str, float]]:
+    """Time each phase of the assembler on a source file, the best of
+    repeat runs"""
+    config = Source(filename)
+    with open(filename, "rb") as fh:
+        lines = sum(1 for _ in fh)
+
+    results: Dict[str, Dict[str, float]] = {}
+    def record(phase: str, elapsed: float, peak: int, tokens: int) -> None:
+        results[phase] = {
+            "seconds": elapsed,
+            "lines_per_sec": lines / elapsed if elapsed else 0.0,
+            "tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+            "peak_bytes": peak,
+        }
+
+    # lexer, each mode on its own
+    tokens, elapsed, peak = measure(lambda: sum(1 for _ in Lexer(config).stream()), memory, repeat)
+    record("lex.stream", elapsed, peak, tokens)
+
+    _, elapsed, peak = measure(lambda: Lexer(config).table(), memory, repeat)
+    record("lex.table", elapsed, peak, tokens)
+
+    # first-character dispatch engine
+    dispatch = Source(filename, "dispatch")
+    _, elapsed, peak = measure(lambda: sum(1 for _ in Lexer(dispatch).stream()), memory, repeat)
+    record("lex.stream.dispatch", elapsed, peak, tokens)
+
+    _, elapsed, peak = measure(lambda: Lexer(dispatch).table(), memory, repeat)
+    record("lex.table.dispatch", elapsed, peak, tokens)
+
+    table, elapsed, peak = measure(lambda: Lexer(config).mapped(), memory, repeat)
+    record("lex.mmap", elapsed, peak, tokens)
+
+    # parser, from the tokens already lexed
+    program, elapsed, peak = measure(lambda: Parser(TableTokenStream(table)).process(), memory, repeat)
+    record("parse.table", elapsed, peak, tokens)
+
+    listed = list(Lexer(config).stream())
+    _, elapsed, peak = measure(lambda: Parser(TokenStream(listed)).process(), memory, repeat)
+    record("parse.list", elapsed, peak, tokens)
+    del listed
+
+    # encoder, from the statements already parsed
+    _, elapsed, peak = measure(lambda: Encoder().process(program.statements), memory, repeat)
+    record("encode", elapsed, peak, tokens)
+
+    # disassembler, from the machine code
+    encoder = Encoder()
+    encoder.process(program.statements)
+    encoder.close()
+    image = b"".join(bytes(view) for _, view in encoder.chunks())
+    words = memoryview(image)[:len(image) & ~3].cast("I")
+    _, elapsed, peak = measure(lambda: sum(len(block) for block in Disassembler().lines(words)), memory, repeat)
+    record("disasm", elapsed, peak, tokens)
+
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Return the phases slower than the baseline by more than the threshold"""
+    regressions: List[str] = []
+    for phase, result in results.items():
+        if phase not in baseline:
+            continue
+
+        reference = baseline[phase]["lines_per_sec"]
+        if reference and result["lines_per_sec"] < reference * (1.0 - threshold):
+            change = (result["lines_per_sec"] / reference - 1.0) * 100
+            regressions.append(f"{phase}: {change:+.1f}% lines/sec")
+
+    return regressions
+
+def report(results: Dict[str, Dict[str, float]], fh=sys.stdout) -> None:
+    """Print the results as a table"""
+    print(f"{'phase':<19} | {'seconds':>9} | {'lines/sec':>12} | {'tokens/sec':>12} | {'peak (KiB)':>11}", file=fh)
+    for phase, result in results.items():
+        print(f"{phase:<19} | {result['seconds']:9.3f} | {result['lines_per_sec']:12,.0f} | "
+              f"{result['tokens_per_sec']:12,.0f} | {result['peak_bytes'] / 1024:11,.0f}", file=fh)
+
+
+# ----- begin
+if __name__ == "__main__":
+
+    argparse = ArgumentParser()
+    argparse.add_argument("-n", "--lines", type=int, default=100_000, help="size of the generated program (1k to 10M)")
+    argparse.add_argument("-s", "--seed", type=int, default=0, help="random seed of the generator")
+    argparse.add_argument("-f", "--file", help="benchmark this file instead of a generated one")
+    argparse.add_argument("-r", "--repeat", type=int, default=5, help="number of runs of each phase, the fastest is kept")
+    argparse.add_argument("-m", "--memory", action="store_true", help="measure the peak memory with tracemalloc")
+    argparse.add_argument("--save-baseline", help="store the results as the new baseline")
+    argparse.add_argument("--baseline", help="compare the results with this baseline")
+    argparse.add_argument("--threshold", type=float, default=0.10, help="slowdown flagged as a regression (0.10 = 10%%)")
+    args = argparse.parse_args()
+    if args.repeat < 1:
+        argparse.error("the number of runs must be at least 1")
+
+    if args.file:
+        results = run(args.file, args.memory, args.repeat)
+    else:
+        fd, filename = tempfile.mkstemp(suffix=".s")
+        os.close(fd)
+        try:
+            generate(filename, args.lines, args.seed)
+            results = run(filename, args.memory, args.repeat)
+        finally:
+            os.unlink(filename)
+
+    report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            json.dump(results, fh, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Synthetic Natoga32 source generator
+
+# ----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, TextIO
+
+import os
+import sys
+import random
+
+from argparse import ArgumentParser
+
+# the compiler packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "compiler"))
+
+from packages.snapshot import architecture
+
+
+# ----- globals
+
+# the architecture shared with the compiler
+isa = architecture()
+REGISTERS, OPCODES, OP_Format = isa.REGISTERS, isa.OPCODES, isa.OP_Format
+
+# opcodes of the load & system instructions
+OPCODE_LOAD = 0b000_0011
+OPCODE_SYSTEM = 0b111_0011
+OPCODE_IMM = 0b001_0011
+
+# number of instructions between two labels (on average)
+LABEL_EVERY = 8
+
+# how far (in labels) a branch can reach
+BRANCH_REACH = 16
+
+
+# ----- classes
+class Generator:
+    """Generate a realistic program using the real opcodes & registers"""
+
+    def __init__(self, seed: int = 0) -> None:
+        """Constructor"""
+        self.random = random.Random(seed)
+        self.registers = sorted(REGISTERS)
+        self.opcodes = sorted(OPCODES)
+        self.labels = 0
+
+    def register(self) -> str:
+        return self.random.choice(self.registers)
+
+    def label(self) -> str:
+        """A label around the current one, backward or forward"""
+        index = self.labels + self.random.randint(-BRANCH_REACH, BRANCH_REACH)
+        return f"L{max(0, index)}"
+
+    def instruction(self) -> str:
+        """Return a random instruction with its operands"""
+        mnemonic = self.random.choice(self.opcodes)
+        spec = OPCODES[mnemonic]
+        kind = spec['type']
+        rnd = self.random
+
+        if kind == OP_Format.TYPE_R:
+            if spec.get('tail', 0) > 0x7f:
+                return f"{mnemonic} {self.register()}, {self.register()}"
+            if spec['opcode'] == OPCODE_IMM:
+                return f"{mnemonic} {self.register()}, {self.register()}, {rnd.randint(0, 31)}"
+            return f"{mnemonic} {self.register()}, {self.register()}, {self.register()}"
+
+        if kind == OP_Format.TYPE_I:
+            if 'funct3' not in spec:
+                return mnemonic
+            if spec['opcode'] == OPCODE_SYSTEM:
+                source = self.register() if spec['funct3'] < 0b100 else rnd.randint(0, 31)
+                return f"{mnemonic} {self.register()}, {rnd.randint(0, 0xfff):#x}, {source}"
+            if spec['opcode'] == OPCODE_LOAD or mnemonic == 'jalr':
+                return f"{mnemonic} {self.register()}, {rnd.randint(-2048, 2047)}({self.register()})"
+            if 'tail' in spec:
+                return f"{mnemonic} {self.register()}, {self.register()}, {rnd.randint(0, 31)}"
+            return f"{mnemonic} {self.register()}, {self.register()}, {rnd.randint(-2048, 2047)}"
+
+        if kind == OP_Format.TYPE_S:
+            return f"{mnemonic} {self.register()}, {rnd.randint(-2048, 2047)}({self.register()})"
+
+        if kind == OP_Format.TYPE_B:
+            return f"{mnemonic} {self.register()}, {self.register()}, {self.label()}"
+
+        if kind == OP_Format.TYPE_U:
+            return f"{mnemonic} {self.register()}, {rnd.randint(0, 0xfffff):#x}"
+
+        return f"{mnemonic} {self.register()}, {self.label()}"
+
+    def write(self, fh: TextIO, lines: int) -> None:
+        """Write a program of (about) the number of lines requested"""
+        rnd = self.random
+        fh.write("; generated Natoga32 program\n.code\n")
+
+        count = 2
+        while count < lines:
+            value = rnd.random()
+            if value < 1 / LABEL_EVERY:
+                fh.write(f"L{self.labels}:\n")
+                self.labels += 1
+            elif value < 0.15:
+                fh.write(f"    ; block {self.labels}\n")
+            elif value < 0.30:
+                fh.write(f"    {self.instruction():<32}; {self.register()} updated\n")
+            else:
+                fh.write(f"    {self.instruction()}\n")
+            count += 1
+
+        # define the labels referenced past the end
+        for index in range(self.labels, self.labels + BRANCH_REACH + 1):
+            fh.write(f"L{index}:\n")
+        fh.write("    ecall\n")
+
+
+# ----- functions
+def generate(filename: str, lines: int, seed: int = 0) -> None:
+    """Generate a program into a file"""
+    with open(filename, "w", buffering=1 << 20) as fh:
+        Generator(seed).write(fh, lines)
+
+
+# ----- begin
+if __name__ == "__main__":
+
+    argparse = ArgumentParser()
+    argparse.add_argument("output", help="file to generate")
+    argparse.add_argument("-n", "--lines", type=int, default=100_000, help="number of lines (1k to 10M)")
+    argparse.add_argument("-s", "--seed", type=int, default=0, help="random seed")
+    args = argparse.parse_args()
+
+    generate(args.output, args.lines, args.seed)
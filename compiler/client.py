@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Natoga32 compiler client (see compiler.py --server)
+
+# ----- imports
+from __future__ import annotations
+
+import os
+import sys
+import socket
+
+from packages import protocol
+
+
+# ----- begin
+if __name__ == "__main__":
+
+    # client.py SOCKET [compiler arguments]
+    if len(sys.argv) < 2:
+        print(f"usage: {os.path.basename(sys.argv[0])} SOCKET [compiler arguments ...]", file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(sys.argv[1])
+            protocol.send(sock, { 'argv': sys.argv[2:], 'cwd': os.getcwd() })
+            response = protocol.receive(sock)
+    except OSError as e:
+        print(f"Error: unable to reach the server [{e}]!", file=sys.stderr)
+        sys.exit(1)
+
+    if response is None:
+        print("Error: the server closed the connection!", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+
+    # write the machine code where the compiler would have
+    if response['output'] is not None:
+        with open(response['path'], "wb") as fh:
+            for offset, data in response['output']:
+                fh.seek(offset)
+                fh.write(data)
+
+    sys.exit(response['status'])
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Natoga32 disassembler
+
+# ----- imports
+from __future__ import annotations
+
+import sys
+
+from argparse import ArgumentParser
+
+from packages.disassembler import Disassembler
+
+
+# ----- begin
+if __name__ == "__main__":
+
+    argparse = ArgumentParser()
+    argparse.add_argument("file", help="binary file to disassemble")
+    argparse.add_argument("-o", "--output", help="output file (default: stdout)")
+    argparse.add_argument("--base", type=lambda v: int(v, 0), default=0, help="address of the first byte of the file")
+    argparse.add_argument("--bulk", action="store_true", help="decode all the words at once with NumPy")
+    args = argparse.parse_args()
+
+    try:
+        lines = Disassembler().file(args.file, args.base, args.bulk)
+        if args.output:
+            with open(args.output, "w", buffering=1 << 16) as fh:
+                fh.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
+    except (OSError, SyntaxError) as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Assembly of source files into modules & final link
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+import gc
+import os
+
+from collections import ChainMap
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+
+from packages.config import Config
+from packages.lexer import Lexer
+from packages.macros import Macros
+from packages.include import load
+from packages.specs import TokenType
+from packages.token import BufferedTokenStream, TableTokenStream, TokenStream
+from packages.parser import Parser
+from packages.encoder import Encoder
+from packages.symbols import Fixup
+from packages.section import Section
+from packages.listing import Listing
+from packages.stats import Phase, Stats, NO_STATS
+
+
+#----- classes
+@dataclass
+class Module:
+    """The result of the assembly of a single source file
+
+    Members:
+        name        : the source file
+        sections    : the encoded sections, the relocatable code starts at address 0
+        symbols     : the labels defined in the module
+        fixed       : the labels defined at absolute addresses (ORG)
+        exports     : the labels visible from the other modules (.global)
+        relocations : the instructions to encode again if the module moves
+        fixups      : the instructions referencing symbols of other modules
+        includes    : the files included by the source file (sources & binaries)
+    """
+    name: str
+    sections: Dict[str, Section]
+    symbols: Dict[str, int]
+    fixed: Set[str]
+    exports: Set[str]
+    relocations: List[Fixup]
+    fixups: List[Fixup]
+    includes: List[str]
+
+
+#----- functions
+def tokenize(config: Config, filename: str, expander: Optional[Macros] = None,
+             phase: Optional[Phase] = None) -> TokenStream:
+    """Create the token stream for a source file, with the macros expanded,
+    the stream lexer adds its time & its tokens to phase if set"""
+    if expander is None:
+        expander = macros(config, filename)
+
+    lexer = Lexer(config, filename)
+    if config.lexer == "stream":
+        return BufferedTokenStream(expander.expand(lexer.stream(phase)))
+
+    table = lexer.table() if config.lexer == "table" else lexer.mapped()
+
+    # the table is only streamed again when it uses macros or includes files
+    include = ".include" if isinstance(table.source, str) else b".include"
+    if TokenType.MACRO in table.types or table.source.find(include) >= 0:   # type: ignore
+        return BufferedTokenStream(expander.expand(table[i].token() for i in range(len(table))))
+
+    return TableTokenStream(table)
+
+def macros(config: Config, filename: str) -> Macros:
+    """Create the macro expander, the files are included from the source directory"""
+    return Macros(config.macro_depth, config.macro_size, headers=partial(load, config),
+                  directory=os.path.dirname(filename))
+
+def job(config: Config, filename: str, listing: Optional[IO[str]] = None,
+        measure: Optional[Stats] = None) -> Tuple[Module, Stats]:
+    """Assemble a single source file and return its statistics (for workers),
+    measured like measure if set, else as configured"""
+    if measure is None:
+        stats = Stats(config.stats_memory, config.profile is not None) if config.stats else NO_STATS
+    else:
+        stats = Stats(measure.memory, measure.profile) if measure else NO_STATS
+    return (assemble(config, filename, stats, listing), stats)
+
+def assemble(config: Config, filename: str, stats: Stats = NO_STATS, listing: Optional[IO[str]] = None) -> Module:
+    """Assemble a single source file, unless it is already in the cache or
+    it is an object file, its statements are written to listing if set"""
+    # deferred import, the object files need the Module class
+    from packages.objfile import ObjectFile, is_object
+
+    if is_object(filename):
+        with stats.phase("load", filename):
+            objfile = ObjectFile(filename)
+            try:
+                return objfile.module()
+            finally:
+                objfile.close()
+
+    # the statements are only known when the source is assembled
+    if config.cache_dir is None or listing is not None:
+        return build(config, filename, stats, listing)
+
+    # deferred import, the cache needs the Module class
+    from packages.cache import Cache
+
+    cache = Cache(config.cache_dir, config.cache_size)
+    key = cache.key(filename)
+    with stats.phase("cache", filename):
+        module = cache.load(key)
+
+    if module is None:
+        module = build(config, filename, stats)
+        cache.store(key, module)
+
+    module.name = filename
+    return module
+
+def build(config: Config, filename: str, stats: Stats = NO_STATS, listing: Optional[IO[str]] = None) -> Module:
+    """Lex, parse & encode a single source file, its statements are written
+    to listing if set"""
+    # the stream lexer runs along with the parser, it measures itself
+    expander = macros(config, filename)
+    streamed = Phase("lex", filename) if stats and config.lexer == "stream" else None
+    if streamed is not None:
+        tokens = tokenize(config, filename, expander, streamed)
+    else:
+        with stats.phase("lex", filename) as phase:
+            tokens = tokenize(config, filename, expander)
+            if isinstance(tokens, TableTokenStream):
+                phase.tokens = tokens.count
+
+    if listing is not None:
+        return listed(filename, tokens, expander, stats, listing, streamed)
+
+    with stats.phase("parse", filename, streamed) as phase:
+        program = Parser(tokens).process()
+        phase.tokens = tokens.pos
+        phase.statements = len(program.statements)
+
+    with stats.phase("encode", filename) as phase:
+        encoder = Encoder(os.path.dirname(filename))
+        encoder.process(program.statements)
+        encoder.close()
+        phase.statements = len(program.statements)
+
+    return result(filename, encoder, expander)
+
+def listed(filename: str, tokens: TokenStream, expander: Macros, stats: Stats, listing: IO[str],
+           streamed: Optional[Phase] = None) -> Module:
+    """Parse & encode the statements one at a time, each one is written to
+    the listing as soon as its bytes are final"""
+    with stats.phase("listing", filename, streamed) as phase:
+        listing.write(f"; {filename}\n")
+        encoder = Encoder(os.path.dirname(filename))
+        encoder.listing = Listing(listing)
+        encoder.process(Parser(tokens).statements())
+        encoder.close()
+        encoder.listing.close()
+        phase.tokens = tokens.pos
+        phase.statements = encoder.listing.count
+
+    return result(filename, encoder, expander)
+
+def result(filename: str, encoder: Encoder, expander: Macros) -> Module:
+    """The module of an encoded source file"""
+
+    fixups = [ fixup for pending in encoder.labels.fixups.values() for fixup in pending ]
+    return Module(filename, encoder.sections, encoder.labels.symbols, encoder.fixed, encoder.exports,
+                  encoder.relocations, fixups, expander.dependencies + encoder.dependencies)
+
+def link(modules: List[Module], stats: Stats = NO_STATS) -> Encoder:
+    """Merge the modules, in order, into a single program"""
+    with stats.phase("link"):
+        return merge(modules)
+
+@contextmanager
+def collector_paused() -> Iterator[None]:
+    """Pause the garbage collector while many acyclic objects are created"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def merge(modules: List[Module]) -> Encoder:
+    """Place the modules one after the other and resolve their references
+
+    The global symbols (.global) of all the modules go in a single index,
+    the other ones stay local to their module. The references of each
+    module are encoded again with its own symbols first, then the global
+    ones.
+    """
+    encoder = Encoder()
+
+    bases: List[int] = []
+    end = 0
+    for module in modules:
+        bases.append(end)
+        end = encoder.place(module.sections, end)
+
+    # the symbols of each module at their final address
+    scopes = [
+        { name: address if name in module.fixed else base + address for name, address in module.symbols.items() }
+        for module, base in zip(modules, bases)
+    ]
+
+    # the index of the global symbols
+    symbols: Dict[str, int] = {}
+    fixed: Set[str] = set()
+    for module, scope in zip(modules, scopes):
+        exported = module.exports & scope.keys()
+        clash = symbols.keys() & exported
+        if clash:
+            raise SyntaxError(f"Error: global label [{min(clash)}] is already defined!")
+
+        symbols.update({ name: scope[name] for name in exported })
+        fixed |= exported & module.fixed
+
+    # encode again what depends on the final addresses, module by module
+    with collector_paused():
+        for module, base, scope in zip(modules, bases, scopes):
+            moved = module.relocations if base else []
+            fixups = [ Fixup(f.address if f.fixed else base + f.address, f.base, f.encode, f.operands, f.fixed)
+                       for f in moved + module.fixups ]
+            if not fixups:
+                continue
+
+            encoder.labels.symbols = ChainMap(scope, symbols)                   # type: ignore
+            encoder.fixed = module.fixed | (fixed - scope.keys())
+            encoder.patch(fixups)
+
+    encoder.labels.symbols = symbols
+    encoder.fixed = fixed
+    encoder.check()
+    return encoder
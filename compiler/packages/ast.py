@@ -59,10 +59,39 @@ class BinaryOp(Expression):
     def __repr__(self) -> str:
         return f"{self.op} {self.left} {self.right}"
 
+class UnaryOp(Expression):
+    """A unary operation on an expression"""
+    def __init__(self, op: str, operand: Expression) -> None:
+        self.op = op
+        self.operand = operand
+
+    def __repr__(self) -> str:
+        return f"{self.op}{self.operand}"
+
+class ExpressionList(Expression):
+    """A list of comma separated expressions"""
+    def __init__(self, items: List[Expression]) -> None:
+        self.items = items
+
+    def __repr__(self) -> str:
+        return ", ".join(map(str, self.items))
+
+class Memory(Expression):
+    """A memory operand: offset(register)"""
+    def __init__(self, offset: Expression, base: str) -> None:
+        self.offset = offset
+        self.base = base
+
+    def __repr__(self) -> str:
+        return f"{self.offset}({self.base})"
+
 # assembly Statements & al
 class Statement(Node):
     """A simple statement"""
-    pass
+
+    # the text of its source line, when it is listed (None when the statement
+    # follows a label on the same line)
+    line: Optional[str] = None
 
 class Directive(Statement):
     """Assembler directive"""
@@ -83,6 +112,15 @@ class Directive(Statement):
 
         return string
 
+    @property
+    def arguments(self) -> List[Expression]:
+        """The list of arguments on the right of the directive"""
+        if self.right is None:
+            return []
+        if isinstance(self.right, ExpressionList):
+            return self.right.items
+        return [self.right]
+
 # custom type for Instruction class
 class Instruction(Statement):
     """Assembly instruction"""
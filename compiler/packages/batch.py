@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Lockstep simulation of many instances of a program (NumPy)
+
+#----- imports
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from packages.disassembler import Disassembler, imm_b, imm_i, imm_j, imm_s
+from packages.simulator import Fault, IMMEDIATE, MASK, SINK, SYS_EXIT, SYS_WRITE, WORD
+
+
+#----- globals
+
+# the pc of the instances that have exited
+DONE = np.iinfo(np.int64).max
+
+# the instances running an instruction: all of them (slice) or their indexes
+Selection = Union[slice, np.ndarray]
+
+# the types of the values
+U32 = np.uint32
+I32 = np.int32
+I64 = np.int64
+U64 = np.uint64
+
+
+#----- functions
+def signed(a: np.ndarray) -> np.ndarray:
+    return a.astype(I32)
+
+def popcount(a: np.ndarray) -> np.ndarray:
+    """The number of bits set in each value"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a).astype(U32)
+
+    a = a - ((a >> U32(1)) & U32(0x55555555))
+    a = (a & U32(0x33333333)) + ((a >> U32(2)) & U32(0x33333333))
+    a = (a + (a >> U32(4))) & U32(0x0f0f0f0f)
+    return (a * U32(0x01010101)) >> U32(24)
+
+def clz(a: np.ndarray) -> np.ndarray:
+    for shift in (1, 2, 4, 8, 16):
+        a = a | (a >> U32(shift))
+    return U32(32) - popcount(a)
+
+def ctz(a: np.ndarray) -> np.ndarray:
+    return popcount((a & (~a + U32(1))) - U32(1))
+
+def div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a, b = signed(a).astype(I64), signed(b).astype(I64)
+    safe = np.where(b == 0, 1, b)
+    quotient = np.abs(a) // np.abs(safe) * np.where((a < 0) != (safe < 0), -1, 1)
+    return np.where(b == 0, -1, quotient).astype(U32)
+
+def rem(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    sa, sb = signed(a).astype(I64), signed(b).astype(I64)
+    safe = np.where(sb == 0, 1, sb)
+    remainder = np.abs(sa) % np.abs(safe) * np.where(sa < 0, -1, 1)
+    return np.where(sb == 0, sa, remainder).astype(U32)
+
+def rotate(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    b = b & U32(31)
+    return (a << b) | (a >> ((U32(32) - b) & U32(31)))
+
+def bit(b: np.ndarray) -> np.ndarray:
+    return U32(1) << (b & U32(31))
+
+
+# vectorized operations on two registers (or a register & an immediate)
+ALU: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    'add': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'sll': lambda a, b: a << (b & U32(31)),
+    'slt': lambda a, b: (signed(a) < signed(b)).astype(U32),
+    'sltu': lambda a, b: (a < b).astype(U32),
+    'xor': lambda a, b: a ^ b,
+    'srl': lambda a, b: a >> (b & U32(31)),
+    'sra': lambda a, b: (signed(a) >> (b & U32(31)).astype(I32)).astype(U32),
+    'or': lambda a, b: a | b,
+    'and': lambda a, b: a & b,
+    'mul': lambda a, b: a * b,
+    'mulh': lambda a, b: ((signed(a).astype(I64) * signed(b).astype(I64)) >> 32).astype(U32),
+    'mulhsu': lambda a, b: ((signed(a).astype(I64) * b.astype(I64)) >> 32).astype(U32),
+    'mulhu': lambda a, b: ((a.astype(U64) * b.astype(U64)) >> U64(32)).astype(U32),
+    'div': div,
+    'divu': lambda a, b: np.where(b == 0, U32(MASK), a // np.where(b == 0, U32(1), b)).astype(U32),
+    'rem': rem,
+    'remu': lambda a, b: np.where(b == 0, a, a % np.where(b == 0, U32(1), b)).astype(U32),
+    'rol': rotate,
+    'ror': lambda a, b: rotate(a, U32(32) - (b & U32(31))),
+    'bclr': lambda a, b: a & ~bit(b),
+    'bext': lambda a, b: (a >> (b & U32(31))) & U32(1),
+    'binv': lambda a, b: a ^ bit(b),
+    'bset': lambda a, b: a | bit(b),
+    'pack': lambda a, b: (a & U32(0xffff)) | ((b & U32(0xffff)) << U32(16)),
+    'packh': lambda a, b: (a & U32(0xff)) | ((b & U32(0xff)) << U32(8)),
+}
+
+# vectorized operations on a single register
+UNARY: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'clz': clz,
+    'ctz': ctz,
+    'cpop': popcount,
+    'rev8': lambda a: a.byteswap(),
+}
+
+# vectorized conditions of the branches
+CONDITIONS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    'beq': lambda a, b: a == b,
+    'bne': lambda a, b: a != b,
+    'blt': lambda a, b: signed(a) < signed(b),
+    'bge': lambda a, b: signed(a) >= signed(b),
+    'bltu': lambda a, b: a < b,
+    'bgeu': lambda a, b: a >= b,
+}
+
+# loads: (size, signed), stores: size
+LOADS = { 'lb': (1, True), 'lh': (2, True), 'lw': (4, False), 'lbu': (1, False), 'lhu': (2, False) }
+STORES = { 'sb': 1, 'sh': 2, 'sw': 4 }
+
+
+#----- classes
+class Batch:
+    """Execute many instances of a program in lockstep
+
+    The registers of the instances are the rows of an N x 33 array (x0 ..
+    x31, then the sink of the writes to x0), each instance has its own pc
+    and its own memory. At each step, the instances at the lowest pc run
+    the instruction found there with vectorized operations, the others
+    wait: the instances that diverge join again when their pcs meet.
+
+    The instructions are decoded once, from the image, into handlers that
+    run on a selection of instances. The code is shared: a store into a
+    decoded instruction fails, a word stored before it is decoded must be
+    the same in all the instances running it.
+
+    Members:
+        regs     : the registers of the instances (N x 33, uint32)
+        pcs      : the pc of each instance, DONE once it has exited
+        memory   : the memory of the instances (N x size, uint8)
+        status   : the exit status of each instance
+        outputs  : the bytes written by each instance
+        steps    : the number of lockstep steps executed
+        executed : the number of instructions executed by all the instances
+    """
+
+    def __init__(self, count: int, size: int) -> None:
+        """Constructor
+
+        Args:
+            count : the number of instances
+            size  : the size of the memory of an instance, in bytes
+        """
+        self.count = count
+        self.size = size
+        self.regs = np.zeros((count, SINK + 1), dtype=U32)
+        self.pcs = np.zeros(count, dtype=I64)
+        self.memory = np.zeros((count, size), dtype=np.uint8)
+        self.status = np.zeros(count, dtype=I64)
+        self.outputs: List[bytearray] = [ bytearray() for _ in range(count) ]
+        self.csrs: Dict[int, np.ndarray] = {}
+        self.steps = 0
+        self.executed = 0
+
+        self.rows = np.arange(count)
+        self.image = bytearray(size)
+        self.cache: List[Optional[Callable[[Selection], None]]] = [ None ] * (size >> 2)
+        self.decoded = np.zeros(size >> 2, dtype=bool)
+        self.written = np.zeros(size >> 2, dtype=bool)
+        self.decoder = Disassembler()
+
+        # the stack starts at the top of the memory
+        self.regs[:, 2] = size & ~0xf
+
+    def load(self, image: bytes, address: int = 0) -> None:
+        """Copy an image in the memory of all the instances"""
+        if address < 0 or address + len(image) > self.size:
+            raise Fault(f"Error: the image doesn't fit in memory at address [{address:#x}]!")
+
+        self.image[address:address + len(image)] = image
+        self.memory[:, address:address + len(image)] = np.frombuffer(image, dtype=np.uint8)
+
+        # the handlers decoded from the words replaced are forgotten
+        first, last = address >> 2, (address + len(image) + 3) >> 2
+        self.cache[first:last] = [ None ] * (last - first)
+        self.decoded[first:last] = False
+        self.written[first:last] = False
+
+    def run(self, steps: Optional[int] = None) -> np.ndarray:
+        """Execute the instances until they all exit
+
+        Args:
+            steps : the maximum number of lockstep steps
+
+        Returns:
+            the exit status of each instance
+        """
+        pcs = self.pcs
+        cache = self.cache
+        count = self.count
+        limit = steps if steps is not None else -1
+
+        while limit:
+            pc = int(pcs.min())
+            if pc == DONE:
+                return self.status
+
+            selection: Selection = np.flatnonzero(pcs == pc)
+            selected = len(selection)
+            if selected == count:
+                selection = slice(None)
+
+            if pc & 3 or not 0 <= pc < self.size:
+                raise Fault(f"Error: invalid pc [{pc:#x}]!")
+            handler = cache[pc >> 2] or self.compile(pc, selection)
+            handler(selection)
+
+            # the faulting instructions are not counted
+            self.executed += selected
+            self.steps += 1
+            limit -= 1
+
+        raise Fault(f"Error: the programs didn't end after {steps} steps!")
+
+    # ----- decoding
+    def compile(self, pc: int, selection: Selection) -> Callable[[Selection], None]:
+        """Decode the instruction at an address into its handler, the
+        instances selected run it"""
+        if self.written[pc >> 2]:
+            words = self.memory[selection, pc:pc + 4]
+            if (words != words[0]).any():
+                raise Fault(f"Error: the instances modified the code differently at address [{pc:#x}]!")
+            self.image[pc:pc + 4] = words[0].tobytes()
+
+        word = WORD.unpack_from(self.image, pc)[0]
+        entry = self.decoder.decode(word)
+        if entry is None:
+            raise Fault(f"Error: illegal instruction [{word:#010x}] at address [{pc:#x}]!")
+
+        handler = self.handler(entry[0], word, pc)
+        self.cache[pc >> 2] = handler
+        self.decoded[pc >> 2] = True
+        return handler
+
+    def handler(self, mnemonic: str, word: int, pc: int) -> Callable[[Selection], None]:
+        """Create the handler of an instruction, its operands are bound"""
+        regs = self.regs
+        pcs = self.pcs
+        following = pc + 4
+
+        rd = ((word >> 7) & 0x1f) or SINK
+        rs1 = (word >> 15) & 0x1f
+        rs2 = (word >> 20) & 0x1f
+
+        if mnemonic in IMMEDIATE:
+            operation = ALU[IMMEDIATE[mnemonic]]
+            imm = U32(imm_i(word) & MASK)
+            def run(selection: Selection) -> None:
+                regs[selection, rd] = operation(regs[selection, rs1], imm)
+                pcs[selection] = following
+            return run
+
+        if mnemonic in ALU:
+            operation = ALU[mnemonic]
+            def run(selection: Selection) -> None:
+                regs[selection, rd] = operation(regs[selection, rs1], regs[selection, rs2])
+                pcs[selection] = following
+            return run
+
+        if mnemonic in UNARY:
+            unary = UNARY[mnemonic]
+            def run(selection: Selection) -> None:
+                regs[selection, rd] = unary(regs[selection, rs1])
+                pcs[selection] = following
+            return run
+
+        if mnemonic in LOADS:
+            size, extend = LOADS[mnemonic]
+            offset = U32(imm_i(word) & MASK)
+            def run(selection: Selection) -> None:
+                rows, addresses = self.addresses(selection, rs1, offset, size, pc)
+                value = np.zeros(len(rows), dtype=U32)
+                for index in range(size):
+                    value |= self.memory[rows, addresses + index].astype(U32) << U32(8 * index)
+                if extend:
+                    value = ((value.astype(I64) ^ (1 << (8 * size - 1))) - (1 << (8 * size - 1))).astype(U32)
+                regs[selection, rd] = value
+                pcs[selection] = following
+            return run
+
+        if mnemonic in STORES:
+            size = STORES[mnemonic]
+            offset = U32(imm_s(word) & MASK)
+            def run(selection: Selection) -> None:
+                rows, addresses = self.addresses(selection, rs1, offset, size, pc)
+                first, last = addresses >> 2, (addresses + size - 1) >> 2
+                if self.decoded[first].any() or self.decoded[last].any():
+                    raise Fault(f"Error: the decoded instructions cannot be modified in batch mode, at address [{pc:#x}]!")
+                self.written[first] = True
+                self.written[last] = True
+                value = regs[selection, rs2]
+                for index in range(size):
+                    self.memory[rows, addresses + index] = (value >> U32(8 * index)).astype(np.uint8)
+                pcs[selection] = following
+            return run
+
+        if mnemonic in CONDITIONS:
+            condition = CONDITIONS[mnemonic]
+            target = pc + imm_b(word)
+            def run(selection: Selection) -> None:
+                taken = condition(regs[selection, rs1], regs[selection, rs2])
+                if taken.any() and (target & 3 or not 0 <= target < self.size):
+                    raise Fault(f"Error: invalid jump to [{target:#x}] at address [{pc:#x}]!")
+                pcs[selection] = np.where(taken, target, following)
+            return run
+
+        if mnemonic == 'jal':
+            target = pc + imm_j(word)
+            if target & 3 or not 0 <= target < self.size:
+                raise Fault(f"Error: invalid jump to [{target:#x}] at address [{pc:#x}]!")
+            def run(selection: Selection) -> None:
+                regs[selection, rd] = following
+                pcs[selection] = target
+            return run
+
+        if mnemonic == 'jalr':
+            offset = U32(imm_i(word) & MASK)
+            def run(selection: Selection) -> None:
+                targets = (regs[selection, rs1] + offset) & U32(MASK - 1)
+                if (targets & U32(3)).any() or (targets >= self.size).any():
+                    raise Fault(f"Error: invalid jump at address [{pc:#x}]!")
+                regs[selection, rd] = following
+                pcs[selection] = targets
+            return run
+
+        if mnemonic in ('lui', 'auipc'):
+            value = word & 0xfffff000
+            if mnemonic == 'auipc':
+                value = (pc + value) & MASK
+            def run(selection: Selection) -> None:
+                regs[selection, rd] = value
+                pcs[selection] = following
+            return run
+
+        if mnemonic.startswith('csr'):
+            return self.csr(mnemonic, word, rd, rs1, following)
+
+        if mnemonic == 'ecall':
+            def run(selection: Selection) -> None:
+                pcs[selection] = following
+                self.ecall(self.rows[selection], pc)
+            return run
+
+        raise Fault(f"Error: unsupported instruction [{mnemonic}] at address [{pc:#x}]!")
+
+    def addresses(self, selection: Selection, rs1: int, offset: np.uint32, size: int, pc: int):
+        """The instances selected and the addresses they access"""
+        addresses = (self.regs[selection, rs1] + offset).astype(I64)
+        if (addresses > self.size - size).any():
+            raise Fault(f"Error: memory access out of memory at pc [{pc:#x}]!")
+
+        return self.rows[selection], addresses
+
+    def csr(self, mnemonic: str, word: int, rd: int, rs1: int, following: int) -> Callable[[Selection], None]:
+        """The handler of a csr instruction, uimm replaces rs1 in the *i forms"""
+        regs = self.regs
+        pcs = self.pcs
+        number = word >> 20
+        immediate = mnemonic.endswith('i')
+        operation = mnemonic[3:5]
+
+        def run(selection: Selection) -> None:
+            values = self.csrs.setdefault(number, np.zeros(self.count, dtype=U32))
+            old = values[selection].copy()
+            source = U32(rs1) if immediate else regs[selection, rs1]
+            if operation == 'rw':
+                values[selection] = source
+            elif rs1:
+                values[selection] = (old | source) if operation == 'rs' else (old & ~source)
+            regs[selection, rd] = old
+            pcs[selection] = following
+        return run
+
+    # ----- system
+    def ecall(self, rows: np.ndarray, pc: int) -> None:
+        """Execute the system calls in a7 of the instances"""
+        regs = self.regs
+        numbers = regs[rows, 17]
+
+        exits = rows[numbers == SYS_EXIT]
+        self.status[exits] = signed(regs[exits, 10])
+        self.pcs[exits] = DONE
+
+        for row in rows[numbers == SYS_WRITE].tolist():
+            address, size = int(regs[row, 11]), int(regs[row, 12])
+            if address + size > self.size:
+                raise Fault(f"Error: write out of memory at address [{address:#x}]!")
+            self.outputs[row] += self.memory[row, address:address + size].tobytes()
+            regs[row, 10] = size
+
+        if not np.isin(numbers, (SYS_EXIT, SYS_WRITE)).all():
+            raise Fault(f"Error: unknown system call at address [{pc:#x}]!")
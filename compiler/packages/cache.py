@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	On-disk cache of the assembled modules
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+import os
+import struct
+import marshal
+import hashlib
+import tempfile
+
+from packages import __version__
+from packages.assembler import Module
+from packages.objfile import ObjectFile, dump
+
+
+#----- globals
+
+# extension of the cache entries
+EXTENSION = ".mod"
+
+# layout of the entries, part of their key & of their header
+FORMAT = b"4"
+
+# the first bytes of an entry, then the size of the digests of the includes
+MAGIC = b"N32C" + FORMAT
+HEADER = struct.Struct(f"<{len(MAGIC)}sI")
+
+# size of the chunks read to hash a file
+CHUNK_SIZE = 1 << 20
+
+
+#----- classes
+class Cache:
+    """Keep the assembled modules on disk, keyed by the hash of their source
+
+    The hashes of the included files are stored along with the module, the
+    entry is ignored when one of them changed.
+
+    The entries are touched each time they are used, so the oldest ones
+    can be evicted first (LRU) when the cache grows over its limit.
+
+    An entry is a header, the digests of the includes (marshal) and the
+    object file of the module: nothing in it is executed when it is
+    loaded. The directory must still be trusted, anyone who can write
+    there chooses the code of the modules linked.
+    """
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        """Constructor
+
+        Args:
+            directory : where the entries are stored
+            max_size  : the maximum size of the cache, in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, filename: str) -> str:
+        """Return the key of a source file (contents + directory + assembler
+        version & entries layout), the relative includes resolve from the
+        directory of the source"""
+        directory = os.path.realpath(os.path.dirname(os.path.abspath(filename)))
+        return digest(filename, b"\0".join([ __version__.encode(), FORMAT, os.fsencode(directory) ]))
+
+    def path(self, key: str) -> str:
+        """Return the path of an entry"""
+        return os.path.join(self.directory, key + EXTENSION)
+
+    def load(self, key: str) -> Optional[Module]:
+        """Return the module stored for this key, if any"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as fh:
+                magic, size = HEADER.unpack(fh.read(HEADER.size))
+                if magic != MAGIC:
+                    return None
+                includes = marshal.loads(fh.read(size))
+        except (OSError, struct.error, EOFError, TypeError, ValueError):
+            return None
+
+        # the included files changed since the module was assembled
+        if not isinstance(includes, dict):
+            return None
+        for filename, key in includes.items():
+            try:
+                if digest(filename) != key:
+                    return None
+            except (OSError, TypeError):
+                return None
+
+        try:
+            objfile = ObjectFile(path, HEADER.size + size)
+        except (OSError, SyntaxError):
+            return None
+        try:
+            module = objfile.module()
+        except (SyntaxError, struct.error, UnicodeDecodeError, EOFError, TypeError, ValueError, IndexError):
+            return None
+        finally:
+            objfile.close()
+
+        # most recently used
+        os.utime(path)
+        return module
+
+    def store(self, key: str, module: Module) -> None:
+        """Store a module, the entry is written atomically"""
+        includes = { filename: digest(filename) for filename in module.includes }
+
+        stored = marshal.dumps(includes)
+        try:
+            blocks = dump(module)
+        except SyntaxError:
+            # the module cannot be stored, it is assembled each time
+            return
+
+        fd, temp = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(HEADER.pack(MAGIC, len(stored)))
+                fh.write(stored)
+                for block in blocks:
+                    fh.write(block)
+            os.replace(temp, self.path(key))
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(EXTENSION):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+#----- functions
+def digest(filename: str, prefix: bytes = b"") -> str:
+    """Return the sha256 of a file contents"""
+    digest = hashlib.sha256(prefix)
+    with open(filename, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
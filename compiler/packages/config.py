@@ -13,7 +13,7 @@
 
 # ----- imports
 from __future__ import annotations
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import os
 
@@ -26,8 +26,21 @@ from dataclasses import dataclass
 @dataclass(init=False)
 class Config():
     """Class for keeping track of the configuration options of the compiler"""
-    input_file: str
+    input_files: List[str]
     output_file: str
+    object_files: List[str]
+    listing: Optional[str]
+    depfile: Optional[str]
+    lexer: str
+    engine: str
+    jobs: int
+    cache_dir: Optional[str]
+    cache_size: int
+    macro_depth: int
+    macro_size: int
+    stats: bool
+    stats_memory: bool
+    profile: Optional[str]
 
     def __init__(self, args: Namespace) -> None:
         """Constructor
@@ -35,11 +48,11 @@ class Config():
         Args:
             args: the Namespace from the command line parser
         """
-        # input file checks
-        if self.is_exist(args.file):
-            self.input_file = args.file
-        else:
-            raise FileNotFoundError("Error: Unable to find the input file!")
+        # input files checks
+        for filename in args.files:
+            if not self.is_exist(filename):
+                raise FileNotFoundError(f"Error: Unable to find the input file [{filename}]!")
+        self.input_files = args.files
 
         # output file checks
         if args.output is None:
@@ -47,6 +60,57 @@ class Config():
         else:
             self.output_file = args.output
 
+        # object files, one per source file
+        self.object_files = []
+        if args.compile:
+            if args.output is not None and len(args.files) > 1:
+                raise ValueError("Error: the output file cannot be set for several object files!")
+            if args.output is not None:
+                self.object_files = [ args.output ]
+            else:
+                self.object_files = [ os.path.splitext(os.path.basename(f))[0] + ".o" for f in args.files ]
+
+        # address, bytes & source of each statement
+        self.listing = args.listing
+
+        # Make rule of the output file, with the included files
+        self.depfile = args.depfile
+
+        # how the tokens are handed to the parser
+        self.lexer = args.lexer
+
+        # how the tokens are matched
+        if args.engine == "dispatch" and args.lexer == "mmap":
+            raise ValueError("Error: the dispatch engine cannot be used with the mmap lexer!")
+        self.engine = args.engine
+
+        # number of files assembled in parallel
+        if args.jobs < 1:
+            raise ValueError("Error: the number of jobs must be at least 1!")
+        self.jobs = args.jobs
+
+        # cache of the assembled modules (size in MiB)
+        self.cache_dir = args.cache_dir
+        if args.cache_size < 0:
+            raise ValueError("Error: the cache size cannot be negative!")
+        self.cache_size = args.cache_size << 20
+
+        # limits of the macro expansions
+        if args.macro_depth < 1 or args.macro_size < 1:
+            raise ValueError("Error: the macro limits must be at least 1!")
+        self.macro_depth = args.macro_depth
+        self.macro_size = args.macro_size
+
+        # instrumentation
+        self.stats = args.stats or args.stats_memory or args.profile is not None
+        self.stats_memory = args.stats_memory
+        self.profile = args.profile
+
+    @property
+    def input_file(self) -> str:
+        """The first input file"""
+        return self.input_files[0]
+
     def is_exist(self, filename: str) -> bool:
         """check if the file exists"""
         return os.path.exists(filename)
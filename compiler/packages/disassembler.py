@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Disassembler of the machine code
+
+#----- imports
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import sys
+import mmap
+
+from array import array
+
+from packages.snapshot import tables, OPCODE_SYSTEM
+
+
+#----- globals
+
+# masks of the constant fields of an instruction
+OPCODE = 0x0000007f
+FUNCT3 = 0x00007000
+FUNCT7 = 0xfe000000
+IMM12 = 0xfff00000
+WHOLE = 0xffffffff
+
+# opcode of the loads, written rd, imm(rs1)
+OPCODE_LOAD = 0b000_0011
+
+# opcode of the immediate operations, their R-type shifts take a shamt
+OPCODE_IMM = 0b001_0011
+
+# ABI name by register number (the first alias that is not xN)
+NAMES: List[str] = [ f"x{i}" for i in range(32) ]
+for _name, _number in reversed(list(tables()['registers'].items())):
+    if not _name.startswith('x'):
+        NAMES[_number] = _name
+
+# number of lines generated at once
+BLOCK = 4096
+
+# an instruction: (mnemonic, operands formatter)
+Entry = Tuple[str, Callable[[int], str]]
+
+
+#----- functions
+
+# ----- fields
+def signed(value: int, bits: int) -> int:
+    """Sign-extend a field"""
+    return value - ((value >> (bits - 1)) << bits)
+
+def imm_i(word: int) -> int:
+    return signed(word >> 20, 12)
+
+def imm_s(word: int) -> int:
+    return signed(((word >> 25) << 5) | ((word >> 7) & 0x1f), 12)
+
+def imm_b(word: int) -> int:
+    return signed(((word >> 31) << 12) | (((word >> 7) & 0x1) << 11)
+                  | (((word >> 25) & 0x3f) << 5) | (((word >> 8) & 0xf) << 1), 13)
+
+def imm_j(word: int) -> int:
+    return signed(((word >> 31) << 20) | (((word >> 12) & 0xff) << 12)
+                  | (((word >> 20) & 0x1) << 11) | (((word >> 21) & 0x3ff) << 1), 21)
+
+# ----- operands by format
+def rd(word: int) -> str:
+    return NAMES[(word >> 7) & 0x1f]
+
+def rs1(word: int) -> str:
+    return NAMES[(word >> 15) & 0x1f]
+
+def rs2(word: int) -> str:
+    return NAMES[(word >> 20) & 0x1f]
+
+def format_r(word: int) -> str:
+    return f"{rd(word)}, {rs1(word)}, {rs2(word)}"
+
+def format_r_unary(word: int) -> str:
+    return f"{rd(word)}, {rs1(word)}"
+
+def format_shift(word: int) -> str:
+    return f"{rd(word)}, {rs1(word)}, {(word >> 20) & 0x1f}"
+
+def format_i(word: int) -> str:
+    return f"{rd(word)}, {rs1(word)}, {imm_i(word)}"
+
+def format_load(word: int) -> str:
+    return f"{rd(word)}, {imm_i(word)}({rs1(word)})"
+
+def format_csr(word: int) -> str:
+    source = (word >> 15) & 0x1f if word & 0x4000 else rs1(word)
+    return f"{rd(word)}, {word >> 20:#x}, {source}"
+
+def format_none(word: int) -> str:
+    return ""
+
+def format_s(word: int) -> str:
+    return f"{rs2(word)}, {imm_s(word)}({rs1(word)})"
+
+def format_b(word: int) -> str:
+    return f"{rs1(word)}, {rs2(word)}, "
+
+def format_u(word: int) -> str:
+    return f"{rd(word)}, {word >> 12:#x}"
+
+def format_j(word: int) -> str:
+    return f"{rd(word)}, "
+
+# the formats with a target relative to the pc, and the offset of the target
+RELATIVE: Dict[Callable[[int], str], Callable[[int], int]] = {
+    format_b: imm_b,
+    format_j: imm_j,
+}
+
+def formatter(kind: str, opcode: int, tail: Optional[int]) -> Callable[[int], str]:
+    """The operands formatter of an instruction, the operands are written the
+    way the encoder reads them"""
+    if opcode > OPCODE:
+        return format_none
+
+    if opcode == OPCODE_SYSTEM:
+        return format_csr
+
+    if kind == "TYPE_R":
+        if tail is not None and tail > 0x7f:
+            return format_r_unary
+        return format_shift if opcode == OPCODE_IMM else format_r
+
+    if kind == "TYPE_I":
+        if opcode == OPCODE_LOAD:
+            return format_load
+        return format_shift if tail is not None else format_i
+
+    return { "TYPE_S": format_s, "TYPE_B": format_b, "TYPE_U": format_u, "TYPE_J": format_j }[kind]
+
+def index() -> Dict[int, List[Tuple[int, Dict[int, Entry]]]]:
+    """Build the decode index from the opcodes
+
+    For each opcode, the masks of the constant fields used by its instructions
+    (the most specific first) and, for each mask, the instructions by the
+    value of the fields (opcode, funct3, tail) in the word.
+    """
+    groups: Dict[int, Dict[int, Dict[int, Entry]]] = {}
+    for mnemonic, (kind, opcode, funct3, tail) in tables()['opcodes'].items():
+        if opcode > OPCODE:
+            # the whole word is the opcode (ecall)
+            mask, key = WHOLE, opcode
+        else:
+            mask = OPCODE | (FUNCT3 if funct3 is not None else 0)
+            key = opcode | ((funct3 or 0) << 12)
+            if tail is not None:
+                mask |= IMM12 if tail > 0x7f else FUNCT7
+                key |= (tail << 20) if tail > 0x7f else (tail << 25)
+
+        entry = (mnemonic, formatter(kind, opcode, tail))
+        groups.setdefault(key & OPCODE, {}).setdefault(mask, {})[key] = entry
+
+    return {
+        opcode: sorted(masks.items(), key=lambda m: -bin(m[0]).count("1"))
+        for opcode, masks in groups.items()
+    }
+
+
+#----- classes
+class Disassembler:
+    """Turn the machine code back into assembly lines
+
+    Each distinct word is decoded once, the text of its instruction is cached
+    with the offset of its target when it is relative to the pc.
+    """
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.index = index()
+        self.cache: Dict[int, Tuple[str, Optional[int]]] = {}
+
+    def decode(self, word: int) -> Optional[Entry]:
+        """The (mnemonic, formatter) of a word, None if it is not an instruction"""
+        for mask, entries in self.index.get(word & OPCODE, ()):
+            entry = entries.get(word & mask)
+            if entry is not None:
+                return entry
+
+        return None
+
+    def template(self, word: int) -> Tuple[str, Optional[int]]:
+        """The text of a word (after its address) and the offset of its
+        target, if relative"""
+        cached = self.cache.get(word)
+        if cached is not None:
+            return cached
+
+        entry = self.decode(word)
+        if entry is None:
+            text = f".word {word:#010x}"
+            offset = None
+        else:
+            mnemonic, operands = entry
+            relative = RELATIVE.get(operands)
+            text = mnemonic if operands is format_none else f"{mnemonic:<7} {operands(word)}"
+            offset = relative(word) if relative else None
+
+        cached = (f":  {word:08x}  {text}" + ("" if offset is not None else "\n"), offset)
+        self.cache[word] = cached
+        return cached
+
+    def lines(self, words: Iterable[int], base: int = 0) -> Iterator[str]:
+        """Generate the lines of the words, the first one is at base, by
+        blocks of BLOCK lines"""
+        cache = self.cache
+        template = self.template
+        block: List[str] = []
+        pc = base
+        for word in words:
+            text, offset = cache.get(word) or template(word)
+            if offset is None:
+                block.append(f"{pc:08x}{text}")
+            else:
+                block.append(f"{pc:08x}{text}{pc + offset:#x}\n")
+            pc += 4
+
+            if len(block) == BLOCK:
+                yield "".join(block)
+                block.clear()
+
+        yield "".join(block)
+
+    def bulk(self, buffer: memoryview, base: int = 0) -> Iterator[str]:
+        """Generate the lines of the words, their fields are decoded with NumPy
+
+        The distinct words are decoded once, the targets of the relative
+        instructions are computed for all the words at once.
+        """
+        # deferred import, NumPy is optional
+        import numpy as np
+
+        words = np.frombuffer(buffer, dtype="<u4").astype(np.int64)
+        pcs = base + 4 * np.arange(len(words), dtype=np.int64)
+
+        # offsets of the branches & jumps targets
+        opcode = words & OPCODE
+        offset_b = ((words >> 31) << 12) | (((words >> 7) & 0x1) << 11) | (((words >> 25) & 0x3f) << 5) | (((words >> 8) & 0xf) << 1)
+        offset_j = ((words >> 31) << 20) | (((words >> 12) & 0xff) << 12) | (((words >> 20) & 0x1) << 11) | (((words >> 21) & 0x3ff) << 1)
+        offsets = np.where(opcode == 0b110_0011, offset_b - ((offset_b >> 12) << 13), offset_j - ((offset_j >> 20) << 21))
+        targets = (pcs + offsets).tolist()
+
+        # the distinct words, decoded once
+        unique, inverse = np.unique(words, return_inverse=True)
+        templates = [ self.template(w) for w in unique.tolist() ]
+
+        block: List[str] = []
+        for pc, position, target in zip(pcs.tolist(), inverse.ravel().tolist(), targets):
+            text, offset = templates[position]
+            if offset is None:
+                block.append(f"{pc:08x}{text}")
+            else:
+                block.append(f"{pc:08x}{text}{target:#x}\n")
+
+            if len(block) == BLOCK:
+                yield "".join(block)
+                block.clear()
+
+        yield "".join(block)
+
+    def file(self, filename: str, base: int = 0, bulk: bool = False) -> Iterator[str]:
+        """Generate the lines of a binary file, memory-mapped, by blocks"""
+        if bulk:
+            try:
+                import numpy                                        # noqa: F401
+            except ImportError:
+                raise SyntaxError("Error: the bulk mode requires NumPy!")
+
+        with open(filename, "rb") as fh:
+            try:
+                source = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                return
+
+        with source:
+            size = len(source) & ~3
+            if bulk:
+                yield from self.bulk(memoryview(source)[:size], base)
+            elif sys.byteorder == "little":
+                yield from self.lines(memoryview(source)[:size].cast("I"), base)      # type: ignore
+            else:
+                words = array("I", source[:size])
+                words.byteswap()
+                yield from self.lines(words, base)                                # type: ignore
+
+            # the trailing bytes
+            if size < len(source):
+                values = ", ".join(f"{b:#04x}" for b in source[size:])
+                yield f"{base + size:08x}:  {'':8}  .byte   {values}\n"
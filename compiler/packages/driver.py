@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Command line driver of the compiler
+
+# ----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional
+
+import sys
+
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+from functools import partial
+
+from packages.config import Config
+from packages.assembler import job, link
+from packages.encoder import Encoder
+from packages.include import depfile
+from packages.stats import Stats, NO_STATS
+
+
+# ----- functions
+def arguments() -> ArgumentParser:
+    """Create the command line parser"""
+    argparse = ArgumentParser()
+    argparse.add_argument("files", nargs="*", help="assembler files to compile")
+    argparse.add_argument("-o", "--output", help="output file")
+    argparse.add_argument("-c", "--compile", action="store_true", help="write an object file for each source file, without linking")
+    argparse.add_argument("--listing", metavar="FILE", help="write the address, bytes & source of each statement ('-' for the standard output)")
+    argparse.add_argument("--depfile", metavar="FILE", help="write the Make rule of the output file, with the included files")
+    argparse.add_argument("-j", "--jobs", type=int, default=1, help="number of files assembled in parallel")
+    argparse.add_argument("--lexer", choices=["stream", "table", "mmap"], default="stream",
+                          help="stream the tokens to the parser or store them in a compact table (read or memory-mapped)")
+    argparse.add_argument("--engine", choices=["regex", "dispatch"], default="regex",
+                          help="match the tokens with the patterns regexp or by dispatching on their first character")
+    argparse.add_argument("--cache-dir", help="directory where the assembled modules are cached (only writable by trusted users)")
+    argparse.add_argument("--cache-size", type=int, default=256, help="maximum size of the cache, in MiB")
+    argparse.add_argument("--macro-depth", type=int, default=64, help="maximum nesting level of the macro expansions")
+    argparse.add_argument("--macro-size", type=int, default=1 << 22, help="maximum number of tokens produced by the macro expansions")
+    argparse.add_argument("--stats", action="store_true", help="report time & counts of each phase")
+    argparse.add_argument("--stats-memory", action="store_true",
+                          help="report the memory peak of each phase as well (tracemalloc, the phases run several times slower)")
+    argparse.add_argument("--profile", metavar="FILE", help="dump the cProfile statistics of the hottest phase")
+    argparse.add_argument("--server", metavar="SOCKET", help="keep running and serve the requests sent on this unix socket")
+    return argparse
+
+def parse(argv: Optional[List[str]] = None) -> Namespace:
+    """Parse the command line, the files are required unless running a server"""
+    argparse = arguments()
+    args = argparse.parse_args(argv)
+    if not args.files and not args.server:
+        argparse.error("the following arguments are required: files")
+
+    return args
+
+@contextmanager
+def listing(filename: Optional[str]) -> Iterator[Optional[IO[str]]]:
+    """The buffered writer of the listing, if any"""
+    if filename is None:
+        yield None
+    elif filename == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+    else:
+        try:
+            fh = open(filename, "w", buffering=1 << 16)
+        except OSError:
+            raise SyntaxError(f"Error: Unable to write the listing [{filename}]!")
+
+        with fh:
+            yield fh
+
+def execute(args: Namespace, output: Callable[[Encoder, Config], None], stats: Optional[Stats] = None) -> int:
+    """Assemble the files of the command line, the result is handed to output
+
+    Args:
+        args   : the command line
+        output : writes the linked program
+        stats  : collects the statistics of the phases, with its hooks
+                 (default: as set by the command line)
+
+    Returns:
+        the exit status of the compiler
+    """
+    # initialize the configuration
+    try:
+        config = Config(args)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        return 1
+
+    if stats is None:
+        stats = Stats(config.stats_memory, config.profile is not None) if config.stats else NO_STATS
+
+    # assemble each file on its own, then link them in the command line order
+    try:
+        with listing(config.listing) as fh:
+            worker = partial(job, config, listing=fh, measure=stats)
+            if config.jobs > 1 and len(config.input_files) > 1 and fh is None:
+                # deferred import, the process pool is expensive to load
+                from concurrent.futures import ProcessPoolExecutor
+
+                with ProcessPoolExecutor(max_workers=config.jobs) as pool:
+                    results = list(pool.map(worker, config.input_files))
+            else:
+                # the listing is written in the command line order
+                results = list(map(worker, config.input_files))
+
+        modules = []
+        for module, phases in results:
+            stats.merge(phases)
+            modules.append(module)
+
+        # keep the cache within its limit, once the new entries are stored
+        if config.cache_dir is not None:
+            from packages.cache import Cache
+            Cache(config.cache_dir, config.cache_size).evict()
+
+        # the object files, linked by another run
+        if config.object_files:
+            from packages.objfile import save
+
+            with stats.phase("output"):
+                for module, filename in zip(modules, config.object_files):
+                    save(module, filename)
+            if config.stats:
+                stats.report()
+            return 0
+
+        encoder = link(modules, stats)
+    except SyntaxError as e:
+        print(e)
+        return 1
+
+    # write the machine code
+    with stats.phase("output"):
+        output(encoder, config)
+        if config.depfile is not None:
+            includes = list(dict.fromkeys(path for module in modules for path in module.includes))
+            depfile(config.depfile, config.output_file, config.input_files, includes)
+
+    if config.stats:
+        stats.report()
+        if config.profile:
+            stats.dump(config.profile)
+
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of the command line"""
+    args = parse(argv)
+
+    if args.server:
+        from packages.server import serve
+        serve(args.server)
+        return 0
+
+    return execute(args, lambda encoder, config: encoder.write(config.output_file))
@@ -0,0 +1,707 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Machine code encoder
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import os
+import sys
+import mmap
+
+from array import array
+from bisect import bisect_right
+
+import packages.ast as ast
+
+from packages.snapshot import tables
+from packages.symbols import SymbolTable, Fixup, Unresolved
+from packages.expression import compile_expr, number
+from packages.section import Extent, Section, WORD, align, layout
+from packages.include import resolve
+from packages.listing import Listing
+
+
+#----- globals
+
+# register number by name
+REGISTERS: Dict[str, int] = tables()['registers']
+
+# array type codes by size of the data values
+TYPECODES = { 1: 'B', 2: 'H', 4: 'I' }
+
+
+#----- functions
+def register(operand: ast.Expression) -> int:
+    """Return the number of a register operand"""
+    try:
+        return REGISTERS[operand.value]     # type: ignore
+    except (AttributeError, KeyError):
+        raise SyntaxError(f"Error: [{operand}] is not a register!")
+
+def reach(offset: int, bits: int) -> int:
+    """Check that the target of a branch is in range and return the offset masked"""
+    if offset < -(1 << (bits - 1)) or offset >= (1 << (bits - 1)):
+        raise OutOfRange(f"Error: branch target at [{offset}] bytes does not fit in {bits} bits!")
+
+    return offset & ((1 << bits) - 1)
+
+def check(value: int, bits: int, signed: bool = True) -> int:
+    """Check that an immediate fits in the field and return it masked"""
+    if signed:
+        low, high = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    else:
+        low, high = 0, (1 << bits) - 1
+
+    if value < low or value > high:
+        raise SyntaxError(f"Error: immediate [{value}] does not fit in {bits} bits!")
+
+    return value & ((1 << bits) - 1)
+
+def fit(value: int, bits: int) -> int:
+    """Check that a data value fits in the size (signed or not) and return it masked"""
+    if value < -(1 << (bits - 1)) or value >= (1 << bits):
+        raise SyntaxError(f"Error: value [{value}] does not fit in {bits} bits!")
+
+    return value & ((1 << bits) - 1)
+
+def pack(values: List[Any], size: int) -> bytes:
+    """Convert the values of a data directive to little-endian bytes, all at once"""
+    try:
+        data = array(TYPECODES[size], values)
+    except (OverflowError, TypeError):
+        # negative values (or out of range)
+        data = array(TYPECODES[size], [ fit(number(v), size << 3) for v in values ])
+
+    if size > 1 and sys.byteorder != "little":
+        data.byteswap()
+
+    return data.tobytes()
+
+def arity(operands: List[Any], *counts: int) -> None:
+    """Check the number of operands of an instruction"""
+    if len(operands) not in counts:
+        raise SyntaxError(f"Error: expecting {' or '.join(map(str, counts))} operand(s), got {len(operands)}!")
+
+
+#----- classes
+class OutOfRange(SyntaxError):
+    """Raised when the target of a branch or a jump is too far"""
+    pass
+
+
+class Encoder:
+    """Encode the instructions of a program into 32-bit words
+
+    The program is encoded in a single pass: an instruction referencing a
+    label not defined yet is emitted as its base word and recorded in the
+    symbol table, it is patched as soon as the label is defined.
+
+    Instructions using the absolute address of a label are kept in the
+    relocations, so they can be encoded again once the program is linked
+    at another address.
+
+    The words are written in the extents of the current section ('.code'
+    or the '.data' reservations), ORG starts a new extent at an absolute
+    address instead of padding up to it.
+
+    Branches & jumps out of range are relaxed into longer sequences when
+    the module is closed (see packages/relax.py).
+    """
+
+    def __init__(self, directory: str = "") -> None:
+        """Constructor
+
+        Args:
+            directory : where the binary files are searched first
+        """
+        self.sections = { name: Section(name, bss) for name, bss in SECTIONS.items() }
+        self.section = self.sections['.code']
+        self.labels = SymbolTable()
+        self.relocations: List[Fixup] = []
+
+        # labels of the absolute extents, they don't move with the module
+        self.fixed: Set[str] = set()
+
+        # labels visible from the other modules (.global)
+        self.exports: Set[str] = set()
+
+        # labels of the relocatable reservations, placed after the code
+        self.deferred: List[Tuple[str, int]] = []
+
+        # address of the instruction being encoded
+        self.pc = 0
+
+        # True when the instruction uses the absolute address of a label
+        self.absolute = False
+
+        # True when the instruction is in an absolute extent
+        self.placed = False
+
+        # extents sorted by address, to find where to patch
+        self.index: Optional[Tuple[List[int], List[Extent]]] = None
+
+        # the branches & jumps, those out of range and the extent of each label
+        self.branches: List[Fixup] = []
+        self.far: List[Fixup] = []
+        self.owners: Dict[str, Extent] = {}
+
+        # the binary files included
+        self.directory = directory
+        self.dependencies: List[str] = []
+
+        # where the bytes of each statement are, when they are listed
+        self.listing: Optional[Listing] = None
+
+    def process(self, statements: Iterable[ast.Statement]) -> Dict[str, Section]:
+        """Encode all the statements and return the sections"""
+        pack = WORD.pack_into
+        if self.listing is not None:
+            statements = self.listing.track(statements, lambda: self.section.extent, self.far)
+        for stmt in statements:
+            if isinstance(stmt, ast.Instruction):
+                try:
+                    base, encode = ENCODERS[stmt.opcode]
+                except KeyError:
+                    pseudo = PSEUDO.get(stmt.opcode)
+                    if pseudo is None:
+                        raise SyntaxError(f"Error: unknown instruction [{stmt.opcode}]!")
+                    pseudo(self, stmt.operands)
+                    continue
+
+                extent = self.section.extents[-1]
+                if extent.buffer is None:
+                    raise SyntaxError(f"Error: instruction [{stmt.opcode}] in the bss section [{self.section.name}]!")
+
+                self.pc = extent.address + extent.size
+                if self.pc & 3:
+                    raise SyntaxError(f"Error: instruction [{stmt.opcode}] at the unaligned address [{self.pc:#x}], use .align 4!")
+
+                self.absolute = False
+                self.placed = extent.absolute
+                offset = extent.allocate(4)
+
+                branch = None
+                if encode in BRANCHES:
+                    branch = Fixup(self.pc, base, encode, stmt.operands, self.placed)
+                    self.branches.append(branch)
+
+                try:
+                    pack(extent.buffer, offset, encode(self, base, stmt.operands))
+                except Unresolved as e:
+                    self.labels.reference(e.name, branch or Fixup(self.pc, base, encode, stmt.operands, self.placed))
+                    pack(extent.buffer, offset, base)
+                    if self.listing is not None:
+                        self.listing.wait(self.pc, branch is not None)
+                    continue
+                except OutOfRange:
+                    if branch is None:
+                        raise
+                    self.far.append(branch)
+                    pack(extent.buffer, offset, base)
+                    continue
+
+                if self.absolute:
+                    self.relocations.append(Fixup(self.pc, base, encode, stmt.operands, self.placed))
+
+            elif isinstance(stmt, ast.Label):
+                self.label(stmt.name)
+
+            elif isinstance(stmt, ast.Directive):
+                directive = DIRECTIVES.get(stmt.name)
+                if directive is None:
+                    raise SyntaxError(f"Error: unknown directive [{stmt.name}]!")
+                directive(self, stmt.arguments)
+
+        return self.sections
+
+    def label(self, name: str) -> None:
+        """Define a label at the current address"""
+        extent = self.section.extent
+        if self.section.bss and not extent.absolute:
+            self.deferred.append((name, extent.size))
+            return
+
+        if extent.absolute:
+            self.fixed.add(name)
+        self.owners[name] = extent
+        self.patch(self.labels.define(name, extent.end))
+
+    def close(self) -> None:
+        """Relax the branches out of range, then place the relocatable
+        reservations after the code and define their labels"""
+        if self.far:
+            # deferred import, only needed for the far branches
+            from packages.relax import relax
+            relax(self)
+
+        data = self.sections['.data'].relocatable
+        data.address = align(self.sections['.code'].relocatable.end)
+        self.index = None
+
+        deferred, self.deferred = self.deferred, []
+        for name, offset in deferred:
+            self.patch(self.labels.define(name, data.address + offset))
+
+        if self.far:
+            raise SyntaxError(f"Error: branch target out of range at address [{self.far[0].address:#x}]!")
+
+        for section in self.sections.values():
+            for extent in section.extents:
+                extent.trim()
+
+    def place(self, sections: Dict[str, Section], base: int) -> int:
+        """Add the sections of a module, the relocatable extents start at base
+
+        Returns:
+            the address following the relocatable extents
+        """
+        end = base
+        for name, section in sections.items():
+            for extent in section.extents:
+                if not extent.absolute:
+                    extent.address += base
+                    end = max(end, extent.end)
+            self.sections[name].extents.extend(section.extents)
+
+        self.index = None
+        return align(end)
+
+    def locate(self, address: int) -> Extent:
+        """Return the extent where an address is written"""
+        extent = self.section.extents[-1]
+        if address in extent and extent.buffer is not None:
+            return extent
+
+        if self.index is None:
+            ordered = sorted((e for s in self.sections.values() for e in s.extents if e.buffer is not None),
+                             key=lambda e: e.address)
+            self.index = ([ e.address for e in ordered ], ordered)
+
+        starts, ordered = self.index
+        index = bisect_right(starts, address) - 1
+        if index >= 0 and address in ordered[index]:
+            return ordered[index]
+
+        # empty extents share their address with another one
+        for extent in ordered:
+            if address in extent:
+                return extent
+
+        raise SyntaxError(f"Error: no section at address [{address:#x}]!")
+
+    def check(self) -> None:
+        """Final sweep over the references never resolved & the layout"""
+        missing = self.labels.unresolved()
+        if missing:
+            raise SyntaxError(f"Error: undefined symbol(s) [{', '.join(missing)}]!")
+
+        # the branches between modules are not relaxed
+        if self.far:
+            raise SyntaxError(f"Error: branch target out of range at address [{self.far[0].address:#x}]!")
+
+        # the extents must not overlap
+        self.chunks()
+
+    def patch(self, fixups: List[Fixup]) -> None:
+        """Encode again the instructions waiting for a symbol"""
+        for fixup in fixups:
+            extent = self.locate(fixup.address)
+            self.pc = fixup.address
+            self.absolute = False
+            self.placed = fixup.fixed
+            try:
+                WORD.pack_into(extent.buffer, fixup.address - extent.address, fixup.encode(self, fixup.base, fixup.operands))  # type: ignore
+            except Unresolved as e:
+                # still waiting for another symbol
+                self.labels.reference(e.name, fixup)
+                continue
+            except OutOfRange:
+                if fixup.encode not in BRANCHES:
+                    raise
+                self.far.append(fixup)
+                if self.listing is not None:
+                    self.listing.patched(fixup.address, False)
+                continue
+
+            if self.absolute:
+                self.relocations.append(fixup)
+            if self.listing is not None:
+                self.listing.patched(fixup.address)
+
+    def chunks(self) -> List[Tuple[int, memoryview]]:
+        """Return the (file offset, bytes) of the flat image"""
+        return layout([ e for s in self.sections.values() for e in s.extents ])
+
+    def write(self, filename: str) -> None:
+        """Write the flat image to the output file, the gaps are left as holes"""
+        with open(filename, "wb") as fh:
+            for offset, data in self.chunks():
+                fh.seek(offset)
+                fh.write(data)
+
+    def value(self, operand: ast.Expression) -> int:
+        """Return the value of an immediate operand"""
+        if isinstance(operand, ast.Number):
+            return number(operand.value)
+
+        if isinstance(operand, ast.Identifier):
+            self.absolute = True
+            return self.symbol(operand.value)
+
+        if isinstance(operand, (ast.BinaryOp, ast.UnaryOp)):
+            compiled = compile_expr(operand)
+            if compiled.value is not None:
+                return compiled.value
+
+            self.absolute = True
+            return compiled.evaluate(self.symbol)
+
+        raise SyntaxError(f"Error: [{operand}] is not an immediate value!")
+
+    def symbol(self, name: str) -> int:
+        """Return the value of a symbol, '$' is the current instruction"""
+        if name == '$':
+            self.absolute = True
+            return self.pc
+
+        value = self.labels[name]
+
+        # the distance changes when the module moves
+        if self.placed != (name in self.fixed):
+            self.absolute = True
+
+        return value
+
+    def constant(self, operand: ast.Expression) -> int:
+        """Return the value of an operand that cannot wait for a symbol"""
+        try:
+            return self.value(operand)
+        except Unresolved as e:
+            raise SyntaxError(f"Error: symbol [{e.name}] is used before its definition!")
+
+    # ----- data
+    def emit(self, data: Any) -> None:
+        """Copy bytes in the current extent"""
+        extent = self.section.extent
+        if extent.buffer is None:
+            raise SyntaxError(f"Error: data in the bss section [{self.section.name}]!")
+
+        offset = extent.allocate(len(data))
+        extent.buffer[offset:offset + len(data)] = data
+
+    def define(self, operands: List[ast.Expression], size: int) -> None:
+        """Emit the values of a data directive, converted all at once when constant"""
+        values = [ o.value for o in operands if type(o) is ast.Number ]
+        if len(values) == len(operands):
+            self.emit(pack(values, size))
+            return
+
+        # strings, expressions & symbols
+        for operand in operands:
+            if isinstance(operand, ast.String):
+                if size != 1:
+                    raise SyntaxError(f"Error: string [{operand}] in a data directive of {size} bytes!")
+                self.emit(operand.value.encode())
+
+            elif size == 4:
+                self.word(operand)
+
+            else:
+                self.emit(pack([ self.constant(operand) ], size))
+
+    def word(self, operand: ast.Expression) -> None:
+        """Emit a 32-bit value, patched when it references a symbol defined later"""
+        extent = self.section.extent
+        if extent.buffer is None:
+            raise SyntaxError(f"Error: data in the bss section [{self.section.name}]!")
+
+        self.pc = extent.address + extent.size
+        self.absolute = False
+        self.placed = extent.absolute
+        offset = extent.allocate(4)
+        try:
+            WORD.pack_into(extent.buffer, offset, self.item(0, [ operand ]))
+        except Unresolved as e:
+            self.labels.reference(e.name, Fixup(self.pc, 0, Encoder.item, [ operand ], self.placed))
+            if self.listing is not None:
+                self.listing.wait(self.pc, False)
+            return
+
+        if self.absolute:
+            self.relocations.append(Fixup(self.pc, 0, Encoder.item, [ operand ], self.placed))
+
+    def item(self, base: int, operands: List[Any]) -> int:
+        """The 32-bit value of a data word (same signature as the format encoders)"""
+        return fit(self.value(operands[0]), 32)
+
+    # ----- directives
+    def code(self, arguments: List[ast.Expression]) -> None:
+        """.code"""
+        self.section = self.sections['.code']
+
+    def data(self, arguments: List[ast.Expression]) -> None:
+        """.data (reservations only)"""
+        self.section = self.sections['.data']
+
+    def origin(self, arguments: List[ast.Expression]) -> None:
+        """ORG address | .org address"""
+        arity(arguments, 1)
+        self.section.org(self.constant(arguments[0]))
+        self.index = None
+
+    def db(self, operands: List[ast.Expression]) -> None:
+        """db value|"string" {, value|"string"}"""
+        self.define(operands, 1)
+
+    def dh(self, operands: List[ast.Expression]) -> None:
+        """dh value {, value}"""
+        self.define(operands, 2)
+
+    def dw(self, operands: List[ast.Expression]) -> None:
+        """dw value {, value} (the values can be symbols defined later)"""
+        self.define(operands, 4)
+
+    def ascii(self, arguments: List[ast.Expression]) -> None:
+        """.ascii "string" {, "string"}"""
+        for argument in arguments:
+            if not isinstance(argument, ast.String):
+                raise SyntaxError(f"Error: expecting a string, got [{argument}]!")
+        self.emit(b"".join(a.value.encode() for a in arguments))       # type: ignore
+
+    def asciz(self, arguments: List[ast.Expression]) -> None:
+        """.asciz "string" {, "string"} (each one terminated by a zero)"""
+        for argument in arguments:
+            self.ascii([ argument ])
+            self.emit(b"\0")
+
+    def incbin(self, arguments: List[ast.Expression]) -> None:
+        """.incbin "file" [, offset [, length]]"""
+        arity(arguments, 1, 2, 3)
+        name = arguments[0]
+        if not isinstance(name, ast.String):
+            raise SyntaxError(f"Error: expecting a file name, got [{name}]!")
+
+        path = resolve(name.value, self.directory)
+        try:
+            fh = open(path, "rb")
+        except OSError:
+            raise SyntaxError(f"Error: Unable to find the binary file [{path}]!")
+
+        with fh:
+            try:
+                data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                data = b""                                              # type: ignore
+
+            start = self.constant(arguments[1]) if len(arguments) > 1 else 0
+            end = start + self.constant(arguments[2]) if len(arguments) > 2 else len(data)
+            if start < 0 or start > end or end > len(data):
+                raise SyntaxError(f"Error: invalid range [{start}:{end}] of the binary file [{path}]!")
+
+            self.emit(memoryview(data)[start:end])
+
+        if path not in self.dependencies:
+            self.dependencies.append(path)
+
+    def space(self, arguments: List[ast.Expression]) -> None:
+        """.space count (zeros in the code, a reservation in the bss)"""
+        arity(arguments, 1)
+        count = self.constant(arguments[0])
+        if count < 0:
+            raise SyntaxError(f"Error: invalid size [{count}]!")
+        self.section.extent.allocate(count)
+
+    def globl(self, arguments: List[ast.Expression]) -> None:
+        """.global name {, name} (the other labels are local to the module)"""
+        if not arguments:
+            raise SyntaxError("Error: expecting a label after .global!")
+
+        for argument in arguments:
+            if not isinstance(argument, ast.Identifier) or argument.value in REGISTERS or argument.value == '$':
+                raise SyntaxError(f"Error: expecting a label, got [{argument}]!")
+            self.exports.add(argument.value)
+
+    def align(self, arguments: List[ast.Expression]) -> None:
+        """.align boundary (zeros in the code, a reservation in the bss), the
+        addresses of the relocatable extents are aligned from their start"""
+        arity(arguments, 1)
+        boundary = self.constant(arguments[0])
+        if boundary < 1 or boundary & (boundary - 1):
+            raise SyntaxError(f"Error: the alignment [{boundary}] is not a power of 2!")
+
+        extent = self.section.extent
+        extent.allocate(-extent.end & (boundary - 1))
+
+    def offset(self, operand: ast.Expression) -> int:
+        """Return the offset from the current instruction to the operand"""
+        if isinstance(operand, ast.Identifier):
+            return self.symbol(operand.value) - self.pc
+
+        return self.value(operand) - self.pc
+
+    def shamt(self, operand: ast.Expression) -> int:
+        """Return the shift amount of an immediate shift (0..31)"""
+        if isinstance(operand, ast.Identifier) and operand.value in REGISTERS:
+            raise SyntaxError(f"Error: expecting a shift amount, got the register [{operand}]!")
+
+        value = self.value(operand)
+        if not 0 <= value < 32:
+            raise SyntaxError(f"Error: shift amount [{value}] is not between 0 and 31!")
+        return value
+
+    # ----- encoders by format
+    def type_r(self, base: int, operands: List[Any]) -> int:
+        """rd, rs1, rs2 | rd, rs1, shamt | rd, rs1"""
+        if base in UNARY:
+            arity(operands, 2)
+            return base | (register(operands[0]) << 7) | (register(operands[1]) << 15)
+
+        arity(operands, 3)
+        word = base | (register(operands[0]) << 7) | (register(operands[1]) << 15)
+        if base in SHIFTS:
+            return word | (self.shamt(operands[2]) << 20)
+
+        return word | (register(operands[2]) << 20)
+
+    def type_i(self, base: int, operands: List[Any]) -> int:
+        """rd, rs1, imm | rd, imm(rs1) | rd, rs1, shamt"""
+        if base in BARE:
+            arity(operands, 0)
+            return base
+
+        if base in SHIFTS:
+            arity(operands, 3)
+            return base | (register(operands[0]) << 7) | (register(operands[1]) << 15) | (self.shamt(operands[2]) << 20)
+
+        arity(operands, 2, 3)
+        rd = register(operands[0]) << 7
+        if len(operands) == 2:
+            memory = operands[1]
+            if not isinstance(memory, ast.Memory):
+                raise SyntaxError(f"Error: expecting a memory operand, got [{memory}]!")
+            return base | rd | (REGISTERS[memory.base] << 15) | (check(self.value(memory.offset), 12) << 20)
+
+        arity(operands, 3)
+        return base | rd | (register(operands[1]) << 15) | (check(self.value(operands[2]), 12) << 20)
+
+    def type_csr(self, base: int, operands: List[Any]) -> int:
+        """rd, csr, rs1 | rd, csr, uimm"""
+        arity(operands, 3)
+        source = operands[2]
+        if isinstance(source, ast.Identifier) and source.value in REGISTERS:
+            rs1 = REGISTERS[source.value]
+        else:
+            rs1 = check(self.value(source), 5, False)
+
+        csr = check(self.value(operands[1]), 12, False)
+        return base | (register(operands[0]) << 7) | (rs1 << 15) | (csr << 20)
+
+    def type_s(self, base: int, operands: List[Any]) -> int:
+        """rs2, imm(rs1)"""
+        arity(operands, 2)
+        memory = operands[1]
+        if not isinstance(memory, ast.Memory):
+            raise SyntaxError(f"Error: expecting a memory operand, got [{memory}]!")
+
+        imm = check(self.value(memory.offset), 12)
+        return (base | ((imm & 0x1f) << 7) | (REGISTERS[memory.base] << 15)
+                | (register(operands[0]) << 20) | ((imm >> 5) << 25))
+
+    def type_b(self, base: int, operands: List[Any]) -> int:
+        """rs1, rs2, target"""
+        arity(operands, 3)
+        imm = reach(self.offset(operands[2]), 13)
+        return (base | (((imm >> 11) & 0x1) << 7) | (((imm >> 1) & 0xf) << 8)
+                | (register(operands[0]) << 15) | (register(operands[1]) << 20)
+                | (((imm >> 5) & 0x3f) << 25) | ((imm >> 12) << 31))
+
+    def type_u(self, base: int, operands: List[Any]) -> int:
+        """rd, imm"""
+        arity(operands, 2)
+        value = self.value(operands[1])
+        imm = check(value, 20, value < 0)
+        return base | (register(operands[0]) << 7) | (imm << 12)
+
+    def type_j(self, base: int, operands: List[Any]) -> int:
+        """[rd,] target"""
+        arity(operands, 1, 2)
+        rd = REGISTERS['ra'] if len(operands) == 1 else register(operands[0])
+        imm = reach(self.offset(operands[-1]), 21)
+        return (base | (rd << 7) | (((imm >> 12) & 0xff) << 12) | (((imm >> 11) & 0x1) << 20)
+                | (((imm >> 1) & 0x3ff) << 21) | ((imm >> 20) << 31))
+
+
+#----- functions
+def compile_opcodes(entries: Dict[str, Tuple[int, str]]) -> Dict[str, Tuple[int, Callable]]:
+    """Attach the encoder of their format to the (base word, format) entries"""
+    formats = {
+        "TYPE_R": Encoder.type_r,
+        "TYPE_I": Encoder.type_i,
+        "TYPE_S": Encoder.type_s,
+        "TYPE_B": Encoder.type_b,
+        "TYPE_U": Encoder.type_u,
+        "TYPE_J": Encoder.type_j,
+        "SYSTEM": Encoder.type_csr,
+    }
+
+    return { mnemonic: (base, formats[kind]) for mnemonic, (base, kind) in entries.items() }
+
+# encoder entries by mnemonic
+ENCODERS = compile_opcodes(tables()['encoders'])
+
+# base words of the instructions by operands: rd, rs1 (R-type with a 12 bits
+# tail), rd, rs1, shamt (immediate shifts) and none (the whole word is the opcode)
+UNARY: Set[int] = set()
+SHIFTS: Set[int] = set()
+BARE: Set[int] = set()
+for _mnemonic, (_kind, _opcode, _funct3, _tail) in tables()['opcodes'].items():
+    _base = ENCODERS[_mnemonic][0]
+    if _opcode > 0x7f:
+        BARE.add(_base)
+    elif _tail is not None and _tail > 0x7f:
+        UNARY.add(_base)
+    elif _tail is not None and _opcode == 0b001_0011:
+        SHIFTS.add(_base)
+
+# encoders of the instructions that can be relaxed
+BRANCHES = { Encoder.type_b, Encoder.type_j }
+
+# sections of a program, True for the bss ones
+SECTIONS = { '.code': False, '.data': True }
+
+# directives by name, pseudo instructions by mnemonic
+DIRECTIVES: Dict[str, Callable[[Encoder, List[ast.Expression]], None]] = {
+    '.code': Encoder.code,
+    '.data': Encoder.data,
+    '.org': Encoder.origin,
+    '.space': Encoder.space,
+    '.align': Encoder.align,
+    '.global': Encoder.globl,
+    '.globl': Encoder.globl,
+    '.byte': Encoder.db,
+    '.half': Encoder.dh,
+    '.word': Encoder.dw,
+    '.ascii': Encoder.ascii,
+    '.asciz': Encoder.asciz,
+    '.string': Encoder.asciz,
+    '.incbin': Encoder.incbin,
+}
+
+PSEUDO: Dict[str, Callable[[Encoder, List[ast.Expression]], None]] = {
+    'ORG': Encoder.origin,
+    'db': Encoder.db,
+    'dh': Encoder.dh,
+    'dw': Encoder.dw,
+}
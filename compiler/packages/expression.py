@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Compile time expressions evaluation
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import operator
+from functools import lru_cache
+
+import packages.ast as ast
+
+
+#----- globals
+
+# shifts by this count or more are rejected
+SHIFT_LIMIT = 64
+
+
+#----- functions
+def divide(left: int, right: int) -> int:
+    """Integer division, truncated toward zero"""
+    if right == 0:
+        raise SyntaxError("Error: division by zero in expression!")
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+def shift_count(count: int) -> int:
+    """Check the count of a shift, the values are at most 64 bits wide"""
+    if not 0 <= count < SHIFT_LIMIT:
+        raise SyntaxError(f"Error: shift count [{count}] is not between 0 and {SHIFT_LIMIT - 1}!")
+    return count
+
+def shift_left(left: int, right: int) -> int:
+    return left << shift_count(right)
+
+def shift_right(left: int, right: int) -> int:
+    return left >> shift_count(right)
+
+def modulo(left: int, right: int) -> int:
+    """Remainder of the division, with the sign of the dividend"""
+    return left - right * divide(left, right)
+
+def number(value: Union[int, str]) -> int:
+    """Convert the value of a Number node"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value, 0)
+    except ValueError:
+        # decimal with leading zeros
+        return int(value, 10)
+
+
+#----- globals
+
+# binary operators
+BINARY: Dict[str, Callable[[int, int], int]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+    '%': modulo,
+    '<<': shift_left,
+    '>>': shift_right,
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+}
+
+# unary operators
+UNARY: Dict[str, Callable[[int], int]] = {
+    '-': operator.neg,
+    '+': operator.pos,
+}
+
+# kind of the postfix instructions
+CONST = 0
+SYMBOL = 1
+UNARY_OP = 2
+BINARY_OP = 3
+
+
+#----- functions
+@lru_cache(maxsize=4096)
+def fold_binary(op: str, left: int, right: int) -> int:
+    """Memoized constant binary operation"""
+    return BINARY[op](left, right)
+
+@lru_cache(maxsize=4096)
+def fold_unary(op: str, operand: int) -> int:
+    """Memoized constant unary operation"""
+    return UNARY[op](operand)
+
+
+#----- classes
+class Compiled:
+    """An expression compiled into a flat postfix program
+
+    Constant subtrees are folded while compiling, an expression without any
+    symbol is reduced to its value and never evaluated again.
+
+    Members:
+        code  : the postfix program as (kind, argument) pairs
+        value : the value of the expression if it is constant
+    """
+    __slots__ = ("code", "value")
+
+    def __init__(self, code: List[Tuple[int, Any]]) -> None:
+        """Constructor"""
+        self.code = code
+        self.value = code[0][1] if len(code) == 1 and code[0][0] == CONST else None
+
+    @property
+    def constant(self) -> bool:
+        return self.value is not None
+
+    def evaluate(self, symbols: Callable[[str], int]) -> int:
+        """Run the postfix program, the symbols are resolved by the callable"""
+        if self.value is not None:
+            return self.value
+
+        stack: List[int] = []
+        push = stack.append
+        pop = stack.pop
+        for kind, argument in self.code:
+            if kind == CONST:
+                push(argument)
+            elif kind == SYMBOL:
+                push(symbols(argument))
+            elif kind == UNARY_OP:
+                stack[-1] = argument(stack[-1])
+            else:
+                right = pop()
+                stack[-1] = argument(stack[-1], right)
+
+        return stack[0]
+
+
+#----- functions
+def compile_expr(expr: ast.Expression) -> Compiled:
+    """Compile an expression tree, the result is kept on the root node"""
+    compiled = getattr(expr, "compiled", None)
+    if compiled is not None:
+        return compiled
+
+    code: List[Tuple[int, Any]] = []
+    emit = code.append
+
+    # iterative post-order traversal, nodes are visited twice
+    pending: List[Tuple[ast.Expression, bool]] = [(expr, False)]
+    while pending:
+        node, visited = pending.pop()
+
+        if isinstance(node, ast.BinaryOp):
+            if not visited:
+                pending.append((node, True))
+                pending.append((node.right, False))
+                pending.append((node.left, False))
+                continue
+
+            if node.op not in BINARY:
+                raise SyntaxError(f"Error: unknown operator [{node.op}]!")
+
+            # both operands are constant: they are the last two instructions
+            if code[-1][0] == CONST and code[-2][0] == CONST:
+                right = code.pop()[1]
+                left = code.pop()[1]
+                emit((CONST, fold_binary(node.op, left, right)))
+            else:
+                emit((BINARY_OP, BINARY[node.op]))
+
+        elif isinstance(node, ast.UnaryOp):
+            if not visited:
+                pending.append((node, True))
+                pending.append((node.operand, False))
+                continue
+
+            if node.op not in UNARY:
+                raise SyntaxError(f"Error: unknown operator [{node.op}]!")
+
+            if code[-1][0] == CONST:
+                emit((CONST, fold_unary(node.op, code.pop()[1])))
+            else:
+                emit((UNARY_OP, UNARY[node.op]))
+
+        elif isinstance(node, ast.Number):
+            emit((CONST, number(node.value)))
+
+        elif isinstance(node, ast.Identifier):
+            emit((SYMBOL, node.value))
+
+        else:
+            raise SyntaxError(f"Error: [{node}] cannot be used in an expression!")
+
+    compiled = Compiled(code)
+    expr.compiled = compiled        # type: ignore
+    return compiled
+
+def fold(expr: ast.Expression) -> ast.Expression:
+    """Replace an operation on constants by its value (at parse time)
+
+    The tree is expected to be built bottom-up, with its constant subtrees
+    already folded, so only the direct operands have to be checked.
+    """
+    if isinstance(expr, ast.BinaryOp):
+        if isinstance(expr.left, ast.Number) and isinstance(expr.right, ast.Number) and expr.op in BINARY:
+            return ast.Number(fold_binary(expr.op, number(expr.left.value), number(expr.right.value)))
+
+    elif isinstance(expr, ast.UnaryOp):
+        if isinstance(expr.operand, ast.Number) and expr.op in UNARY:
+            return ast.Number(fold_unary(expr.op, number(expr.operand.value)))
+
+    return expr
+
+def evaluate(expr: ast.Expression, symbols: Callable[[str], int]) -> int:
+    """Compute the value of an expression"""
+    return compile_expr(expr).evaluate(symbols)
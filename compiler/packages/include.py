@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Included files, lexed once per process
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+import os
+
+from dataclasses import dataclass
+
+from packages.config import Config
+from packages.lexer import Lexer
+from packages.token import Token
+from packages.specs import TokenType
+
+
+#----- classes
+@dataclass
+class Header:
+    """A file included in the sources
+
+    Members:
+        path   : the path of the file
+        stamp  : the (mtime, size) of the file when it was lexed
+        tokens : the tokens of the file, without the end of file
+        once   : True if the file contains '.pragma once'
+        events : the macros defined & the files included, in order, when
+                 the file generates no statement (None until known)
+    """
+    path: str
+    stamp: Tuple[int, int]
+    tokens: Tuple[Token, ...]
+    once: bool = False
+    events: Optional[List[Any]] = None
+
+
+#----- globals
+
+# the files already lexed by this process, by path
+HEADERS: Dict[str, Header] = {}
+
+
+#----- functions
+def load(config: Config, path: str) -> Header:
+    """Return the header for a file, lexed again only if it changed"""
+    try:
+        info = os.stat(path)
+    except OSError:
+        raise SyntaxError(f"Error: Unable to find the included file [{path}]!")
+
+    stamp = (info.st_mtime_ns, info.st_size)
+    header = HEADERS.get(path)
+    if header is not None and header.stamp == stamp:
+        return header
+
+    tokens: List[Token] = []
+    once = False
+    for token in Lexer(config, path).stream():
+        if token.type == TokenType.EOF:
+            break
+        tokens.append(token)
+
+    # .pragma once
+    for index in range(len(tokens) - 1):
+        if tokens[index].type == TokenType.DIRECTIVE and tokens[index].value == ".pragma" and tokens[index + 1].value == "once":
+            del tokens[index:index + 3]
+            once = True
+            break
+
+    header = Header(path, stamp, tuple(tokens), once)
+    HEADERS[path] = header
+    return header
+
+def resolve(name: str, directory: str) -> str:
+    """Return the path of an included file, relative to the including file"""
+    if os.path.isabs(name):
+        return name
+
+    return os.path.normpath(os.path.join(directory, name))
+
+def depfile(filename: str, target: str, sources: List[str], includes: List[str]) -> None:
+    """Write the Make rule of the target, with a phony rule for each included file"""
+    def escape(path: str) -> str:
+        return path.replace(" ", "\\ ").replace("$", "$$")
+
+    with open(filename, "w") as fh:
+        fh.write(f"{escape(target)}: {' '.join(escape(p) for p in sources + includes)}\n")
+        for path in includes:
+            fh.write(f"\n{escape(path)}:\n")
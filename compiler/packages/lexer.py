@@ -13,57 +13,209 @@
 
 #----- imports
 from __future__ import annotations
-from typing import List
+from typing import Iterator, List, Optional
+
+import mmap
+import time
 
 from packages.config import Config
-from packages.token import Token
+from packages.stats import Phase
+from packages.token import Token, TokenTable
+from packages.scanner import scan
+
+import packages.specs as specs
+
+from packages.specs import TokenType
+
+
+#----- globals
 
-from packages.specs import TokenType, RE_PATTERNS
+# token codes & types by group name
+CODES = { t.name: t.value for t in TokenType }
+KINDS = { t.name: t for t in TokenType }
+
+# groups that don't generate a token
+IGNORED = { TokenType.SKIP.name, TokenType.COMMENT.name }
 
 
 #----- classes
 class Lexer:
     """Process the assembly file and create tokens"""
 
-    def __init__(self, config: Config) -> None:
-        """Constructor"""
+    def __init__(self, config: Config, filename: Optional[str] = None) -> None:
+        """Constructor
+
+        Args:
+            config   : the compiler configuration
+            filename : the file to process, if not the configured input file
+        """
         # current row/col
         self._row: int = 0
 
         self._config = config
+        self._filename = filename or config.input_file
         self._tokens: List[Token] = []
 
+        # first-character dispatch instead of the token patterns regexp
+        self._dispatch = config.engine == "dispatch"
+
     def parse(self) -> None:
-        with open(self._config.input_file, "r") as fh:
-            for line in fh:
-                self._row = self._row + 1
-                self.tokenize(line)
+        """Tokenize the whole file and keep all the tokens in memory"""
+        self._tokens.extend(self.stream())
+
+    def stream(self, phase: Optional[Phase] = None) -> Iterator[Token]:
+        """Generate the tokens line by line, without keeping them in memory
+
+        Args:
+            phase : the statistics receiving the time spent & the tokens
+                    generated, the parser pulls the tokens in between
+        """
+        with open(self._filename, "r") as fh:
+            if phase is None:
+                for line in fh:
+                    self._row = self._row + 1
+                    yield from self.scan(line)
+            else:
+                clock = time.perf_counter
+                start = clock()
+                for line in fh:
+                    self._row = self._row + 1
+                    tokens = list(self.scan(line))
+                    phase.seconds += clock() - start
+                    phase.tokens += len(tokens)
+                    yield from tokens
+                    start = clock()
+                phase.tokens += 1
 
             # end of file
-            self._tokens.append(Token(TokenType.EOF, "", self._row, 0))
+            yield Token(TokenType.EOF, "", self._row, 0)
+
+    def table(self) -> TokenTable:
+        """Tokenize the whole file into a compact TokenTable"""
+        with open(self._filename, "r") as fh:
+            source = fh.read()
+
+        table = TokenTable(source)
+        append = table.append
+        lines = table.lines
+
+        start = 0
+        end = len(source)
+        while start < end:
+            stop = source.find('\n', start)
+            if stop < 0:
+                stop = end
+            lines.append(start)
+
+            # match the line in place, without copying it
+            need_eol = False
+            if self._dispatch:
+                for code, first, last in scan(source, start, stop):
+                    append(code, first, last - first)
+                    need_eol = True
+            else:
+                for match in specs.RE_PATTERNS.finditer(source, start, stop):
+                    kind = match.lastgroup
+                    if kind in IGNORED:
+                        continue
+
+                    if kind:
+                        append(CODES[kind], match.start(), match.end() - match.start())
+                        need_eol = True
+
+            # add the EOL
+            if need_eol:
+                append(TokenType.EOL, stop, 0)
+
+            start = stop + 1
+
+        # end of file
+        append(TokenType.EOF, end, 0)
+        return table
+
+    def mapped(self) -> TokenTable:
+        """Tokenize the whole file into a TokenTable, in a single pass
+
+        The file is memory-mapped and matched as one buffer, the values are
+        only copied out of the map when they are requested.
+        """
+        with open(self._filename, "rb") as fh:
+            try:
+                source = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files cannot be mapped
+                source = b""
+
+        table = TokenTable(source)
+        append = table.append
+        lines = table.lines
+
+        end = len(source)
+        if end:
+            lines.append(0)
+
+        eol = TokenType.EOL.name
+        need_eol = False
+        for match in specs.RE_BYTES_PATTERNS.finditer(source):
+            kind = match.lastgroup
+            if kind in IGNORED:
+                continue
+
+            if kind == eol:
+                start = match.start()
+                if need_eol:
+                    append(TokenType.EOL, start, 0)
+                    need_eol = False
+
+                # start of the next line
+                if start + 1 < end:
+                    lines.append(start + 1)
+
+            elif kind:
+                append(CODES[kind], match.start(), match.end() - match.start())
+                need_eol = True
+
+        # last line without a newline delimiter
+        if need_eol:
+            append(TokenType.EOL, end, 0)
+
+        # end of file
+        append(TokenType.EOF, end, 0)
+        return table
 
     def tokenize(self, line) -> None:
+        self._tokens.extend(self.scan(line))
+
+    def scan(self, line) -> Iterator[Token]:
+        """Generate the tokens for a single line"""
         # remove the newline delimiter
         line = line.rstrip('\n')
 
-        column = 0
+        if self._dispatch:
+            need_eol = False
+            for code, first, last in scan(line, 0, len(line)):
+                yield Token(TokenTable.TYPES[code], line[first:last], self._row, first + 1, line)
+                need_eol = True
+
+            if need_eol:
+                yield Token(TokenType.EOL, "", self._row, len(line) + 1, line)
+            return
+
         need_eol = False
-        for match in RE_PATTERNS.finditer(line):
+        for match in specs.RE_PATTERNS.finditer(line):
             kind = match.lastgroup
-            value = match.group()
-            column = match.start() + 1
 
             # skip comment and whitespaces
-            if kind in [ TokenType.SKIP.name, TokenType.COMMENT.name ]:
+            if kind in IGNORED:
                 continue
 
             if kind:
-                self._tokens.append(Token(TokenType.__getitem__(kind), value, self._row, column))
+                yield Token(KINDS[kind], match.group(), self._row, match.start() + 1, line)
                 need_eol = True
 
         # add the EOL
         if need_eol:
-            self._tokens.append(Token(TokenType.EOL, "", self._row, len(line) + 1))
+            yield Token(TokenType.EOL, "", self._row, len(line) + 1, line)
 
     @property
     def tokens(self) -> List[Token]:
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Listing of the statements with their addresses & bytes
+
+#----- imports
+from __future__ import annotations
+from typing import Callable, Deque, Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple
+
+import sys
+import tempfile
+
+from array import array
+from collections import deque
+
+import packages.ast as ast
+
+from packages.section import Extent, WORD
+
+
+#----- globals
+
+# number of lines written at once
+BLOCK = 4096
+
+# bytes shown for a statement, the others are elided
+SHOWN = 8
+
+# width of the bytes column
+WIDTH = len("00000000 00000000 ...")
+
+# the addresses are shown on 8 digits
+LAST = 0xffffffff
+
+# fields of the lines recorded in case their address changes (position,
+# number, start, end, words) & the number of lines read back at once
+FIELDS = 5
+CHUNK = BLOCK * FIELDS
+
+
+#----- classes
+class Line:
+    """A line of the listing: its source text & the bytes [start, end) of an
+    extent
+
+    Members:
+        text     : the source line
+        number   : the number of the extent
+        start    : the offset of the first byte in the extent
+        end      : the offset following the last byte
+        words    : True when the bytes are instructions, shown as words
+        waiting  : the number of words waiting for a label
+        position : where the line is written in the file, -1 until then
+    """
+    __slots__ = ("text", "number", "start", "end", "words", "waiting", "position")
+
+    def __init__(self, text: str, number: int, start: int, end: int, words: bool = False) -> None:
+        """Constructor"""
+        self.text = text
+        self.number = number
+        self.start = start
+        self.end = end
+        self.words = words
+        self.waiting = 0
+        self.position = -1
+
+
+class Listing:
+    """Write the address, the bytes & the source line of each statement
+
+    The lines are written by blocks, as soon as their statements are
+    encoded: only the lines whose words wait for a label are kept, until
+    the label is defined.
+
+    In a file, these words are then patched in place. The lines whose
+    address can still change (the reservations placed with the module, the
+    code following a branch that waits for its label or is out of range)
+    are recorded in a temporary file: those of the extents placed or moved
+    by the relaxation are written again when the module is closed.
+
+    The standard output cannot be patched: the words defined later and the
+    branches relaxed are listed again after their lines. The lines after a
+    branch relaxed keep their address before the relaxation, those of the
+    reservations are relative to their section until it is placed.
+    """
+
+    def __init__(self, fh: IO[str]) -> None:
+        """Constructor"""
+        self.fh = fh
+        self.extents: List[Extent] = []
+        self.numbers: Dict[int, int] = {}
+        self.count = 0
+
+        # a file is patched through its binary buffer, at the known positions,
+        # the standard output may be a file opened to append
+        fh.flush()
+        out = getattr(fh, "buffer", None)
+        patched = out is not None and fh is not sys.stdout and out.seekable()
+        self.out: Optional[IO[bytes]] = out if patched else None
+        self.position = self.out.tell() if self.out is not None else 0
+
+        # the lines not written yet, the current one gets the statements after a label
+        self.block: Deque[Line] = deque()
+        self.current: Optional[Line] = None
+
+        # the lines with words waiting for a label, by address of the words,
+        # the branches waiting & those out of range
+        self.words: Dict[int, Line] = {}
+        self.waits: List[int] = []
+        self.jumps: Set[int] = set()
+        self.far: List = []
+
+        # the lines written whose address can change, recorded in a
+        # temporary file, the extents not placed yet & the extents moved
+        self.records = array('q')
+        self.spill: Optional[IO[bytes]] = None
+        self.unplaced: Set[int] = set()
+        self.moved: Dict[int, Callable[[int], int]] = {}
+
+        # the branches relaxed, listed again on the standard output
+        self.relaxed: List[Tuple[int, int, int]] = []
+
+    def number(self, extent: Extent) -> int:
+        """The number of an extent"""
+        number = self.numbers.get(id(extent))
+        if number is None:
+            number = self.numbers[id(extent)] = len(self.extents)
+            self.extents.append(extent)
+        return number
+
+    def track(self, statements: Iterable[ast.Statement], current: Callable[[], Extent],
+              far: List) -> Iterator[ast.Statement]:
+        """Hand the statements to the encoder, each one is listed once it has
+        been encoded in the current extent (far are the branches out of
+        range)"""
+        self.far = far
+        block = self.block
+        for stmt in statements:
+            extent = current()
+            size = extent.size
+            yield stmt
+            self.count += 1
+
+            # a statement that changes the extent doesn't write any byte
+            after = current()
+            start = size if after is extent else after.size
+            number = self.number(after)
+
+            line = self.current
+            if stmt.line is None and line is not None and line.number == number and line.end == start:
+                line.end = after.size
+            else:
+                line = self.current = Line(stmt.line or "", number, start, after.size)
+                block.append(line)
+            if type(stmt) is ast.Instruction:
+                line.words = True
+
+            if self.waits:
+                for address in self.waits:
+                    self.words[address] = line
+                line.waiting += len(self.waits)
+                self.waits.clear()
+
+            if len(block) > BLOCK:
+                self.flush()
+
+    def settled(self) -> bool:
+        """True when no branch waits for its label or is out of range"""
+        return not self.jumps and not self.far
+
+    def wait(self, address: int, branch: bool) -> None:
+        """A word of the statement being encoded waits for a label"""
+        self.waits.append(address)
+        if branch:
+            self.jumps.add(address)
+
+    def patched(self, address: int, resolved: bool = True) -> None:
+        """A word waiting for a label has been encoded again, unless the
+        branch is out of range (resolved is False)"""
+        self.jumps.discard(address)
+        line = self.words.pop(address, None)
+        if line is None:
+            return
+
+        line.waiting -= 1
+        if line.position < 0 or (not resolved and self.out is None):
+            return
+
+        if self.out is not None:
+            if not line.waiting:
+                self.rewrite(line.position, line.number, line.start, line.end, line.words)
+            return
+
+        # the word is listed again, after its line
+        start = address - self.extents[line.number].address
+        self.block.append(Line("; resolved", line.number, start, start + 4, line.words))
+
+    def move(self, extent: Extent, shift: Callable[[int], int], relaxed: List[Tuple[int, int]]) -> None:
+        """Follow the bytes of an extent that grows, shift returns the bytes
+        added before an address & relaxed holds the new address & size of the
+        branches relaxed"""
+        number = self.numbers.get(id(extent))
+        if number is None:
+            return
+        self.moved[number] = shift
+
+        address, end = extent.address, extent.end
+        lines = { id(line): line for line in [ *self.words.values(), *self.block ] }
+        for line in lines.values():
+            if line.number == number:
+                line.start += shift(address + line.start)
+                line.end += shift(address + line.end)
+
+        # the words waiting for a label moved with them
+        self.words = { a + shift(a) if address <= a < end else a: line for a, line in self.words.items() }
+        self.jumps = { a + shift(a) if address <= a < end else a for a in self.jumps }
+
+        # the lines of an extent are written in order, up to the first one of the block
+        if self.out is None:
+            first = next((line.start for line in self.block if line.number == number), None)
+            self.relaxed.extend((number, a - address, size) for a, size in relaxed
+                                if first is None or a - address < first)
+
+    def close(self) -> None:
+        """Write the lines left once the module is closed, all the bytes &
+        addresses are final"""
+        self.flush(True)
+        self.current = None
+        self.words.clear()
+
+        if self.out is None:
+            self.annotate()
+            return
+
+        # the lines written before their extent was placed or moved
+        if self.spill is not None:
+            if self.moved or self.unplaced:
+                self.replay()
+            self.spill.close()
+            self.spill = None
+        del self.records[:]
+
+    # ----- output
+    def flush(self, final: bool = False) -> None:
+        """Write the lines of the block, except the current one that can
+        still grow"""
+        block = self.block
+        data: List[str] = []
+        position = self.position
+        records = self.records
+        settled = final or self.settled()
+
+        while block and (final or block[0] is not self.current):
+            line = block.popleft()
+            text = self.render(line)
+            data.append(text)
+            line.text = ""
+            line.position = position
+            if final:
+                continue
+
+            # the relocatable reservations are placed when the module is closed
+            placed = self.placed(line)
+            if not placed:
+                self.unplaced.add(line.number)
+            if self.out is None:
+                continue
+
+            position += len(text) if text.isascii() else len(text.encode())
+            if not placed or not settled:
+                records.extend((line.position, line.number, line.start, line.end, line.words))
+
+        if self.out is None:
+            self.fh.write("".join(data))
+            return
+
+        self.out.write("".join(data).encode())
+        self.position = position
+
+        # the records go to the temporary file, the memory used stays constant
+        if records:
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile()
+            records.tofile(self.spill)
+            del records[:]
+
+    def replay(self) -> None:
+        """Write again the lines recorded whose extent was placed or moved"""
+        spill = self.spill
+        spill.seek(0)                                                       # type: ignore
+        moved = self.moved
+        stale = self.unplaced | moved.keys()
+
+        done = False
+        while not done:
+            chunk = array('q')
+            try:
+                chunk.fromfile(spill, CHUNK)                                # type: ignore
+            except EOFError:
+                done = True
+
+            for i in range(0, len(chunk), FIELDS):
+                number = chunk[i + 1]
+                if number not in stale:
+                    continue
+                start, end = chunk[i + 2], chunk[i + 3]
+                shift = moved.get(number)
+                if shift is not None:
+                    address = self.extents[number].address
+                    start, end = start + shift(address + start), end + shift(address + end)
+                self.rewrite(chunk[i], number, start, end, bool(chunk[i + 4]))
+
+    def annotate(self) -> None:
+        """List again the branches relaxed & the address of the reservations
+        placed, on the standard output"""
+        notes = [ self.render(Line("; relaxed", number, start, start + size, True)) for number, start, size in self.relaxed ]
+        for number in sorted(self.unplaced):
+            notes.append(f"; the reservations above are placed at {self.extents[number].address:#010x}\n")
+        self.fh.write("".join(notes))
+        self.relaxed.clear()
+
+    def placed(self, line: Line) -> bool:
+        """True when the address of a line is known, unless a branch grows"""
+        extent = self.extents[line.number]
+        return extent.buffer is not None or extent.absolute
+
+    def render(self, line: Line) -> str:
+        """The text of a line"""
+        prefix = self.prefix(line.number, line.start, line.end, line.words)
+        text = line.text.rstrip()
+        return f"{prefix}  {text}\n" if text else f"{prefix}\n"
+
+    def prefix(self, number: int, start: int, end: int, words: bool) -> str:
+        """The address & the bytes of a line, always of the same width"""
+        extent = self.extents[number]
+        address = extent.address + start
+        if address > LAST:
+            raise SyntaxError(f"Error: address [{address:#x}] beyond 32 bits in the listing!")
+
+        buffer = extent.buffer
+        if buffer is None or end == start:
+            shown = ""
+        elif end - start == 4 and words:
+            # the most common case, a single instruction
+            shown = f"{WORD.unpack_from(buffer, start)[0]:08x}"
+        else:
+            shown = column(buffer[start:min(end, start + SHOWN)], end - start, words and (end - start) % 4 == 0)
+
+        return f"{address:08x}:  {shown:<{WIDTH}}"
+
+    def rewrite(self, position: int, number: int, start: int, end: int, words: bool) -> None:
+        """Write again the address & the bytes of a line"""
+        out = self.out
+        out.seek(position)                                                  # type: ignore
+        out.write(self.prefix(number, start, end, words).encode())          # type: ignore
+        out.seek(self.position)                                             # type: ignore
+
+
+#----- functions
+def column(data: bytes, size: int, words: bool) -> str:
+    """The bytes of a statement by groups of 4, as words or in memory order,
+    elided after SHOWN bytes"""
+    step = -1 if words else 1
+    groups = " ".join(data[i:i + 4][::step].hex() for i in range(0, len(data), 4))
+    return groups + " ..." if size > len(data) else groups
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Macro expansion on the stream of tokens
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import os
+
+from dataclasses import dataclass
+
+import packages.specs as specs
+
+from packages.token import Token
+from packages.include import Header, resolve
+from packages.specs import TokenType
+
+
+#----- globals
+
+# a macro & its arguments, as (type, value) of their tokens
+Key = Tuple[Any, Tuple[Tuple[Tuple[int, str], ...], ...]]
+
+# an expansion & where the tokens of the arguments go (index in the
+# expansion, argument, index in the argument)
+Expansion = Tuple[Tuple[Token, ...], Tuple[Tuple[int, int, int], ...]]
+
+# a source of tokens and its nesting level
+Frame = Tuple[Iterator[Token], int]
+
+# tokens closing the arguments of a statement macro
+ENDS = ( TokenType.EOL, TokenType.EOF )
+
+# tokens checked for each token of the stream
+MACRO = TokenType.MACRO
+FUNCTION = TokenType.FUNCTION
+IDENT = TokenType.IDENT
+DIRECTIVE = TokenType.DIRECTIVE
+
+
+#----- classes
+@dataclass(eq=False)
+class Macro:
+    """A macro definition
+
+    Members:
+        name       : the name used to invoke the macro
+        parameters : the names replaced by the arguments in the body
+        body       : the tokens of the definition
+        function   : True if the expansion is an expression, between parenthesis
+    """
+    name: str
+    parameters: List[str]
+    body: List[Token]
+    function: bool = False
+
+
+class Macros:
+    """Expand the macros while the tokens are streamed to the parser
+
+    Statement macros:
+        %macro name [parameter {, parameter}]
+            ...
+        %endmacro
+
+        %name [argument {, argument}]
+
+    Function-style macros and constants:
+        %define name(parameter {, parameter}) expression
+        %define NAME tokens
+
+        name(argument {, argument}) | %lo(argument) | %hi(argument) | NAME
+
+    Included files:
+        .include "file"
+
+    The expansions are pushed on a stack of token iterators and scanned
+    again lazily, so the expanded program is never built as a whole. The
+    expansions of identical arguments are memoized, the tokens of the
+    arguments are the ones of each call, with their position.
+
+    The included files are lexed once per process. When a file only
+    defines macros, the definitions are recorded and replayed the next
+    times it is included, without going through its tokens again.
+    """
+
+    def __init__(self, depth: int = 64, size: int = 1 << 22, memo: int = 4096,
+                 headers: Optional[Callable[[str], Header]] = None, directory: str = ".") -> None:
+        """Constructor
+
+        Args:
+            depth     : the maximum nesting level of the expansions & includes
+            size      : the maximum number of tokens produced by the expansions
+            memo      : the maximum number of expansions memoized
+            headers   : return the header of an included file
+            directory : where the included files are searched first
+        """
+        self.depth = depth
+        self.size = size
+        self.memo_size = memo
+        self.headers = headers
+
+        # the files included, in order, and the directory of the current one
+        self.dependencies: List[str] = []
+        self.included: Set[str] = set()
+        self.directories = [ directory ]
+
+        # the events of the headers being processed & the expansions count
+        self.recording: List[List[Any]] = []
+        self.invoked = 0
+
+        # statement macros by '%name', functions by 'name' (or '%name' for the builtins)
+        self.statements: Dict[str, Macro] = {}
+        self.functions: Dict[str, Macro] = dict(BUILTINS)
+        self.constants: Dict[str, Macro] = {}
+
+        self.memo: Dict[Key, Expansion] = {}
+        self.expanded = 0
+
+    def expand(self, tokens: Iterable[Token], level: int = 0) -> Iterator[Token]:
+        """Generate the tokens with all the macros expanded"""
+        functions = self.functions
+        constants = self.constants
+
+        stack: List[Frame] = [ (iter(tokens), level) ]
+        while stack:
+            source, level = stack[-1]
+            for token in source:
+                kind = token.type
+                if kind == MACRO:
+                    self.directive(token, source, stack, level)
+                    break
+
+                if kind == FUNCTION and token.value[:-1] in functions:
+                    macro = functions[token.value[:-1]]
+                    self.push(stack, level, macro, self.parenthesis(macro, source))
+                    break
+
+                if kind == IDENT and token.value in constants:
+                    self.push(stack, level, constants[token.value], [])
+                    break
+
+                if kind == DIRECTIVE and token.value == ".include":
+                    name, end = self.filename(source)
+                    yield from self.include(name, level)
+                    if end.type == TokenType.EOF:
+                        yield end
+                    continue
+
+                yield token
+            else:
+                stack.pop()
+
+    # ----- macros
+    def directive(self, token: Token, source: Iterator[Token], stack: List[Frame], level: int) -> None:
+        """Handle a '%name' token"""
+        name = token.value
+        if name == "%macro":
+            self.define(source)
+        elif name == "%define":
+            self.constant(source)
+        elif name in self.statements:
+            arguments, end = self.arguments(source, ENDS)
+
+            # give back the end of file after the expansion
+            if end.type == TokenType.EOF:
+                stack.append((iter((end,)), level))
+            self.push(stack, level, self.statements[name], arguments)
+        elif name in self.functions:
+            macro = self.functions[name]
+            opening = next(source, None)
+            if opening is None or opening.type != TokenType.LPARENT:
+                raise error("expecting '(' after the macro", token)
+            self.push(stack, level, macro, self.parenthesis(macro, source))
+        elif name == "%endmacro":
+            raise error("%endmacro without %macro", token)
+        else:
+            raise error("unknown macro", token)
+
+    def push(self, stack: List[Frame], level: int, macro: Macro, arguments: List[List[Token]]) -> None:
+        """Push the expansion of a macro on the stack"""
+        if level >= self.depth:
+            raise SyntaxError(f"Error: macro [{macro.name}] nested more than {self.depth} levels!")
+        self.invoked += 1
+
+        tokens = self.substitute(macro, arguments)
+        self.expanded += len(tokens)
+        if self.expanded > self.size:
+            raise SyntaxError(f"Error: the macro expansions exceed {self.size} tokens!")
+
+        stack.append((iter(tokens), level + 1))
+
+    def substitute(self, macro: Macro, arguments: List[List[Token]]) -> Tuple[Token, ...]:
+        """Replace the parameters of the body by the arguments (memoized)"""
+        if len(arguments) != len(macro.parameters):
+            raise SyntaxError(f"Error: macro [{macro.name}] expects {len(macro.parameters)} argument(s), got {len(arguments)}!")
+
+        key = (macro, tuple(tuple((t.type, t.value) for t in argument) for argument in arguments))
+        entry = self.memo.get(key)
+        if entry is not None:
+            tokens, slots = entry
+            if not slots:
+                return tokens
+
+            # the same values, from this call
+            expansion = list(tokens)
+            for index, argument, position in slots:
+                expansion[index] = arguments[argument][position]
+            return tuple(expansion)
+
+        # the expression keeps its precedence where it is used
+        expansion: List[Token] = []
+        if macro.function:
+            expansion.append(Token(TokenType.LPARENT, "(", macro.body[0].row, macro.body[0].col))
+
+        parameters = { name: index for index, name in enumerate(macro.parameters) }
+        places: List[Tuple[int, int, int]] = []
+        for token in macro.body:
+            if token.type == TokenType.IDENT and token.value in parameters:
+                argument = parameters[token.value]
+                places.extend((len(expansion) + i, argument, i) for i in range(len(arguments[argument])))
+                expansion.extend(arguments[argument])
+            else:
+                expansion.append(token)
+
+        if macro.function:
+            expansion.append(Token(TokenType.RPARENT, ")", macro.body[-1].row, macro.body[-1].col))
+
+        tokens = tuple(expansion)
+        if len(self.memo) >= self.memo_size:
+            del self.memo[next(iter(self.memo))]
+        self.memo[key] = (tokens, tuple(places))
+        return tokens
+
+    # ----- definitions
+    def define(self, source: Iterator[Token]) -> None:
+        """%macro name [parameter {, parameter}] ... %endmacro"""
+        token = next(source, None)
+        if token is None or token.type != TokenType.IDENT:
+            raise error("expecting the name of the macro", token)
+
+        name = "%" + token.value
+        parameters = self.parameters(source, ENDS)
+
+        body: List[Token] = []
+        for token in source:
+            if token.type == TokenType.MACRO and token.value == "%endmacro":
+                break
+            if token.type == TokenType.MACRO and token.value == "%macro":
+                raise error("nested macro definition", token)
+            body.append(token)
+        else:
+            raise SyntaxError(f"Error: missing %endmacro for macro [{name}]!")
+
+        # the rest of the %endmacro line
+        self.arguments(source, ENDS)
+        self.record(Macro(name, parameters, body))
+
+    def constant(self, source: Iterator[Token]) -> None:
+        """%define name(parameter {, parameter}) expression | %define NAME tokens"""
+        token = next(source, None)
+        if token is None or token.type not in (TokenType.IDENT, TokenType.FUNCTION):
+            raise error("expecting the name of the macro", token)
+
+        function = token.type == TokenType.FUNCTION
+        name = token.value[:-1] if function else token.value
+        parameters = self.parameters(source, (TokenType.RPARENT, )) if function else []
+
+        body: List[Token] = []
+        for token in source:
+            if token.type in ENDS:
+                break
+            body.append(token)
+
+        if not body:
+            raise error("empty macro", token)
+
+        self.record(Macro(name, parameters, body, function))
+
+    def record(self, macro: Macro) -> None:
+        """Register a new definition, as an event of the header being processed"""
+        self.register(macro)
+        if self.recording:
+            self.recording[-1].append(macro)
+
+    def register(self, macro: Macro) -> None:
+        """Register a new definition"""
+        if macro.function:
+            self.functions[macro.name] = macro
+        elif macro.name.startswith("%"):
+            self.statements[macro.name] = macro
+        else:
+            self.constants[macro.name] = macro
+
+    def parameters(self, source: Iterator[Token], ends: Tuple[TokenType, ...]) -> List[str]:
+        """The names of the parameters, up to the end token"""
+        parameters: List[str] = []
+        arguments, end = self.arguments(source, ends)
+        for argument in arguments:
+            if len(argument) != 1 or argument[0].type != TokenType.IDENT:
+                raise error("invalid macro parameter", argument[0] if argument else end)
+            parameters.append(argument[0].value)
+
+        return parameters
+
+    # ----- included files
+    def filename(self, source: Iterator[Token]) -> Tuple[str, Token]:
+        """The "file" of an include, and the token ending the line"""
+        token = next(source, None)
+        if token is None or token.type != TokenType.STRING:
+            raise error("expecting the name of the included file", token)
+
+        end = next(source, None) or Token(TokenType.EOF)
+        if end.type not in ENDS:
+            raise error("unexpected token", end)
+
+        return (token.value[1:-1], end)
+
+    def include(self, name: str, level: int) -> Iterator[Token]:
+        """Generate the tokens of an included file"""
+        if self.headers is None:
+            raise SyntaxError(f"Error: cannot include [{name}] here!")
+
+        yield from self.enter(resolve(name, self.directories[-1]), level)
+
+    def enter(self, path: str, level: int) -> Iterator[Token]:
+        """Generate the tokens of an included file, or replay its definitions"""
+        if level >= self.depth:
+            raise SyntaxError(f"Error: [{path}] included more than {self.depth} levels deep!")
+
+        header = self.headers(path)                                 # type: ignore
+        if self.recording:
+            self.recording[-1].append(path)
+
+        if path in self.included:
+            if header.once:
+                return
+        else:
+            self.included.add(path)
+            self.dependencies.append(path)
+
+        self.directories.append(os.path.dirname(path))
+        try:
+            # only defines macros, already processed once
+            if header.events is not None:
+                for event in header.events:
+                    if isinstance(event, str):
+                        yield from self.enter(event, level + 1)
+                    else:
+                        self.register(event)
+                return
+
+            invoked = self.invoked
+            emitted = False
+            self.recording.append([])
+            try:
+                for token in self.expand(header.tokens, level + 1):
+                    if token.type != TokenType.EOL:
+                        emitted = True
+                    yield token
+            finally:
+                events = self.recording.pop()
+
+            # the definitions don't depend on the macros already defined
+            if not emitted and self.invoked == invoked:
+                header.events = events
+        finally:
+            self.directories.pop()
+
+    # ----- arguments
+    def parenthesis(self, macro: Macro, source: Iterator[Token]) -> List[List[Token]]:
+        """The arguments of a function, up to the closing parenthesis"""
+        arguments, end = self.arguments(source, (TokenType.RPARENT, ))
+        if end.type != TokenType.RPARENT:
+            raise error(f"missing ')' for the macro [{macro.name}]", end)
+
+        return arguments
+
+    def arguments(self, source: Iterator[Token], ends: Tuple[TokenType, ...]) -> Tuple[List[List[Token]], Token]:
+        """Split the tokens on the commas, up to the end token
+
+        The commas and the end tokens between parenthesis are part of the
+        arguments.
+        """
+        arguments: List[List[Token]] = []
+        current: List[Token] = []
+        nested = 0
+        for token in source:
+            kind = token.type
+            if nested == 0 and (kind in ends or kind == TokenType.EOF):
+                break
+
+            if kind == TokenType.LPARENT or kind == TokenType.FUNCTION:
+                nested += 1
+            elif kind == TokenType.RPARENT:
+                nested -= 1
+            elif kind == TokenType.COMMA and nested == 0:
+                arguments.append(current)
+                current = []
+                continue
+            elif kind == TokenType.EOL or kind == TokenType.EOF:
+                break
+
+            current.append(token)
+        else:
+            token = Token(TokenType.EOF)
+
+        if current or arguments:
+            arguments.append(current)
+
+        return (arguments, token)
+
+
+#----- functions
+def error(message: str, token: Optional[Token]) -> SyntaxError:
+    """Build a syntax error pointing to a token"""
+    if token is None or token.type == TokenType.EOF:
+        return SyntaxError(f"Error: {message} at end of file!")
+    return SyntaxError(f"Error: {message} [{token.value}] at ({token.row}, {token.col})!")
+
+def tokenize(text: str) -> List[Token]:
+    """Tokenize the body of a builtin macro"""
+    tokens: List[Token] = []
+    for match in specs.RE_PATTERNS.finditer(text):
+        kind = match.lastgroup
+        if kind and kind not in (TokenType.SKIP.name, TokenType.COMMENT.name):
+            tokens.append(Token(TokenType[kind], match.group(), 0, match.start() + 1))
+
+    return tokens
+
+def builtin(name: str, body: str) -> Macro:
+    """Create a builtin function-style macro of a single parameter 'x'"""
+    return Macro(name, ['x'], tokenize(body), True)
+
+# %hi/%lo split an address for lui/auipc + addi/load/store (the low part is signed)
+BUILTINS = {
+    '%hi': builtin('%hi', "((x) + 0x800) >> 12"),
+    '%lo': builtin('%lo', "(x) - ((((x) + 0x800) >> 12) << 12)"),
+}
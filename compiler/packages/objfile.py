@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Relocatable object files
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import os
+import mmap
+import struct
+import marshal
+
+import packages.ast as ast
+
+from packages.assembler import Module, collector_paused
+from packages.encoder import Encoder
+from packages.section import Extent, Section
+from packages.symbols import Fixup
+
+
+#----- globals
+
+# the first bytes of an object file
+MAGIC = b"N32O"
+
+# layout of the object files, to change whenever it changes
+VERSION = 2
+
+# extension of the object files
+EXTENSION = ".o"
+
+# magic, version, counts (extents, symbols, relocations, includes), then
+# the offsets of the tables, the strings, the operands & the data
+HEADER = struct.Struct("<4sHH4I7I")
+
+# name (offset, length), flags, address, size, offset of the data
+EXTENT = struct.Struct("<IIIIII")
+
+# name (offset, length), value, flags
+SYMBOL = struct.Struct("<IIII")
+
+# address, base word, encoder, flags, operands (offset, length)
+RELOCATION = struct.Struct("<IIBB2xII")
+
+# name (offset, length)
+STRING = struct.Struct("<II")
+
+# flags of the extents, the symbols & the relocations
+ABSOLUTE = 1
+BSS = 2
+FIXED = 1
+EXTERNAL = 2
+GLOBAL = 4
+
+# encoders of the relocations, by code
+ENCODERS: List[Callable] = [
+    Encoder.type_r, Encoder.type_i, Encoder.type_csr, Encoder.type_s,
+    Encoder.type_b, Encoder.type_u, Encoder.type_j, Encoder.item,
+]
+CODES = { encode: code for code, encode in enumerate(ENCODERS) }
+
+
+#----- classes
+class Strings:
+    """The strings of an object file being written, stored once"""
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.data = bytearray()
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+
+    def add(self, value: str) -> Tuple[int, int]:
+        """Return the (offset, length) of a string"""
+        found = self.offsets.get(value)
+        if found is None:
+            encoded = value.encode()
+            found = (len(self.data), len(encoded))
+            self.data += encoded
+            self.offsets[value] = found
+        return found
+
+
+class ObjectFile:
+    """An object file, memory-mapped
+
+    Only the header is read when the file is opened, each table is decoded
+    in bulk when it is requested, straight from the map.
+    """
+
+    def __init__(self, filename: str, offset: int = 0) -> None:
+        """Constructor
+
+        Args:
+            filename : the object file, or a file holding one
+            offset   : where the object file starts in the file
+        """
+        self.filename = filename
+        with open(filename, "rb") as fh:
+            try:
+                self.map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SyntaxError(f"Error: [{filename}] is not an object file!")
+
+        if len(self.map) < offset + HEADER.size or self.map[offset:offset + len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise SyntaxError(f"Error: [{filename}] is not an object file!")
+
+        fields = HEADER.unpack_from(self.map, offset)
+        version = fields[1]
+        self.extent_count, self.symbol_count, self.relocation_count, self.include_count = fields[3:7]
+
+        # the offsets of the tables are relative to the header
+        (self.extents_offset, self.symbols_offset, self.relocations_offset, self.includes_offset,
+         self.strings_offset, self.operands_offset, self.data_offset) = ( o + offset for o in fields[7:] )
+
+        if version != VERSION:
+            self.map.close()
+            raise SyntaxError(f"Error: [{filename}] has an unsupported object format [{version}]!")
+
+    def string(self, offset: int, length: int) -> str:
+        """A string of the strings table"""
+        start = self.strings_offset + offset
+        return self.map[start:start + length].decode()
+
+    def table(self, layout: struct.Struct, offset: int, count: int) -> Iterator[Tuple[Any, ...]]:
+        """The records of a table"""
+        records = self.map[offset:offset + layout.size * count]
+        if len(records) != layout.size * count:
+            raise SyntaxError(f"Error: the object file [{self.filename}] is truncated!")
+        return layout.iter_unpack(records)
+
+    def sections(self) -> Dict[str, Section]:
+        """The sections, the bytes are copied out of the map"""
+        sections: Dict[str, Section] = {}
+        for start, length, flags, address, size, data in self.table(EXTENT, self.extents_offset, self.extent_count):
+            name = self.string(start, length)
+            section = sections.get(name)
+            if section is None:
+                section = Section(name, bool(flags & BSS))
+                section.extents.clear()
+                sections[name] = section
+
+            extent = Extent(address, bool(flags & ABSOLUTE), bool(flags & BSS))
+            extent.size = size
+            if extent.buffer is not None:
+                start = self.data_offset + data
+                extent.buffer = bytearray(self.map[start:start + size])
+            section.extents.append(extent)
+
+        return sections
+
+    def symbols(self) -> Tuple[Dict[str, int], Set[str], Set[str]]:
+        """The symbols by name, the names of the fixed ones & of the global ones"""
+        strings = self.map[self.strings_offset:self.operands_offset]
+        symbols: Dict[str, int] = {}
+        fixed: Set[str] = set()
+        exports: Set[str] = set()
+        for start, length, value, flags in self.table(SYMBOL, self.symbols_offset, self.symbol_count):
+            name = strings[start:start + length].decode()
+            symbols[name] = value
+            if flags & FIXED:
+                fixed.add(name)
+            if flags & GLOBAL:
+                exports.add(name)
+
+        return symbols, fixed, exports
+
+    def relocations(self) -> Tuple[List[Fixup], List[Fixup]]:
+        """The relocations & the references to other modules"""
+        operands = self.map[self.operands_offset:self.data_offset]
+        relocations: List[Fixup] = []
+        fixups: List[Fixup] = []
+        with collector_paused():
+            for address, base, code, flags, start, length in self.table(RELOCATION, self.relocations_offset, self.relocation_count):
+                fixup = Fixup(address, base, ENCODERS[code], thaw(marshal.loads(operands[start:start + length])), bool(flags & FIXED))
+                (fixups if flags & EXTERNAL else relocations).append(fixup)
+
+        return relocations, fixups
+
+    def includes(self) -> List[str]:
+        """The files included by the source"""
+        return [ self.string(start, length) for start, length in self.table(STRING, self.includes_offset, self.include_count) ]
+
+    def module(self) -> Module:
+        """The module stored in the file"""
+        symbols, fixed, exports = self.symbols()
+        relocations, fixups = self.relocations()
+        return Module(self.filename, self.sections(), symbols, fixed, exports, relocations, fixups, self.includes())
+
+    def close(self) -> None:
+        self.map.close()
+
+
+#----- functions
+def freeze(node: Any) -> Any:
+    """Convert an operand into nested tuples that marshal can store"""
+    if isinstance(node, ast.Number):
+        return ('n', node.value)
+    if isinstance(node, ast.Identifier):
+        return ('i', node.value)
+    if isinstance(node, ast.String):
+        return ('s', node.value)
+    if isinstance(node, ast.BinaryOp):
+        return ('b', node.op, freeze(node.left), freeze(node.right))
+    if isinstance(node, ast.UnaryOp):
+        return ('u', node.op, freeze(node.operand))
+    if isinstance(node, ast.Memory):
+        return ('m', freeze(node.offset), node.base)
+    if isinstance(node, list):
+        return tuple(freeze(item) for item in node)
+
+    raise SyntaxError(f"Error: [{node}] cannot be stored in an object file!")
+
+def thaw(value: Any) -> Any:
+    """Convert nested tuples back into an operand"""
+    kind = value[0] if value else None
+    if kind == 'n':
+        return ast.Number(value[1])
+    if kind == 'i':
+        return ast.Identifier(value[1])
+    if kind == 's':
+        return ast.String(value[1])
+    if kind == 'b':
+        return ast.BinaryOp(value[1], thaw(value[2]), thaw(value[3]))
+    if kind == 'u':
+        return ast.UnaryOp(value[1], thaw(value[2]))
+    if kind == 'm':
+        return ast.Memory(thaw(value[1]), value[2])
+
+    return [ thaw(item) for item in value ]
+
+def is_object(filename: str) -> bool:
+    """True if the file is an object file"""
+    try:
+        with open(filename, "rb") as fh:
+            return fh.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def save(module: Module, filename: str) -> None:
+    """Write a module as an object file, atomically"""
+    temp = f"{filename}.{os.getpid()}"
+    try:
+        with open(temp, "wb") as fh:
+            for block in dump(module):
+                fh.write(block)
+        os.replace(temp, filename)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        raise
+
+def dump(module: Module) -> List[bytes]:
+    """The blocks of the object file of a module, in order"""
+    strings = Strings()
+
+    # the extents & their bytes
+    extents = bytearray()
+    data = bytearray()
+    count = 0
+    for name, section in module.sections.items():
+        for extent in section.extents:
+            flags = (ABSOLUTE if extent.absolute else 0) | (BSS if extent.buffer is None else 0)
+            extents += EXTENT.pack(*strings.add(name), flags, extent.address, extent.size, len(data))
+            if extent.buffer is not None:
+                data += extent.view()
+                data += bytes(-len(data) & 3)
+            count += 1
+
+    symbols = bytearray()
+    for name, value in module.symbols.items():
+        flags = (FIXED if name in module.fixed else 0) | (GLOBAL if name in module.exports else 0)
+        symbols += SYMBOL.pack(*strings.add(name), value, flags)
+
+    relocations = bytearray()
+    operands = bytearray()
+    for fixups, flags in ((module.relocations, 0), (module.fixups, EXTERNAL)):
+        for fixup in fixups:
+            stored = marshal.dumps(freeze(fixup.operands))
+            relocations += RELOCATION.pack(fixup.address, fixup.base, CODES[fixup.encode],
+                                           flags | (FIXED if fixup.fixed else 0), len(operands), len(stored))
+            operands += stored
+
+    includes = bytearray()
+    for name in module.includes:
+        includes += STRING.pack(*strings.add(name))
+
+    # the tables follow the header, in this order
+    offsets = []
+    offset = HEADER.size
+    for block in (extents, symbols, relocations, includes, strings.data, operands):
+        offsets.append(offset)
+        offset += len(block)
+    padding = bytes(-offset & 3)
+    offsets.append(offset + len(padding))
+
+    header = HEADER.pack(MAGIC, VERSION, 0, count, len(module.symbols),
+                         len(module.relocations) + len(module.fixups), len(module.includes), *offsets)
+
+    return [ header, extents, symbols, relocations, includes, strings.data, operands, padding, data ]
@@ -13,16 +13,63 @@
 
 #----- imports
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import packages.ast as ast
 
 from packages.token import TokenStream, Token
 from packages.specs import TokenType
+from packages.snapshot import tables
+from packages.expression import fold, number
+
+
+#----- globals
+
+# register number by name
+REGISTERS: Dict[str, int] = tables()['registers']
+
+# binary operators: precedence & symbol, by token type
+OPERATORS: Dict[TokenType, Tuple[int, str]] = {
+    TokenType.OR: (1, '|'),
+    TokenType.XOR: (2, '^'),
+    TokenType.AND: (3, '&'),
+    TokenType.LSHIFT: (4, '<<'),
+    TokenType.RSHIFT: (4, '>>'),
+    TokenType.PLUS: (5, '+'),
+    TokenType.MINUS: (5, '-'),
+    TokenType.STAR: (6, '*'),
+    TokenType.SLASH: (6, '/'),
+    TokenType.MODULO: (6, '%'),
+}
+
+# binary operators indexed by the token type value
+BINARY: List[Optional[Tuple[int, str]]] = [ OPERATORS.get(t) for t in [ TokenType.UNKNOWN ] + list(TokenType) ]  # type: ignore
+
+# pending operators that are not binary: unary signs & open parentheses, their
+# precedence keeps them on the stack while the binary operators are reduced
+PREFIX = 0
+OPEN = (PREFIX, '(')
+
+# tokens ending a statement
+END = [ False ] * len(BINARY)
+END[TokenType.EOL] = END[TokenType.EOF] = True
+
+# tokens ending an operand
+SEPARATORS = list(END)
+SEPARATORS[TokenType.COMMA] = True
+
 
 #----- class
 class Parser:
-    """Parse the stream of tokens"""
+    """Parse the stream of tokens
+
+    The parser dispatches on the type of the next token through tables
+    indexed by the TokenType value, built once for all the instances.
+    """
+
+    # statement & primary expression parsers, by token type value
+    STATEMENTS: List[Callable[[Parser], Optional[ast.Statement]]] = []
+    PRIMARIES: List[Callable[[Parser], ast.Expression]] = []
 
     def __init__(self, tokens: TokenStream) -> None:
         """Constructor"""
@@ -38,33 +85,242 @@ class Parser:
 
         return ast.Program(statements)
 
-    def parse(self):
-        # retrieve all the tokens for this statement
-        tokens: List[Token] = []
+    def statements(self) -> Iterator[ast.Statement]:
+        """Generate the statements as they are parsed, each one with the text
+        of its source line"""
+        tokens = self.tokens
+        label = False
+        while (not tokens.end()):
+            token = tokens.peek()
+            line = None if label else token.line                    # type: ignore
+            stmt = self.parse()
+            if stmt:
+                stmt.line = line
+                yield stmt
+
+            # the statements after a label are on its line
+            label = type(stmt) is ast.Label
+
+    def parse(self) -> Optional[ast.Statement]:
+        """Parse a single statement"""
+        return self.STATEMENTS[self.tokens.peek_type()](self)
+
+    # ----- helpers
+    def error(self, message: str, token: Optional[Token] = None) -> SyntaxError:
+        """Build a syntax error pointing to a token"""
+        if token is None:
+            token = self.tokens.peek()
+        if token is None:
+            return SyntaxError(f"Error: {message} at end of file!")
+        return SyntaxError(f"Error: {message} [{token.value}] at ({token.row}, {token.col})!")
+
+    def end_of_statement(self) -> None:
+        """Consume the end of the statement"""
+        if not END[self.tokens.peek_type()]:
+            raise self.error("unexpected token")
+
+        self.tokens.next()
+
+    # ----- statements
+    def empty(self) -> None:
+        """Empty line or end of file"""
+        self.tokens.next()
+        return None
+
+    def label(self) -> ast.Statement:
+        """label: (the rest of the line is parsed as another statement)"""
+        return ast.Label(self.tokens.next_value()[:-1])
+
+    def instruction(self) -> ast.Statement:
+        """mnemonic [operand {, operand}] | name .directive [arguments]"""
+        tokens = self.tokens
+        if tokens.peek_type(1) == TokenType.DIRECTIVE:
+            left = ast.Identifier(tokens.next_value())
+            return self.directive(left)
+
+        opcode = tokens.next_value()
+        operands: List[ast.Expression] = []
+        if not END[tokens.peek_type()]:
+            operands.append(self.operand())
+            while tokens.peek_type() == TokenType.COMMA:
+                tokens.next()
+                operands.append(self.operand())
+
+        self.end_of_statement()
+        return ast.Instruction(opcode, operands)
+
+    def directive(self, left: Optional[ast.Expression] = None) -> ast.Statement:
+        """.directive [argument {, argument}]"""
+        tokens = self.tokens
+        name = tokens.next_value()
+
+        right: Optional[ast.Expression] = None
+        if not END[tokens.peek_type()]:
+            right = self.expression()
+            if tokens.peek_type() == TokenType.COMMA:
+                items = [ right ]
+                while tokens.peek_type() == TokenType.COMMA:
+                    tokens.next()
+                    items.append(self.expression())
+                right = ast.ExpressionList(items)
+
+        self.end_of_statement()
+        return ast.Directive(name, left, right)
+
+    def unexpected(self) -> None:
+        """Any token that cannot start a statement"""
+        raise self.error("unexpected token")
+
+    # ----- operands
+    def operand(self) -> ast.Expression:
+        """expression | expression(register) | (register) | name(register)"""
+        tokens = self.tokens
+        kind = tokens.peek_type()
+
+        # (register)
+        if kind == TokenType.LPARENT and tokens.peek_type(2) == TokenType.RPARENT:
+            register = tokens.peek(1)
+            if register and register.type == TokenType.IDENT and register.value in REGISTERS:
+                tokens.next()
+                tokens.next()
+                tokens.next()
+                return ast.Memory(ast.Number(0), register.value)
+
+        # a single number (data lists)
+        if kind == TokenType.NUMBER and SEPARATORS[tokens.peek_type(1)]:
+            return self.number()
+
+        # symbol(register), the lexer sees 'symbol(' as a function
+        if kind == TokenType.FUNCTION:
+            name = tokens.next_value()[:-1]
+            return ast.Memory(ast.Identifier(name), self.register())
+
+        value = self.expression()
+        if tokens.peek_type() == TokenType.LPARENT:
+            tokens.next()
+            return ast.Memory(value, self.register())
+
+        return value
+
+    def register(self) -> str:
+        """register) at the end of a memory operand"""
+        tokens = self.tokens
+        token = tokens.next()
+        if not token or token.type != TokenType.IDENT or token.value not in REGISTERS:
+            raise self.error("expecting a register", token)
+
+        tokens.expect(TokenType.RPARENT)
+        return token.value
+
+    # ----- expressions
+    def expression(self) -> ast.Expression:
+        """Binary operations, unary signs & parentheses, by shunting-yard with
+        explicit stacks (constants are folded)
+
+        The nesting depth only grows the stacks, not the Python frames.
+        """
+        tokens = self.tokens
+        primaries = self.PRIMARIES
+        operands: List[ast.Expression] = []
+        operators: List[Tuple[int, str]] = []
+        depth = 0
         while True:
-            t = self.tokens.next()
-            if not t or t.type in [TokenType.EOL, TokenType.EOF]:
+            # the unary signs & the open parentheses before an operand
+            kind = tokens.peek_type()
+            while PREFIXES[kind]:
+                if kind == TokenType.LPARENT:
+                    tokens.next()
+                    operators.append(OPEN)
+                    depth += 1
+                else:
+                    operators.append((PREFIX, tokens.next_value()))
+                kind = tokens.peek_type()
+
+            operand = primaries[kind](self)
+
+            while True:
+                # the unary signs waiting for the operand
+                while operators and operators[-1][0] == PREFIX and operators[-1] is not OPEN:
+                    operand = fold(ast.UnaryOp(operators.pop()[1], operand))
+
+                kind = tokens.peek_type()
+                if not depth or kind != TokenType.RPARENT:
+                    break
+
+                # a parenthesis is closed, its operations are applied
+                tokens.next()
+                while operators[-1] is not OPEN:
+                    operand = fold(ast.BinaryOp(operators.pop()[1], operands.pop(), operand))
+                operators.pop()
+                depth -= 1
+
+            operator = BINARY[kind]
+            if operator is None:
                 break
-            else:
-                tokens.append(t)
-
-        # print(f"{' '.join(map(str, tokens))} {len(tokens)}")
-        if len(tokens) == 0:
-            return None
-
-        # single directive or label
-        if len(tokens) == 1:
-            t = tokens[0]
-            if t.type == TokenType.LABEL:
-                return ast.Label(t.value[:-1])
-            elif t.type == TokenType.DIRECTIVE:
-                return ast.Directive(t.value, None, None)
-            elif t.type == TokenType.IDENT:
-                return ast.Instruction(t.value, [])
-            else:
-                raise SyntaxError(f"Unknown token [{t.value}] at ({t.row}, {t.col})")
 
-        return None
+            # the operations on the left with a higher or equal precedence
+            tokens.next()
+            precedence = operator[0]
+            while operators and operators[-1][0] >= precedence:
+                operand = fold(ast.BinaryOp(operators.pop()[1], operands.pop(), operand))
+            operands.append(operand)
+            operators.append(operator)
+
+        if depth:
+            tokens.expect(TokenType.RPARENT)
+
+        while operators:
+            operand = fold(ast.BinaryOp(operators.pop()[1], operands.pop(), operand))
+        return operand
+
+    def number(self) -> ast.Expression:
+        token = self.tokens.next()
+        try:
+            return ast.Number(number(token.value))                  # type: ignore
+        except ValueError:
+            raise self.error("invalid number", token)
+
+    def char(self) -> ast.Expression:
+        return ast.Number(ord(self.tokens.next_value()[1]))
+
+    def string(self) -> ast.Expression:
+        return ast.String(self.tokens.next_value()[1:-1])
+
+    def identifier(self) -> ast.Expression:
+        return ast.Identifier(self.tokens.next_value())
+
+    def dollar(self) -> ast.Expression:
+        self.tokens.next()
+        return ast.Identifier('$')
+
+    def invalid(self) -> ast.Expression:
+        raise self.error("invalid expression")
+
+
+#----- dispatch tables
+def build_table(default: Callable, entries: Dict[TokenType, Callable]) -> List[Callable]:
+    """Build a table indexed by the TokenType value"""
+    table = [ default ] * (max(TokenType) + 1)
+    for kind, method in entries.items():
+        table[kind] = method
+    return table
 
+Parser.STATEMENTS = build_table(Parser.unexpected, {
+    TokenType.EOL: Parser.empty,
+    TokenType.EOF: Parser.empty,
+    TokenType.LABEL: Parser.label,
+    TokenType.IDENT: Parser.instruction,
+    TokenType.DIRECTIVE: Parser.directive,
+})
 
+Parser.PRIMARIES = build_table(Parser.invalid, {
+    TokenType.NUMBER: Parser.number,
+    TokenType.CHAR: Parser.char,
+    TokenType.STRING: Parser.string,
+    TokenType.IDENT: Parser.identifier,
+    TokenType.DOLLAR: Parser.dollar,
+})
 
+# tokens before an operand: unary signs & open parentheses
+PREFIXES = [ False ] * len(Parser.PRIMARIES)
+PREFIXES[TokenType.MINUS] = PREFIXES[TokenType.PLUS] = PREFIXES[TokenType.LPARENT] = True
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Messages exchanged with the assembler server
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+import socket
+import struct
+import marshal
+
+
+#----- globals
+
+# each message is prefixed by its size
+HEADER = struct.Struct("<I")
+
+
+#----- functions
+def send(sock: socket.socket, message: Dict[str, Any]) -> None:
+    """Send a message (a dictionary of builtin types)"""
+    data = marshal.dumps(message)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def receive(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Receive a message, None if the connection is closed"""
+    header = read(sock, HEADER.size)
+    if header is None:
+        return None
+
+    data = read(sock, HEADER.unpack(header)[0])
+    if data is None:
+        return None
+
+    return marshal.loads(data)
+
+def read(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly size bytes from the socket"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view:
+        count = sock.recv_into(view)
+        if count == 0:
+            return None
+        view = view[count:]
+
+    return bytes(buffer)
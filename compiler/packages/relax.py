@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Relaxation of the branches & jumps out of range
+
+#----- imports
+from __future__ import annotations
+from typing import Dict, List, Optional, Set, Tuple
+
+from bisect import bisect_left, bisect_right, insort
+from heapq import heapify, heappop, heappush
+
+import packages.ast as ast
+
+from packages.encoder import Encoder, ENCODERS, REGISTERS, WORD
+from packages.section import Extent
+from packages.symbols import Fixup, Unresolved
+
+
+#----- globals
+
+# range of the offsets: branch (13 bits), jump (21 bits)
+BRANCH = 1 << 12
+JUMP = 1 << 20
+
+
+#----- classes
+class Growth:
+    """Bytes added to each branch, with their prefix sums (Fenwick tree)"""
+
+    def __init__(self, count: int) -> None:
+        """Constructor"""
+        self.tree = [0] * (count + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        """Add bytes to a branch"""
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def before(self, index: int) -> int:
+        """Return the bytes added to the branches [0, index)"""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class Relaxation:
+    """Grow the branches of an extent until all their targets are in range
+
+    A branch too far is rewritten as:
+        b<inverted> rs1, rs2, +8 ; jal x0, target                       (8 bytes)
+
+    and a jump too far, that links, as:
+        auipc rd, hi ; jalr rd, lo(rd)                                  (8 bytes)
+
+    No register is free to reach farther without linking: the branches &
+    the jumps to x0 beyond the range of jal are errors.
+
+    The branches only grow, so the relaxation ends. When a branch grows,
+    only the branches spanning it are examined again: the ones close to
+    their limit (their slack is less than the total growth) are kept
+    sorted by address, the others cannot be out of range yet.
+    """
+
+    def __init__(self, encoder: Encoder, extent: Extent) -> None:
+        """Constructor"""
+        self.encoder = encoder
+        self.extent = extent
+
+        # the branches to the labels of the extent, in address order
+        self.branches: List[Fixup] = []
+        self.addresses: List[int] = []
+        self.targets: List[int] = []
+        for branch in encoder.branches:
+            if branch.address not in extent:
+                continue
+            target = self.target(branch)
+            if target is not None:
+                self.branches.append(branch)
+                self.addresses.append(branch.address)
+                self.targets.append(target)
+
+        count = len(self.branches)
+        self.jumps = [ b.encode == Encoder.type_j for b in self.branches ]
+        self.largest = [ 8 if not jump or linked(b) else 4 for b, jump in zip(self.branches, self.jumps) ]
+        self.indexes = [ bisect_left(self.addresses, t) for t in self.targets ]
+        self.sizes = [ 4 ] * count
+        self.growth = Growth(count)
+        self.total = 0
+
+    def target(self, branch: Fixup) -> Optional[int]:
+        """The address of the target, None if it is not a label of the extent"""
+        operand = branch.operands[-1]
+        if not isinstance(operand, ast.Identifier):
+            return None
+
+        if operand.value == '$':
+            return branch.address
+
+        if self.encoder.owners.get(operand.value) is not self.extent:
+            return None
+
+        return self.encoder.labels.symbols[operand.value]
+
+    # ----- layout
+    def shift(self, address: int) -> int:
+        """The bytes added before an address"""
+        return self.growth.before(bisect_left(self.addresses, address))
+
+    def need(self, index: int) -> int:
+        """The size needed by a branch in the current layout"""
+        pc = self.addresses[index] + self.growth.before(index)
+        offset = self.targets[index] + self.growth.before(self.indexes[index]) - pc
+
+        if self.jumps[index]:
+            return 4 if -JUMP <= offset < JUMP else 8
+
+        if -BRANCH <= offset < BRANCH:
+            return 4
+
+        # the jump follows the inverted branch, farther is out of range
+        return 8 if -JUMP <= offset - 4 < JUMP else 12
+
+    def limit(self, index: int) -> int:
+        """The range a branch must stay in before it grows again, 0 when it
+        cannot grow anymore"""
+        if self.jumps[index]:
+            return JUMP if self.sizes[index] == 4 else 0
+        return (BRANCH, JUMP, 0)[(self.sizes[index] >> 2) - 1]
+
+    def slack(self, index: int, limit: int) -> int:
+        """The bytes that can be added before the branch is out of its range"""
+        offset = self.targets[index] - self.addresses[index]
+        slack = (limit - 1 - offset) if offset >= 0 else (offset + limit)
+
+        # the jump after an inverted branch is a few bytes farther
+        return slack - 16 if limit == JUMP and not self.jumps[index] else slack
+
+    def run(self, far: List[Fixup]) -> None:
+        """Relax the branches of the extent"""
+        positions = { id(b): i for i, b in enumerate(self.branches) }
+        for branch in far:
+            if id(branch) not in positions:
+                raise SyntaxError(f"Error: branch target out of range at address [{branch.address:#x}]!")
+        worklist = [ positions[id(b)] for b in far ]
+
+        # the branches that cannot be out of their range yet, by slack
+        waiting = [ (self.slack(i, self.limit(i)), i, self.limit(i)) for i in range(len(self.branches)) ]
+        heapify(waiting)
+
+        # the branches close to the limit of their range, by address
+        active: Dict[int, List[Tuple[int, int]]] = { BRANCH: [], JUMP: [] }
+        spans = [ (min(a, t), max(a, t)) for a, t in zip(self.addresses, self.targets) ]
+
+        while worklist:
+            index = worklist.pop()
+            size = self.need(index)
+            if size <= self.sizes[index]:
+                continue
+
+            if size > self.largest[index]:
+                address = self.addresses[index] + self.growth.before(index)
+                raise SyntaxError(f"Error: branch target out of range at address [{address:#x}]!")
+
+            delta = size - self.sizes[index]
+            self.sizes[index] = size
+            self.growth.add(index, delta)
+            self.total += delta
+
+            # the branch waits for its next range
+            limit = self.limit(index)
+            if limit:
+                heappush(waiting, (self.slack(index, limit), index, limit))
+
+            # the branches now close to their limit
+            while waiting and waiting[0][0] <= self.total:
+                _, other, limit = heappop(waiting)
+                if limit != self.limit(other):
+                    continue
+                insort(active[limit], (self.addresses[other], other))
+                if self.need(other) > self.sizes[other]:
+                    worklist.append(other)
+
+            # the branches spanning the growth: their addresses before the
+            # relaxation are less than their range away from it
+            address = self.addresses[index]
+            for limit, branches in active.items():
+                first = bisect_left(branches, (address - limit - 16, -1))
+                last = bisect_right(branches, (address + limit + 16, len(self.branches)))
+                for _, other in branches[first:last]:
+                    low, high = spans[other]
+                    if low <= address < high and self.limit(other) == limit and self.need(other) > self.sizes[other]:
+                        worklist.append(other)
+
+    # ----- output
+    def apply(self) -> None:
+        """Move the bytes of the extent and update the addresses"""
+        extent = self.extent
+        start, end = extent.address, extent.end
+        old = extent.view()
+
+        # copy the bytes between the branches that grow
+        buffer = bytearray(extent.size + self.total)
+        source = 0
+        target = 0
+        for branch, size in zip(self.branches, self.sizes):
+            if size == 4:
+                continue
+            stop = branch.address - start + 4
+            buffer[target:target + stop - source] = old[source:stop]
+            target += stop - source + size - 4
+            source = stop
+        buffer[target:] = old[source:]
+
+        # labels of the extent
+        symbols = self.encoder.labels.symbols
+        for name, owner in self.encoder.owners.items():
+            if owner is extent:
+                symbols[name] += self.shift(symbols[name])
+
+        # the instructions recorded to be encoded again
+        encoder = self.encoder
+        fixups: Dict[int, Fixup] = {}
+        for group in [ encoder.branches, encoder.relocations, encoder.far ] + list(encoder.labels.fixups.values()):
+            for fixup in group:
+                fixups[id(fixup)] = fixup
+        for fixup in fixups.values():
+            if start <= fixup.address < end:
+                fixup.address += self.shift(fixup.address)
+
+        # the statements listed
+        if encoder.listing is not None:
+            relaxed = [ (b.address, size) for b, size in zip(self.branches, self.sizes) if size != 4 ]
+            encoder.listing.move(extent, self.shift, relaxed)
+
+        extent.buffer = buffer
+        extent.size = len(buffer)
+
+    def encode(self) -> Set[int]:
+        """Write the long sequences, return the branches written"""
+        written: Set[int] = set()
+        symbols = self.encoder.labels.symbols
+        for branch, size in zip(self.branches, self.sizes):
+            if size == 4:
+                continue
+
+            name = branch.operands[-1].value
+            target = branch.address if name == '$' else symbols[name]
+            offset = branch.address - self.extent.address
+            for word in sequence(self.encoder, branch, size, target):
+                WORD.pack_into(self.extent.buffer, offset, word)          # type: ignore
+                offset += 4
+            written.add(id(branch))
+
+        return written
+
+
+#----- functions
+def relax(encoder: Encoder) -> None:
+    """Relax the branches out of range of a module, then encode again the
+    instructions that depend on the addresses"""
+    far, encoder.far = encoder.far, []
+
+    written: Set[int] = set()
+    for section in encoder.sections.values():
+        for extent in section.extents:
+            # the reservations hold no branch, the relocatable ones are not placed yet
+            if extent.buffer is None:
+                continue
+
+            pending = [ b for b in far if b.address in extent ]
+            if not pending:
+                continue
+
+            relaxation = Relaxation(encoder, extent)
+            relaxation.run(pending)
+            relaxation.apply()
+            written |= relaxation.encode()
+
+    encoder.index = None
+
+    # the other branches & the absolute references moved with the labels
+    branches = [ b for b in encoder.branches if id(b) not in written ]
+    for fixup in branches:
+        extent = encoder.locate(fixup.address)
+        encoder.pc = fixup.address
+        encoder.placed = fixup.fixed
+        try:
+            WORD.pack_into(extent.buffer, fixup.address - extent.address, fixup.encode(encoder, fixup.base, fixup.operands))  # type: ignore
+        except Unresolved:
+            pass
+
+    relocations, encoder.relocations = encoder.relocations, []
+    encoder.patch(relocations)
+
+def sequence(encoder: Encoder, branch: Fixup, size: int, target: int) -> List[int]:
+    """The words of the long sequence of a branch"""
+    pc = branch.address
+    operands = branch.operands
+
+    if branch.encode == Encoder.type_j:
+        return far_jump(encoder, pc, link(branch), target)
+
+    # the inverted condition skips the jump
+    encoder.pc = pc
+    words = [ encoder.type_b(branch.base ^ (1 << 12), [ operands[0], operands[1], ast.Number(pc + size) ]) ]
+    encoder.pc = pc + 4
+    words.append(encoder.type_j(ENCODERS['jal'][0], [ ast.Identifier('x0'), ast.Number(target) ]))
+    return words
+
+def far_jump(encoder: Encoder, pc: int, link: ast.Expression, target: int) -> List[int]:
+    """auipc + jalr to any address, the link register holds the upper part"""
+    offset = target - pc
+    high = (offset + 0x800) >> 12
+    low = offset - (high << 12)
+
+    return [
+        encoder.type_u(ENCODERS['auipc'][0], [ link, ast.Number(high) ]),
+        encoder.type_i(ENCODERS['jalr'][0], [ link, link, ast.Number(low) ]),
+    ]
+
+def link(jump: Fixup) -> ast.Expression:
+    """The register linked by a jump"""
+    return jump.operands[0] if len(jump.operands) == 2 else ast.Identifier('ra')
+
+def linked(jump: Fixup) -> bool:
+    """True when a jump links a register, it can be used to reach farther"""
+    return REGISTERS[link(jump).value] != 0                                  # type: ignore
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	First-character dispatch scanner
+
+#----- imports
+from __future__ import annotations
+from typing import Dict, Iterator, List, Tuple
+
+import re
+
+import packages.specs as specs
+
+from packages.specs import TokenType
+
+
+#----- globals
+
+# classes of the first character of a token
+OTHER = 0                               # anything else, matched by the regexp
+SPACE = 1                               # ' ' '\t'
+WORD = 2                                # [A-Za-z_]
+DIGIT = 3                               # [0-9]
+SINGLE = 4                              # single character operators
+COMMENT = 5                             # ';'
+DOT = 6                                 # '.'
+PERCENT = 7                             # '%'
+DQUOTE = 8                              # '"'
+SQUOTE = 9                              # "'"
+SHIFT = 10                              # '<' '>'
+
+# class of each ASCII character
+CLASSES: List[int] = [ OTHER ] * 128
+for c in " \t":
+    CLASSES[ord(c)] = SPACE
+for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_":
+    CLASSES[ord(c)] = WORD
+for c in "0123456789":
+    CLASSES[ord(c)] = DIGIT
+for c in "(),+-*/&|^$":
+    CLASSES[ord(c)] = SINGLE
+CLASSES[ord(';')] = COMMENT
+CLASSES[ord('.')] = DOT
+CLASSES[ord('%')] = PERCENT
+CLASSES[ord('"')] = DQUOTE
+CLASSES[ord("'")] = SQUOTE
+CLASSES[ord('<')] = SHIFT
+CLASSES[ord('>')] = SHIFT
+
+# token code of the single character operators
+SINGLES: Dict[str, int] = {
+    '(': TokenType.LPARENT, ')': TokenType.RPARENT, ',': TokenType.COMMA,
+    '+': TokenType.PLUS, '-': TokenType.MINUS, '*': TokenType.STAR,
+    '/': TokenType.SLASH, '&': TokenType.AND, '|': TokenType.OR,
+    '^': TokenType.XOR, '$': TokenType.DOLLAR,
+}
+
+# token codes
+FUNCTION = TokenType.FUNCTION.value
+LABEL = TokenType.LABEL.value
+IDENT = TokenType.IDENT.value
+NUMBER = TokenType.NUMBER.value
+DIRECTIVE = TokenType.DIRECTIVE.value
+MACRO = TokenType.MACRO.value
+MODULO = TokenType.MODULO.value
+STRING = TokenType.STRING.value
+QUOTE = TokenType.QUOTE.value
+CHAR = TokenType.CHAR.value
+LSHIFT = TokenType.LSHIFT.value
+RSHIFT = TokenType.RSHIFT.value
+
+# token codes by group name, for the fallback
+CODES = { t.name: t.value for t in TokenType }
+IGNORED = { TokenType.SKIP.name, TokenType.COMMENT.name }
+
+# runs of characters once the class of the token is known
+RE_SPACES = re.compile(r'[ \t]*')
+RE_WORD = re.compile(r'[A-Za-z0-9_]*')
+RE_IDENT = re.compile(r'[A-Za-z0-9_-]*')
+RE_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+RE_LETTERS = re.compile(r'[A-Za-z_]+')
+RE_DIGITS = re.compile(r'[0-9]*')
+RE_HEX = re.compile(r'0x[a-zA-Z0-9_]+')
+RE_BIN = re.compile(r'0b[01_]+')
+
+
+#----- functions
+def scan(source: str, pos: int, end: int) -> Iterator[Tuple[int, int, int]]:
+    """Generate the (code, start, end) of the tokens between pos and end
+
+    The first character of each token selects what to match, the token
+    patterns regexp is only used for the rare cases not handled here. The
+    tokens are the same as the ones found by RE_PATTERNS.finditer().
+    """
+    classes = CLASSES
+    singles = SINGLES
+    spaces = RE_SPACES.match
+    word = RE_WORD.match
+    ident = RE_IDENT.match
+
+    while pos < end:
+        c = source[pos]
+        o = ord(c)
+        kind = classes[o] if o < 128 else OTHER
+
+        if kind == SPACE:
+            pos = spaces(source, pos + 1, end).end()
+            continue
+
+        if kind == WORD:
+            stop = word(source, pos + 1, end).end()
+            if stop < end:
+                c = source[stop]
+                if c == '(':
+                    yield (FUNCTION, pos, stop + 1)
+                    pos = stop + 1
+                    continue
+                if c == ':':
+                    yield (LABEL, pos, stop + 1)
+                    pos = stop + 1
+                    continue
+                if c == '-':
+                    stop = ident(source, stop, end).end()
+
+            yield (IDENT, pos, stop)
+            pos = stop
+            continue
+
+        if kind == SINGLE:
+            yield (singles[c], pos, pos + 1)
+            pos += 1
+            continue
+
+        if kind == COMMENT:
+            # the comment runs to the end of the line
+            stop = source.find('\n', pos, end)
+            pos = end if stop < 0 else stop
+            continue
+
+        if kind == DIGIT and (pos == 0 or not (source[pos - 1].isalnum() or source[pos - 1] == '_')):
+            match = None
+            if c == '0' and pos + 1 < end:
+                if source[pos + 1] == 'x':
+                    match = RE_HEX.match(source, pos, end)
+                elif source[pos + 1] == 'b':
+                    match = RE_BIN.match(source, pos, end)
+
+            if match:
+                stop = match.end()
+            else:
+                stop = RE_DIGITS.match(source, pos + 1, end).end()
+                if stop < end and (source[stop].isalnum() or source[stop] == '_'):
+                    stop = -1
+
+            if stop > 0:
+                yield (NUMBER, pos, stop)
+                pos = stop
+                continue
+
+        elif kind == DOT:
+            match = RE_NAME.match(source, pos + 1, end)
+            if match:
+                yield (DIRECTIVE, pos, match.end())
+                pos = match.end()
+                continue
+
+        elif kind == PERCENT:
+            match = RE_LETTERS.match(source, pos + 1, end)
+            if match:
+                yield (MACRO, pos, match.end())
+                pos = match.end()
+            else:
+                yield (MODULO, pos, pos + 1)
+                pos += 1
+            continue
+
+        elif kind == DQUOTE:
+            stop = source.find('"', pos + 1, end)
+            if stop >= 0 and source.find('\n', pos + 1, stop) < 0:
+                yield (STRING, pos, stop + 1)
+                pos = stop + 1
+            else:
+                yield (QUOTE, pos, pos + 1)
+                pos += 1
+            continue
+
+        elif kind == SQUOTE:
+            if pos + 2 < end and source[pos + 2] == "'" and source[pos + 1] != '\n':
+                yield (CHAR, pos, pos + 3)
+                pos += 3
+                continue
+
+        elif kind == SHIFT:
+            if pos + 1 < end and source[pos + 1] == c:
+                yield (LSHIFT if c == '<' else RSHIFT, pos, pos + 2)
+                pos += 2
+                continue
+
+        # anything else goes through the regexp
+        match = specs.RE_PATTERNS.match(source, pos, end)
+        if match is None:
+            pos += 1
+            continue
+
+        kind_name = match.lastgroup
+        if kind_name not in IGNORED:
+            yield (CODES[kind_name], pos, match.end())          # type: ignore
+        pos = max(match.end(), pos + 1)
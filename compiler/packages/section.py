@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Sections of a program and their output buffers
+
+#----- imports
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+import struct
+
+
+#----- globals
+
+# initial size of the buffer of an extent
+CAPACITY = 1 << 12
+
+# a little-endian 32-bit word
+WORD = struct.Struct("<I")
+
+
+#----- classes
+class Extent:
+    """A range of contiguous addresses in a section
+
+    The bytes are written in a preallocated buffer that doubles its size
+    when full. The addresses between two extents are never allocated.
+
+    Members:
+        address  : the address of the first byte
+        size     : the number of bytes used
+        buffer   : the bytes of the extent, None for a reservation (bss)
+        absolute : True when placed by ORG, it doesn't move with the module
+    """
+    __slots__ = ("address", "size", "buffer", "absolute")
+
+    def __init__(self, address: int, absolute: bool = False, reserved: bool = False) -> None:
+        """Constructor"""
+        self.address = address
+        self.size = 0
+        self.buffer: Optional[bytearray] = None if reserved else bytearray(CAPACITY)
+        self.absolute = absolute
+
+    @property
+    def end(self) -> int:
+        """The address following the last byte"""
+        return self.address + self.size
+
+    def allocate(self, count: int) -> int:
+        """Make room for count bytes and return the offset of the first one
+
+        The room is not written, the bytes are zero until they are.
+        """
+        offset = self.size
+        self.size = offset + count
+        buffer = self.buffer
+        if buffer is not None and self.size > len(buffer):
+            buffer.extend(bytes(max(self.size, len(buffer) << 1) - len(buffer)))
+
+        return offset
+
+    def trim(self) -> None:
+        """Release the room allocated and not used"""
+        if self.buffer is not None:
+            del self.buffer[self.size:]
+
+    def view(self) -> memoryview:
+        """The bytes used, without copy"""
+        return memoryview(self.buffer)[:self.size]               # type: ignore
+
+    def __contains__(self, address: int) -> bool:
+        return self.address <= address < self.address + self.size
+
+
+class Section:
+    """A named sequence of extents
+
+    The first extent is relocatable, each ORG starts a new absolute one.
+    A bss section only records reservations, nothing is allocated.
+
+    Members:
+        name    : the name of the section ('.code', '.data')
+        bss     : True for a section of reservations
+        extents : the extents, in the order they were started
+    """
+
+    def __init__(self, name: str, bss: bool = False) -> None:
+        """Constructor"""
+        self.name = name
+        self.bss = bss
+        self.extents = [ Extent(0, False, bss) ]
+
+    @property
+    def extent(self) -> Extent:
+        """The extent being written"""
+        return self.extents[-1]
+
+    @property
+    def relocatable(self) -> Extent:
+        """The extent placed with the module"""
+        return self.extents[0]
+
+    def org(self, address: int) -> Extent:
+        """Start a new extent at an absolute address"""
+        if address < 0:
+            raise SyntaxError(f"Error: invalid origin [{address}]!")
+
+        extent = self.extents[-1]
+        if extent.absolute and extent.size == 0:
+            extent.address = address
+        else:
+            extent = Extent(address, True, self.bss)
+            self.extents.append(extent)
+
+        return extent
+
+
+#----- functions
+def layout(extents: List[Extent]) -> List[Tuple[int, memoryview]]:
+    """Return the (file offset, bytes) of the extents in a flat image
+
+    The image starts at the lowest address written, the gaps between the
+    extents are left as holes.
+    """
+    ordered = sorted((e for e in extents if e.size), key=lambda e: e.address)
+    for previous, extent in zip(ordered, ordered[1:]):
+        if extent.address < previous.end:
+            raise SyntaxError(f"Error: sections overlap at address [{extent.address:#x}]!")
+
+    written = [ e for e in ordered if e.buffer is not None ]
+    if not written:
+        return []
+
+    origin = written[0].address
+    return [ (e.address - origin, e.view()) for e in written ]
+
+def align(address: int, boundary: int = 4) -> int:
+    """Round an address up to the boundary"""
+    return (address + boundary - 1) & -boundary
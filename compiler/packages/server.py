@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Persistent assembler server over a unix socket
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+import io
+import os
+import sys
+import stat
+import signal
+import tempfile
+import traceback
+import socketserver
+
+from contextlib import redirect_stdout, redirect_stderr
+
+from packages import protocol
+from packages.config import Config
+from packages.driver import parse, execute
+from packages.encoder import Encoder
+
+
+#----- classes
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Serve each client in a process of its own
+
+    The requests change the working directory & the standard streams of
+    their process, the forked processes keep them apart. The modules loaded
+    by the server (ISA tables, lexer patterns, ...) are shared with them.
+    """
+    pass
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Process the requests of a client, in order"""
+
+    def handle(self) -> None:
+        while True:
+            request = protocol.receive(self.connection)
+            if request is None:
+                break
+            protocol.send(self.connection, process(request))
+
+
+#----- functions
+def process(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the assembler for a request
+
+    Request:
+        argv    : the command line arguments, as given to the compiler
+        cwd     : the directory the arguments are relative to
+        sources : optional {name: bytes}, used instead of the files of the
+                  same name in argv
+
+    Response:
+        status : the exit status of the compiler
+        stdout : the diagnostics printed on stdout
+        stderr : the diagnostics printed on stderr
+        output : the (file offset, bytes) of the machine code, None on error
+        path   : where the machine code has to be written
+    """
+    response: Dict[str, Any] = { 'status': 0, 'stdout': "", 'stderr': "", 'output': None, 'path': "" }
+
+    def output(encoder: Encoder, config: Config) -> None:
+        response['output'] = [ (offset, bytes(data)) for offset, data in encoder.chunks() ]
+        response['path'] = os.path.abspath(config.output_file)
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    previous = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as temp:
+            try:
+                os.chdir(request['cwd'])
+                argv = sources(request.get('sources', {}), request['argv'], temp)
+
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    try:
+                        args = parse(argv)
+                        if args.server:
+                            print("Error: a request cannot start another server!")
+                            response['status'] = 2
+                        else:
+                            response['status'] = execute(args, output)
+                    except SystemExit as e:
+                        response['status'] = e.code if isinstance(e.code, int) else 1
+            finally:
+                os.chdir(previous)
+    except Exception:
+        # the client gets the diagnostic the command line would print
+        stderr.write(traceback.format_exc())
+        response['status'] = 1
+        response['output'] = None
+
+    response['stdout'] = stdout.getvalue()
+    response['stderr'] = stderr.getvalue()
+    return response
+
+def sources(files: Dict[str, bytes], argv: List[str], directory: str) -> List[str]:
+    """Write the sources sent with the request, and point argv to them"""
+    if not files:
+        return argv
+
+    paths: Dict[str, str] = {}
+    for index, (name, data) in enumerate(files.items()):
+        path = os.path.join(directory, f"{index}-{os.path.basename(name)}")
+        with open(path, "wb") as fh:
+            fh.write(data)
+        paths[name] = path
+
+    return [ paths.get(arg, arg) for arg in argv ]
+
+def serve(path: str) -> None:
+    """Serve the requests until interrupted"""
+    # remove a stale socket, but nothing else
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+    # the modules imported on demand, loaded once for all the requests
+    import packages.cache, packages.objfile, packages.relax                   # noqa: F401
+
+    server = Server(path, Handler)
+    os.chmod(path, 0o600)
+
+    # clean up the socket when stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Instruction-set simulator of the machine code
+
+#----- imports
+from __future__ import annotations
+from typing import BinaryIO, Callable, Dict, List, Optional, Set
+
+import sys
+import struct
+
+from itertools import count
+
+from packages.disassembler import Disassembler, imm_b, imm_i, imm_j, imm_s
+
+
+#----- globals
+
+# the registers hold unsigned 32-bit values
+MASK = 0xffffffff
+SIGN = 0x80000000
+
+# size of a code page (bits), a store in a page invalidates its instructions
+PAGE = 12
+
+# register written instead of x0, which always reads 0
+SINK = 32
+
+# system calls (a7), the Linux numbers
+SYS_WRITE = 64
+SYS_EXIT = 93
+
+
+#----- functions
+def signed(value: int) -> int:
+    """The signed value of a register"""
+    return (value ^ SIGN) - SIGN
+
+def div(a: int, b: int) -> int:
+    if b == 0:
+        return MASK
+    a, b = signed(a), signed(b)
+    quotient = abs(a) // abs(b)
+    return (-quotient if (a < 0) != (b < 0) else quotient) & MASK
+
+def rem(a: int, b: int) -> int:
+    if b == 0:
+        return a
+    a, b = signed(a), signed(b)
+    remainder = abs(a) % abs(b)
+    return (-remainder if a < 0 else remainder) & MASK
+
+def rotate(a: int, b: int) -> int:
+    b &= 31
+    return ((a << b) | (a >> (32 - b))) & MASK
+
+def clz(a: int) -> int:
+    return 32 - a.bit_length()
+
+def ctz(a: int) -> int:
+    return (a & -a).bit_length() - 1 if a else 32
+
+def rev8(a: int) -> int:
+    return int.from_bytes(a.to_bytes(4, "little"), "big")
+
+
+# operations on two registers (or a register & an immediate)
+ALU: Dict[str, Callable[[int, int], int]] = {
+    'add': lambda a, b: (a + b) & MASK,
+    'sub': lambda a, b: (a - b) & MASK,
+    'sll': lambda a, b: (a << (b & 31)) & MASK,
+    'slt': lambda a, b: int(signed(a) < signed(b)),
+    'sltu': lambda a, b: int(a < b),
+    'xor': lambda a, b: a ^ b,
+    'srl': lambda a, b: a >> (b & 31),
+    'sra': lambda a, b: (signed(a) >> (b & 31)) & MASK,
+    'or': lambda a, b: a | b,
+    'and': lambda a, b: a & b,
+    'mul': lambda a, b: (a * b) & MASK,
+    'mulh': lambda a, b: ((signed(a) * signed(b)) >> 32) & MASK,
+    'mulhsu': lambda a, b: ((signed(a) * b) >> 32) & MASK,
+    'mulhu': lambda a, b: (a * b) >> 32,
+    'div': div,
+    'divu': lambda a, b: a // b if b else MASK,
+    'rem': rem,
+    'remu': lambda a, b: a % b if b else a,
+    'rol': rotate,
+    'ror': lambda a, b: rotate(a, 32 - (b & 31)),
+    'bclr': lambda a, b: a & ~(1 << (b & 31)),
+    'bext': lambda a, b: (a >> (b & 31)) & 1,
+    'binv': lambda a, b: a ^ (1 << (b & 31)),
+    'bset': lambda a, b: a | (1 << (b & 31)),
+    'pack': lambda a, b: (a & 0xffff) | ((b & 0xffff) << 16),
+    'packh': lambda a, b: (a & 0xff) | ((b & 0xff) << 8),
+}
+
+# the immediate instructions and their operation
+IMMEDIATE = {
+    'addi': 'add', 'slti': 'slt', 'sltiu': 'sltu', 'xori': 'xor', 'ori': 'or', 'andi': 'and',
+    'slli': 'sll', 'srli': 'srl', 'srai': 'sra', 'rori': 'ror',
+    'bclri': 'bclr', 'bexti': 'bext', 'binvi': 'binv', 'bseti': 'bset',
+}
+
+# operations on a single register
+UNARY: Dict[str, Callable[[int], int]] = {
+    'clz': clz,
+    'ctz': ctz,
+    'cpop': lambda a: bin(a).count("1"),
+    'rev8': rev8,
+}
+
+# conditions of the branches
+CONDITIONS: Dict[str, Callable[[int, int], bool]] = {
+    'beq': lambda a, b: a == b,
+    'bne': lambda a, b: a != b,
+    'blt': lambda a, b: signed(a) < signed(b),
+    'bge': lambda a, b: signed(a) >= signed(b),
+    'bltu': lambda a, b: a < b,
+    'bgeu': lambda a, b: a >= b,
+}
+
+# loads & stores, by the size of the data
+LOADS = { 'lb': struct.Struct("<b"), 'lh': struct.Struct("<h"), 'lw': struct.Struct("<I"),
+          'lbu': struct.Struct("<B"), 'lhu': struct.Struct("<H") }
+STORES = { 'sb': struct.Struct("<B"), 'sh': struct.Struct("<H"), 'sw': struct.Struct("<I") }
+
+# a little-endian 32-bit word
+WORD = struct.Struct("<I")
+
+
+#----- classes
+class Fault(SyntaxError):
+    """Raised when the program cannot go on"""
+    pass
+
+
+class Exit(Exception):
+    """Raised by the exit system call"""
+    def __init__(self, status: int) -> None:
+        super().__init__(status)
+        self.status = status
+
+
+class Simulator:
+    """Execute the machine code of a program
+
+    Each instruction is decoded once, into a handler that executes it and
+    returns the next pc. The handlers are cached by address, a store into a
+    page holding decoded instructions invalidates the handlers of the page.
+
+    Members:
+        memory : the bytes of the memory, the addresses start at 0
+        regs   : the registers (x0 .. x31, then the sink of the writes to x0)
+        csrs   : the control & status registers written by the program
+        pc     : the address of the next instruction
+        steps  : the number of instructions executed
+    """
+
+    def __init__(self, size: int, output: Optional[BinaryIO] = None) -> None:
+        """Constructor
+
+        Args:
+            size   : the size of the memory, in bytes
+            output : where the program writes (default: stdout)
+        """
+        self.memory = bytearray(size)
+        self.regs: List[int] = [ 0 ] * (SINK + 1)
+        self.csrs: Dict[int, int] = {}
+        self.pc = 0
+        self.steps = 0
+        self.output = output or sys.stdout.buffer
+
+        # the handlers by address / 4 and the pages they were decoded from
+        self.cache: List[Optional[Callable[[], int]]] = [ None ] * (size >> 2)
+        self.code: Set[int] = set()
+        self.decoder = Disassembler()
+
+        # the stack starts at the top of the memory
+        self.regs[2] = size & ~0xf
+
+    def load(self, image: bytes, address: int = 0) -> None:
+        """Copy an image in memory"""
+        if address < 0 or address + len(image) > len(self.memory):
+            raise Fault(f"Error: the image doesn't fit in memory at address [{address:#x}]!")
+
+        self.memory[address:address + len(image)] = image
+        self.invalidate(address, len(image))
+
+    def invalidate(self, address: int, size: int = 1) -> None:
+        """Forget the handlers decoded from the pages of a range of addresses"""
+        for page in range(address >> PAGE, ((address + size - 1) >> PAGE) + 1):
+            if page in self.code:
+                self.code.discard(page)
+                first = page << (PAGE - 2)
+                last = min(first + (1 << (PAGE - 2)), len(self.cache))
+                self.cache[first:last] = [ None ] * (last - first)
+
+    def run(self, steps: Optional[int] = None) -> int:
+        """Execute the program from the pc
+
+        Args:
+            steps : the maximum number of instructions to execute
+
+        Returns:
+            the exit status of the program
+        """
+        cache = self.cache
+        compile = self.compile
+        pc = self.pc
+        step = -1
+
+        # 1 when the instruction of the last step has completed
+        completed = 0
+        try:
+            for step in (range(steps) if steps is not None else count()):
+                pc = (cache[pc >> 2] or compile(pc))()
+            completed = 1
+        except Exit as e:
+            completed = 1
+            pc += 4
+            return e.status
+        except IndexError:
+            raise Fault(f"Error: address out of memory at pc [{pc:#x}]!")
+        except struct.error:
+            raise Fault(f"Error: memory access out of memory at pc [{pc:#x}]!")
+        finally:
+            # the faulting instruction is not counted, the pc stays on it
+            self.steps += step + completed
+            self.pc = pc
+
+        raise Fault(f"Error: the program didn't end after {steps} instructions!")
+
+    # ----- decoding
+    def compile(self, pc: int) -> Callable[[], int]:
+        """Decode the instruction at an address into its handler"""
+        if pc & 3 or pc + 4 > len(self.memory):
+            raise Fault(f"Error: invalid pc [{pc:#x}]!")
+
+        word = WORD.unpack_from(self.memory, pc)[0]
+        entry = self.decoder.decode(word)
+        if entry is None:
+            raise Fault(f"Error: illegal instruction [{word:#010x}] at address [{pc:#x}]!")
+
+        handler = self.handler(entry[0], word, pc)
+        self.cache[pc >> 2] = handler
+        self.code.add(pc >> PAGE)
+        return handler
+
+    def handler(self, mnemonic: str, word: int, pc: int) -> Callable[[], int]:
+        """Create the handler of an instruction, its operands are bound"""
+        regs = self.regs
+        memory = self.memory
+        code = self.code
+        invalidate = self.invalidate
+        following = pc + 4
+
+        rd = ((word >> 7) & 0x1f) or SINK
+        rs1 = (word >> 15) & 0x1f
+        rs2 = (word >> 20) & 0x1f
+
+        if mnemonic in IMMEDIATE:
+            imm = imm_i(word) & MASK
+            if mnemonic == 'addi':
+                def run() -> int:
+                    regs[rd] = (regs[rs1] + imm) & MASK
+                    return following
+                return run
+
+            operation = ALU[IMMEDIATE[mnemonic]]
+            def run() -> int:
+                regs[rd] = operation(regs[rs1], imm)
+                return following
+            return run
+
+        if mnemonic in ALU:
+            if mnemonic == 'add':
+                def run() -> int:
+                    regs[rd] = (regs[rs1] + regs[rs2]) & MASK
+                    return following
+                return run
+
+            operation = ALU[mnemonic]
+            def run() -> int:
+                regs[rd] = operation(regs[rs1], regs[rs2])
+                return following
+            return run
+
+        if mnemonic in UNARY:
+            unary = UNARY[mnemonic]
+            def run() -> int:
+                regs[rd] = unary(regs[rs1])
+                return following
+            return run
+
+        if mnemonic in LOADS:
+            unpack = LOADS[mnemonic].unpack_from
+            offset = imm_i(word)
+            def run() -> int:
+                regs[rd] = unpack(memory, (regs[rs1] + offset) & MASK)[0] & MASK
+                return following
+            return run
+
+        if mnemonic in STORES:
+            pack = STORES[mnemonic].pack_into
+            last = STORES[mnemonic].size - 1
+            value = MASK >> (32 - 8 * (last + 1))
+            offset = imm_s(word)
+            def run() -> int:
+                address = (regs[rs1] + offset) & MASK
+                pack(memory, address, regs[rs2] & value)
+                if (address >> PAGE) in code or ((address + last) >> PAGE) in code:
+                    invalidate(address, last + 1)
+                return following
+            return run
+
+        if mnemonic in CONDITIONS:
+            condition = CONDITIONS[mnemonic]
+            target = pc + imm_b(word)
+            if target & 3 or not 0 <= target < len(memory):
+                return self.invalid(target, condition, rs1, rs2, following)
+
+            def run() -> int:
+                return target if condition(regs[rs1], regs[rs2]) else following
+            return run
+
+        if mnemonic == 'jal':
+            target = pc + imm_j(word)
+            if target & 3 or not 0 <= target < len(memory):
+                return self.invalid(target, lambda a, b: True, 0, 0, following)
+
+            def run() -> int:
+                regs[rd] = following
+                return target
+            return run
+
+        if mnemonic == 'jalr':
+            offset = imm_i(word)
+            def run() -> int:
+                target = (regs[rs1] + offset) & (MASK - 1)
+                if target & 3:
+                    raise Fault(f"Error: invalid jump to [{target:#x}] at address [{pc:#x}]!")
+                regs[rd] = following
+                return target
+            return run
+
+        if mnemonic in ('lui', 'auipc'):
+            value = word & 0xfffff000
+            if mnemonic == 'auipc':
+                value = (pc + value) & MASK
+            def run() -> int:
+                regs[rd] = value
+                return following
+            return run
+
+        if mnemonic.startswith('csr'):
+            return self.csr(mnemonic, word, rd, rs1, following)
+
+        if mnemonic == 'ecall':
+            def run() -> int:
+                self.ecall()
+                return following
+            return run
+
+        raise Fault(f"Error: unsupported instruction [{mnemonic}] at address [{pc:#x}]!")
+
+    def invalid(self, target: int, condition: Callable[[int, int], bool], rs1: int, rs2: int, following: int) -> Callable[[], int]:
+        """The handler of a branch to an invalid address, it fails if taken"""
+        regs = self.regs
+        def run() -> int:
+            if condition(regs[rs1], regs[rs2]):
+                raise Fault(f"Error: invalid jump to [{target:#x}] at address [{following - 4:#x}]!")
+            return following
+        return run
+
+    def csr(self, mnemonic: str, word: int, rd: int, rs1: int, following: int) -> Callable[[], int]:
+        """The handler of a csr instruction, uimm replaces rs1 in the *i forms"""
+        regs = self.regs
+        csrs = self.csrs
+        number = word >> 20
+        immediate = mnemonic.endswith('i')
+        operation = mnemonic[3:5]
+
+        def run() -> int:
+            old = csrs.get(number, 0)
+            source = rs1 if immediate else regs[rs1]
+            if operation == 'rw':
+                csrs[number] = source
+            elif rs1:
+                csrs[number] = (old | source) if operation == 'rs' else (old & ~source)
+            regs[rd] = old
+            return following
+        return run
+
+    # ----- system
+    def ecall(self) -> None:
+        """Execute the system call in a7"""
+        regs = self.regs
+        number = regs[17]
+        if number == SYS_EXIT:
+            raise Exit(signed(regs[10]))
+
+        if number == SYS_WRITE:
+            address, size = regs[11], regs[12]
+            if address + size > len(self.memory):
+                raise Fault(f"Error: write out of memory at address [{address:#x}]!")
+            output = sys.stderr.buffer if regs[10] == 2 else self.output
+            output.write(self.memory[address:address + size])
+            regs[10] = size
+            return
+
+        raise Fault(f"Error: unknown system call [{number}]!")
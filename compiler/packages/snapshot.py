@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Precompiled snapshot of the ISA tables
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+
+import os
+import sys
+import marshal
+
+from types import ModuleType
+
+from packages import __version__
+
+
+#----- globals
+
+# layout of the snapshot, to change whenever the tables change
+LAYOUT = 1
+
+# the architecture the tables are derived from, shared with the RISC-V scripts
+PACKAGES = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.normpath(os.path.join(PACKAGES, "..", "..", "scripts", "risc-v", "architecture.py"))
+
+# where the snapshot is stored
+SNAPSHOT = os.path.join(PACKAGES, "__pycache__", f"isa.{LAYOUT}.snapshot")
+
+# opcode of the system instructions (csr*, ecall)
+OPCODE_SYSTEM = 0b111_0011
+
+# the tables, once loaded
+_tables: Optional[Dict[str, Any]] = None
+
+
+#----- functions
+def architecture() -> ModuleType:
+    """Load the architecture (registers & opcodes) from its single source"""
+    module = sys.modules.get("architecture")
+    if module is not None and getattr(module, "__file__", None) == SOURCE:
+        return module
+
+    # deferred import, only needed when the snapshot is out of date
+    from importlib.util import module_from_spec, spec_from_file_location
+
+    spec = spec_from_file_location("architecture", SOURCE)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Error: unable to load the architecture [{SOURCE}]!")
+
+    module = module_from_spec(spec)
+    sys.modules["architecture"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def stamp() -> Tuple[int, str, int, int]:
+    """Identify the version of the tables (layout, assembler, architecture)"""
+    stat = os.stat(SOURCE)
+    return (LAYOUT, __version__, stat.st_mtime_ns, stat.st_size)
+
+def build() -> Dict[str, Any]:
+    """Derive the lookup tables from the architecture
+
+    Returns:
+        registers : register number by name
+        opcodes   : (format, opcode, funct3, tail) by mnemonic
+        encoders  : (base word, format) by mnemonic, the base word holds all
+                    the constant fields of the instruction
+    """
+    isa = architecture()
+    REGISTERS, OPCODES = isa.REGISTERS, isa.OPCODES
+
+    opcodes: Dict[str, Tuple[str, int, Optional[int], Optional[int]]] = {}
+    encoders: Dict[str, Tuple[int, str]] = {}
+    for mnemonic, spec in OPCODES.items():
+        kind = spec['type'].name                            # type: ignore
+        opcodes[mnemonic] = (kind, spec['opcode'], spec.get('funct3'), spec.get('tail'))
+
+        base = spec['opcode'] | (spec.get('funct3', 0) << 12)
+
+        # 7 bits tails go in funct7, larger ones fill the whole immediate
+        tail = spec.get('tail', 0)
+        base |= (tail << 20) if tail > 0x7f else (tail << 25)
+
+        if spec['opcode'] == OPCODE_SYSTEM:
+            kind = "SYSTEM"
+        encoders[mnemonic] = (base, kind)
+
+    return { 'registers': dict(REGISTERS), 'opcodes': opcodes, 'encoders': encoders }
+
+def save(tables: Dict[str, Any], version: Tuple[int, str, int, int]) -> None:
+    """Write the snapshot, atomically (best effort)"""
+    temp = f"{SNAPSHOT}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT), exist_ok=True)
+        with open(temp, "wb") as fh:
+            marshal.dump((version, tables), fh)
+        os.replace(temp, SNAPSHOT)
+    except OSError:
+        # read-only installation, the tables are built on each run
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+
+def tables() -> Dict[str, Any]:
+    """Return the ISA tables, loaded from the snapshot on first use"""
+    global _tables
+    if _tables is not None:
+        return _tables
+
+    version = stamp()
+    try:
+        with open(SNAPSHOT, "rb") as fh:
+            saved, loaded = marshal.load(fh)
+        if saved == version:
+            _tables = loaded
+            return loaded
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    _tables = build()
+    save(_tables, version)
+    return _tables
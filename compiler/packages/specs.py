@@ -67,7 +67,7 @@ TOKENS_SPECS = [
     (TokenType.LABEL.name, r'[A-Za-z_][A-Za-z0-9_]*:'),
     (TokenType.IDENT.name, r'[A-Za-z_][A-Za-z0-9_-]*'),
     (TokenType.MACRO.name, r'\%[A-Za-z_]+'),
-    (TokenType.STRING.name, r'\"[^\"]*\"'),
+    (TokenType.STRING.name, r'\"[^\"\n]*\"'),
     (TokenType.CHAR.name, r'\'.\''),
 
 
@@ -93,6 +93,21 @@ TOKENS_SPECS = [
     (TokenType.COMMENT.name, r';[^\n]*'),
 ]
 
-# compile the regexp
+# the regexp (RE_PATTERNS & RE_BYTES_PATTERNS) are compiled on first use
 ALL_TOKENS = '|'.join(f'(?P<{value}>{pattern})' for value, pattern in TOKENS_SPECS)
-RE_PATTERNS = re.compile(ALL_TOKENS)
+
+PATTERNS = {
+    'RE_PATTERNS': lambda: re.compile(ALL_TOKENS),
+
+    # same patterns to match a whole bytes buffer, newlines included
+    'RE_BYTES_PATTERNS': lambda: re.compile(f'{ALL_TOKENS}|(?P<{TokenType.EOL.name}>\n)'.encode()),
+}
+
+def __getattr__(name: str) -> Any:
+    """Compile a regexp the first time it is requested"""
+    if name not in PATTERNS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    pattern = PATTERNS[name]()
+    globals()[name] = pattern
+    return pattern
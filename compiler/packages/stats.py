@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Per-phase timing & allocation statistics
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+import sys
+import time
+import marshal
+
+from dataclasses import dataclass
+
+
+#----- classes
+@dataclass
+class Phase:
+    """Statistics of one phase of the assembler
+
+    Members:
+        name       : the name of the phase (lex, parse, encode, ...)
+        filename   : the file processed, if any
+        seconds    : the wall time of the phase
+        tokens     : the number of tokens processed
+        statements : the number of statements processed
+        peak       : the peak of memory allocated during the phase (tracemalloc)
+        profile    : the raw cProfile statistics of the phase
+    """
+    name: str
+    filename: str = ""
+    seconds: float = 0.0
+    tokens: int = 0
+    statements: int = 0
+    peak: int = 0
+    profile: Optional[Dict[Any, Any]] = None
+
+
+class Timer:
+    """Context manager measuring a phase, the time of an inner phase running
+    along with it is recorded on its own"""
+
+    def __init__(self, stats: Stats, phase: Phase, inner: Optional[Phase] = None) -> None:
+        """Constructor"""
+        self.stats = stats
+        self.phase = phase
+        self.inner = inner
+        self.profiler: Any = None
+        self.start = 0.0
+
+        # True when the allocations are traced by this timer
+        self.tracing = False
+
+    def __enter__(self) -> Phase:
+        if self.stats.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+
+        if self.stats.profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        self.start = time.perf_counter()
+        return self.phase
+
+    def __exit__(self, *args: Any) -> None:
+        self.phase.seconds = time.perf_counter() - self.start
+
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.create_stats()
+            self.phase.profile = self.profiler.stats
+
+        if self.stats.memory:
+            import tracemalloc
+            self.phase.peak = tracemalloc.get_traced_memory()[1]
+            if self.tracing:
+                tracemalloc.stop()
+                self.tracing = False
+
+        # the inner phase shares the peak of memory
+        if self.inner is not None:
+            self.phase.seconds -= self.inner.seconds
+            self.inner.peak = self.phase.peak
+            self.stats.record(self.inner)
+
+        self.stats.record(self.phase)
+
+
+class Stats:
+    """Collect the statistics of each phase
+
+    Hooks are called with each Phase once it is over, they can be used to
+    feed the statistics to another tool.
+    """
+
+    def __init__(self, memory: bool = False, profile: bool = False) -> None:
+        """Constructor
+
+        Args:
+            memory  : measure the peak of memory of each phase (tracemalloc
+                      slows the phases down several times)
+            profile : run each phase under cProfile
+        """
+        self.memory = memory
+        self.profile = profile
+        self.phases: List[Phase] = []
+        self.hooks: List[Callable[[Phase], None]] = []
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # hooks stay in the process that registered them
+        state = self.__dict__.copy()
+        state['hooks'] = []
+        return state
+
+    def add_hook(self, hook: Callable[[Phase], None]) -> None:
+        """Register a function called at the end of each phase"""
+        self.hooks.append(hook)
+
+    def phase(self, name: str, filename: str = "", inner: Optional[Phase] = None) -> Timer:
+        """Return a context manager measuring a phase, inner is measured by
+        the code running along with it (e.g. the lexer streaming the tokens
+        to the parser)"""
+        return Timer(self, Phase(name, filename), inner)
+
+    def record(self, phase: Phase) -> None:
+        """Add the statistics of a phase"""
+        self.phases.append(phase)
+        for hook in self.hooks:
+            hook(phase)
+
+    def merge(self, other: Stats) -> None:
+        """Add the phases measured by another Stats (e.g. in a worker)"""
+        for phase in other.phases:
+            self.record(phase)
+
+    def hottest(self) -> Optional[Phase]:
+        """Return the slowest phase"""
+        return max(self.phases, key=lambda phase: phase.seconds, default=None)
+
+    def dump(self, filename: str) -> Optional[Phase]:
+        """Write the profile of the hottest phase (pstats format)"""
+        phase = self.hottest()
+        if phase is None or phase.profile is None:
+            return None
+
+        with open(filename, "wb") as fh:
+            marshal.dump(phase.profile, fh)
+
+        return phase
+
+    def report(self, fh: Optional[TextIO] = None) -> None:
+        """Print the statistics as a table (default: the current stderr)"""
+        fh = fh or sys.stderr
+        print(f"{'phase':<8} | {'file':<24} | {'seconds':>9} | {'tokens':>10} | {'statements':>10} | {'peak (KiB)':>10}", file=fh)
+        for p in self.phases:
+            peak = f"{p.peak / 1024:10,.0f}" if self.memory else f"{'-':>10}"
+            print(f"{p.name:<8} | {p.filename[-24:]:<24} | {p.seconds:9.4f} | {p.tokens:10,} | "
+                  f"{p.statements:10,} | {peak}", file=fh)
+
+
+class NullStats(Stats):
+    """Statistics disabled, the phases are not measured at all"""
+
+    def __init__(self) -> None:
+        super().__init__(False, False)
+        self.null = NullTimer()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def phase(self, name: str, filename: str = "", inner: Optional[Phase] = None) -> Timer:
+        return self.null        # type: ignore
+
+    def record(self, phase: Phase) -> None:
+        pass
+
+
+class NullTimer:
+    """Context manager doing nothing"""
+
+    def __init__(self) -> None:
+        self.phase = Phase("")
+
+    def __enter__(self) -> Phase:
+        return self.phase
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+#----- globals
+
+# statistics disabled
+NO_STATS = NullStats()
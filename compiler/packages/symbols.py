@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Symbol table with forward references
+
+#----- imports
+from __future__ import annotations
+from typing import Any, Callable, Dict, List
+
+from dataclasses import dataclass
+
+
+#----- classes
+class Unresolved(Exception):
+    """Raised when an operand references a symbol not defined yet"""
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.name = name
+
+
+@dataclass
+class Fixup:
+    """An instruction that needs to be patched once a symbol is defined
+
+    Members:
+        address  : the address of the instruction in the output
+        base     : the base word of the instruction
+        encode   : the encoder for the instruction format
+        operands : the operands of the instruction
+        fixed    : True when the instruction is in an absolute extent (ORG)
+    """
+    address: int
+    base: int
+    encode: Callable
+    operands: List[Any]
+    fixed: bool = False
+
+
+class SymbolTable:
+    """Keep track of the symbols and the references waiting for them"""
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.symbols: Dict[str, int] = {}
+        self.fixups: Dict[str, List[Fixup]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.symbols
+
+    def __getitem__(self, name: str) -> int:
+        """Return the value of a symbol or raise Unresolved"""
+        try:
+            return self.symbols[name]
+        except KeyError:
+            raise Unresolved(name)
+
+    def define(self, name: str, value: int) -> List[Fixup]:
+        """Define a new symbol and return the fixups waiting for it"""
+        if name in self.symbols:
+            raise SyntaxError(f"Error: label [{name}] is already defined!")
+
+        self.symbols[name] = value
+        return self.fixups.pop(name, [])
+
+    def reference(self, name: str, fixup: Fixup) -> None:
+        """Record an instruction waiting for a symbol"""
+        self.fixups.setdefault(name, []).append(fixup)
+
+    def unresolved(self) -> List[str]:
+        """Return the names still referenced but never defined"""
+        return sorted(self.fixups)
@@ -13,9 +13,13 @@
 
 # ----- imports
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
 
+from array import array
+from bisect import bisect_right
+from collections import deque
 from dataclasses import dataclass
+from mmap import mmap
 
 from packages.specs import TokenType
 
@@ -30,19 +34,133 @@ class Token:
         value : the value of the token as seen in the assembly file
         row   : the line where the token appears
         col   : the position in the line where the token appears
+        line  : the text of the line where the token appears
     """
     type: TokenType = TokenType.UNKNOWN
     value: str = ""
     row: int = 0
     col: int = 0
+    line: str = ""
 
     def __repr__(self) -> str:
         return f"{self.type.name:>12} | ({self.row:3},{self.col:3}) | {self.value:10}"
 
 
+class TokenTable:
+    """Compact storage for all the tokens of a source buffer
+
+    The tokens are kept as parallel arrays (one entry per token) instead of
+    one Token object each. The values are not copied, only their position
+    in the source buffer is recorded.
+
+    Members:
+        source  : the source buffer the values are sliced from
+        types   : the TokenType code of each token
+        offsets : the position of each token in the source buffer
+        lengths : the length of each token value
+        lines   : the position where each line starts in the source buffer
+    """
+    # TokenType indexed by their code
+    TYPES = [ TokenType.UNKNOWN ] + list(TokenType)
+
+    def __init__(self, source: Union[str, bytes, mmap]) -> None:
+        """Constructor"""
+        self.source = source
+        self.encoded = not isinstance(source, str)
+        self.types = array('B')
+        self.offsets = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+
+    def append(self, kind: int, offset: int, length: int) -> None:
+        """Add a new token to the table"""
+        self.types.append(kind)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+
+    def type(self, index: int) -> TokenType:
+        """Return the type of a token"""
+        return self.TYPES[self.types[index]]
+
+    def value(self, index: int) -> str:
+        """Return the value of a token, as seen in the source buffer"""
+        offset = self.offsets[index]
+        value = self.source[offset:offset + self.lengths[index]]
+        return value.decode() if self.encoded else value
+
+    def position(self, index: int) -> Tuple[int, int]:
+        """Return the (row, col) of a token"""
+        row = bisect_right(self.lines, self.offsets[index])
+
+        # the end of file is not attached to any column
+        if self.types[index] == TokenType.EOF or row == 0:
+            return (row, 0)
+
+        return (row, self.offsets[index] - self.lines[row - 1] + 1)
+
+    def line(self, index: int) -> str:
+        """Return the text of the line where a token appears"""
+        row = bisect_right(self.lines, self.offsets[index])
+        if row == 0:
+            return ""
+
+        start = self.lines[row - 1]
+        end = self.source.find(b"\n" if self.encoded else "\n", start)       # type: ignore
+        text = self.source[start:end if end >= 0 else len(self.source)]
+        return text.decode() if self.encoded else text                 # type: ignore
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> TokenView:
+        return TokenView(self, index)
+
+
+class TokenView:
+    """Lazy view on a token stored in a TokenTable
+
+    It exposes the same members as a Token, but they are only computed from
+    the table when accessed.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: TokenTable, index: int) -> None:
+        """Constructor"""
+        self.table = table
+        self.index = index
+
+    @property
+    def type(self) -> TokenType:
+        return self.table.type(self.index)
+
+    @property
+    def value(self) -> str:
+        return self.table.value(self.index)
+
+    @property
+    def row(self) -> int:
+        return self.table.position(self.index)[0]
+
+    @property
+    def col(self) -> int:
+        return self.table.position(self.index)[1]
+
+    @property
+    def line(self) -> str:
+        return self.table.line(self.index)
+
+    def token(self) -> Token:
+        """Build the equivalent Token object"""
+        row, col = self.table.position(self.index)
+        return Token(self.type, self.value, row, col, self.line)
+
+    def __repr__(self) -> str:
+        return repr(self.token())
+
+
 class TokenStream:
     """Class to hold a stream of tokens"""
-    def __init__(self, tokens: List[Token]) -> None:
+    def __init__(self, tokens: Union[List[Token], TokenTable]) -> None:
         """Constructor"""
         self.tokens = tokens
         self.pos = 0
@@ -54,6 +172,11 @@ class TokenStream:
         else:
             return None
 
+    def peek_type(self, inc: int = 0) -> TokenType:
+        """Return the type of the next token, without removing it from the list"""
+        token = self.peek(inc)
+        return token.type if token else TokenType.EOF
+
     def next(self) -> Optional[Token]:
         """Return the next token in the list"""
         token = self.peek()
@@ -62,6 +185,11 @@ class TokenStream:
 
         return token
 
+    def next_value(self) -> str:
+        """Consume the next token and return its value"""
+        token = self.next()
+        return token.value if token else ""
+
     def expect(self, kind: TokenType) -> Token:
         """Check for the expected type and returns the token"""
         token = self.next()
@@ -73,3 +201,113 @@ class TokenStream:
     def end(self) -> bool:
         """True if we have process all the tokens"""
         return self.pos >= len(self.tokens)
+
+
+class TableTokenStream(TokenStream):
+    """Stream of tokens read from a TokenTable
+
+    The types are read directly from the table, a TokenView is only created
+    when a token is requested.
+    """
+    def __init__(self, tokens: TokenTable) -> None:
+        """Constructor"""
+        super().__init__(tokens)
+        self.table = tokens
+        self.types = tokens.types
+        self.count = len(tokens)
+
+    def peek(self, inc: int = 0) -> Optional[Token]:
+        """Return a view on the next token, without removing it from the table"""
+        if (self.pos + inc) < self.count:
+            return TokenView(self.table, self.pos + inc)     # type: ignore
+        else:
+            return None
+
+    def peek_type(self, inc: int = 0) -> TokenType:
+        """Return the type code of the next token, without creating it
+
+        The raw code is returned, it compares equal to its TokenType.
+        """
+        if (self.pos + inc) < self.count:
+            return self.types[self.pos + inc]                # type: ignore
+        else:
+            return TokenType.EOF
+
+    def next(self) -> Optional[Token]:
+        """Return a view on the next token in the table"""
+        if self.pos < self.count:
+            self.pos += 1
+            return TokenView(self.table, self.pos - 1)       # type: ignore
+
+        return None
+
+    def next_value(self) -> str:
+        """Consume the next token and return its value, without creating it"""
+        if self.pos < self.count:
+            self.pos += 1
+            return self.table.value(self.pos - 1)
+
+        return ""
+
+    def end(self) -> bool:
+        """True if we have process all the tokens"""
+        return self.pos >= self.count
+
+
+class BufferedTokenStream(TokenStream):
+    """Stream of tokens pulled lazily from an iterator
+
+    Only the lookahead window is kept in a ring buffer, so the memory used
+    depends on the number of tokens peeked and not on the size of the input.
+    """
+    def __init__(self, tokens: Iterable[Token], lookahead: int = 4) -> None:
+        """Constructor
+
+        Args:
+            tokens    : the token generator (usually Lexer.stream())
+            lookahead : the maximum number of tokens that can be peeked
+        """
+        self.source = iter(tokens)
+        self.lookahead = lookahead
+        self.buffer: Deque[Token] = deque()
+        self.pos = 0
+
+    def fill(self, count: int) -> bool:
+        """Pull tokens from the source until the buffer holds 'count' of them"""
+        while len(self.buffer) < count:
+            token = next(self.source, None)
+            if token is None:
+                return False
+            self.buffer.append(token)
+
+        return True
+
+    def peek(self, inc: int = 0) -> Optional[Token]:
+        """Return the next token, without removing it from the stream"""
+        if inc >= self.lookahead:
+            raise ValueError(f"Error: cannot peek {inc} tokens ahead (lookahead is {self.lookahead})!")
+
+        if self.fill(inc + 1):
+            return self.buffer[inc]
+        else:
+            return None
+
+    def peek_type(self, inc: int = 0) -> TokenType:
+        """Return the type of the next token, from the buffer when already pulled"""
+        if inc < len(self.buffer):
+            return self.buffer[inc].type
+
+        token = self.peek(inc)
+        return token.type if token else TokenType.EOF
+
+    def next(self) -> Optional[Token]:
+        """Return the next token in the stream"""
+        if self.fill(1):
+            self.pos += 1
+            return self.buffer.popleft()
+
+        return None
+
+    def end(self) -> bool:
+        """True if we have process all the tokens"""
+        return not self.fill(1)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Natoga32 simulator
+
+# ----- imports
+from __future__ import annotations
+
+import sys
+import time
+
+from argparse import ArgumentParser
+
+from packages.simulator import Simulator
+
+
+# ----- begin
+if __name__ == "__main__":
+
+    number = lambda v: int(v, 0)
+
+    argparse = ArgumentParser()
+    argparse.add_argument("file", help="binary file to execute")
+    argparse.add_argument("--base", type=number, default=0, help="address where the file is loaded")
+    argparse.add_argument("--entry", type=number, help="address of the first instruction (default: base)")
+    argparse.add_argument("--memory", type=number, help="size of the memory of an instance, in bytes (default: 4 MiB, 64 KiB in batch)")
+    argparse.add_argument("--steps", type=number, help="maximum number of instructions executed")
+    argparse.add_argument("--batch", metavar="FILE", help="run an instance per line of this file, its numbers are loaded in a0, a1, ... (NumPy)")
+    argparse.add_argument("--stats", action="store_true", help="report the instructions executed & their rate")
+    args = argparse.parse_args()
+
+    try:
+        with open(args.file, "rb") as fh:
+            image = fh.read()
+
+        if args.batch:
+            try:
+                from packages.batch import Batch
+            except ImportError:
+                raise SyntaxError("Error: the batch mode requires NumPy!")
+
+            with open(args.batch) as fh:
+                inputs = [ [ number(v) for v in line.split() ] for line in fh if line.strip() ]
+
+            simulator = Batch(len(inputs), args.memory or 1 << 16)
+            for index, values in enumerate(inputs):
+                simulator.regs[index, 10:10 + len(values)] = [ v & 0xffffffff for v in values ]
+        else:
+            simulator = Simulator(args.memory or 1 << 22)
+
+        simulator.load(image, args.base)
+        if args.batch:
+            simulator.pcs[:] = args.base if args.entry is None else args.entry
+        else:
+            simulator.pc = args.base if args.entry is None else args.entry
+
+        start = time.perf_counter()
+        try:
+            status = simulator.run(args.steps)
+        finally:
+            sys.stdout.flush()
+            if args.stats:
+                elapsed = time.perf_counter() - start
+                executed = simulator.executed if args.batch else simulator.steps
+                print(f"{executed:,} instructions in {elapsed:.3f} s "
+                      f"({executed / elapsed if elapsed else 0:,.0f}/s)", file=sys.stderr)
+    except (OSError, ValueError, SyntaxError) as e:
+        print(e)
+        sys.exit(1)
+
+    # the status & the output of each instance
+    if args.batch:
+        for index, (value, output) in enumerate(zip(status.tolist(), simulator.outputs)):
+            print(f"{index}\t{value}\t{output.decode(errors='replace')!r}")
+        sys.exit(0)
+
+    sys.exit(status & 0xff)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Fixtures of the tests: assemble sources through the command line driver
+
+#----- imports
+from __future__ import annotations
+from typing import Callable, List, Sequence
+
+import os
+import struct
+import sys
+
+import pytest
+
+# the packages are imported from the compiler directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packages.driver import main
+
+
+#----- functions
+def words(data: bytes) -> List[int]:
+    """The little-endian words of a binary"""
+    return list(struct.unpack(f"<{len(data) // 4}I", data[:len(data) & ~3]))
+
+@pytest.fixture
+def assemble(tmp_path) -> Callable[..., bytes]:
+    """Assemble sources, linked in order, into the bytes of the program,
+    with more command line options, a SyntaxError is raised when the
+    assembly fails (the driver prints its message)"""
+    def run(*sources: str, options: Sequence[str] = ()) -> bytes:
+        files = []
+        for index, source in enumerate(sources):
+            path = tmp_path / f"m{index}.s"
+            path.write_text(source)
+            files.append(str(path))
+
+        output = tmp_path / "out.bin"
+        if output.exists():
+            output.unlink()
+        if main([ *files, "-o", str(output), *options ]) != 0:
+            raise SyntaxError("the assembly failed")
+        return output.read_bytes()
+
+    return run
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	The batch simulation gives the results of the scalar one
+
+#----- imports
+from __future__ import annotations
+from typing import List, Tuple
+
+import io
+
+import pytest
+
+# the batch mode requires NumPy
+np = pytest.importorskip("numpy")
+
+from packages.batch import Batch
+from packages.simulator import Fault, Simulator
+
+
+#----- globals
+
+# memory of each instance, the stack starts at its top in both simulators
+MEMORY = 1 << 16
+
+# the collatz steps of a0, the odd inputs print a message first: the
+# instances diverge & join again
+COLLATZ = """
+start:
+    addi s0, a0, 0
+    addi s1, x0, 0
+    andi t0, s0, 1
+    beq t0, x0, loop
+    addi a7, x0, 64
+    addi a0, x0, 1
+    addi a1, x0, msg
+    addi a2, x0, 3
+    ecall
+loop:
+    addi t0, x0, 1
+    bge t0, s0, done
+    andi t1, s0, 1
+    bne t1, x0, odd
+    srli s0, s0, 1
+    jal x0, next
+odd:
+    slli t2, s0, 1
+    add s0, s0, t2
+    addi s0, s0, 1
+next:
+    addi s1, s1, 1
+    sw s1, -4(sp)
+    lw s1, -4(sp)
+    jal x0, loop
+done:
+    addi a0, s1, 0
+    addi a7, x0, 93
+    ecall
+msg:
+    .ascii "odd"
+"""
+
+# a0 added a1 times to a counter of the data section
+COUNTER = """
+    .code
+start:
+    lui t0, %hi(counter)
+    addi t0, t0, %lo(counter)
+    addi t2, x0, 0
+loop:
+    lw t1, 0(t0)
+    add t1, t1, a0
+    sw t1, 0(t0)
+    addi t2, t2, 1
+    blt t2, a1, loop
+    lw a0, 0(t0)
+    addi a7, x0, 93
+    ecall
+
+    .data
+counter:
+    .space 4
+"""
+
+
+#----- functions
+def scalar(image: bytes, inputs: List[List[int]]) -> List[Tuple[int, bytes]]:
+    """The exit status & the output of the program for each input"""
+    results = []
+    for values in inputs:
+        output = io.BytesIO()
+        simulator = Simulator(MEMORY, output)
+        simulator.load(image)
+        simulator.regs[10:10 + len(values)] = [ v & 0xffffffff for v in values ]
+        results.append((simulator.run(100000), output.getvalue()))
+    return results
+
+def batch(image: bytes, inputs: List[List[int]]) -> List[Tuple[int, bytes]]:
+    """The exit status & the output of the instances, one per input"""
+    simulator = Batch(len(inputs), MEMORY)
+    simulator.load(image)
+    for index, values in enumerate(inputs):
+        simulator.regs[index, 10:10 + len(values)] = [ v & 0xffffffff for v in values ]
+    status = simulator.run(100000)
+    return [ (value, bytes(output)) for value, output in zip(status.tolist(), simulator.outputs) ]
+
+
+#----- tests
+@pytest.mark.parametrize("source, inputs", [
+    (COLLATZ, [ [ n ] for n in (1, 2, 3, 6, 7, 27, 97) ]),
+    (COUNTER, [ [ 3, 4 ], [ -2, 5 ], [ 7, 1 ], [ 0, 9 ] ]),
+])
+def test_same_results(assemble, source, inputs):
+    """Each instance ends as the program run alone on its input"""
+    image = assemble(source)
+    expected = scalar(image, inputs)
+    assert batch(image, inputs) == expected
+    assert any(output for _, output in expected) == (source is COLLATZ)
+
+def test_decoded_store(assemble):
+    """A store into a decoded instruction fails in batch mode"""
+    image = assemble("""
+    lui t0, %hi(patch)
+    addi t0, t0, %lo(patch)
+patch:
+    addi a0, a0, 1
+    sw zero, 0(t0)
+    addi a7, x0, 93
+    ecall
+""")
+    with pytest.raises(Fault, match="decoded instructions cannot be modified"):
+        batch(image, [ [ 0 ], [ 1 ] ])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Exact encodings of the instructions & the data of a program
+
+#----- imports
+from __future__ import annotations
+
+import pytest
+
+from conftest import words
+
+
+#----- globals
+
+# a statement of each format & its words
+PROGRAM = """
+    addi a0, zero, 10
+loop:
+    addi a0, a0, -1
+    bne a0, zero, loop
+    sub t1, t2, t3
+    lui t0, 0x12345
+    sw a0, 8(t0)
+    lw a1, -4(sp)
+    jal ra, loop
+    ecall
+    .word 0xdeadbeef
+    .half 0x1234
+    .byte 1, 2
+    .ascii "RV"
+"""
+
+ENCODED = [
+    0x00a00513,     # addi a0, zero, 10
+    0xfff50513,     # addi a0, a0, -1
+    0xfe051ee3,     # bne a0, zero, -4
+    0x41c38333,     # sub t1, t2, t3
+    0x123452b7,     # lui t0, 0x12345
+    0x00a2a423,     # sw a0, 8(t0)
+    0xffc12583,     # lw a1, -4(sp)
+    0xfe9ff0ef,     # jal ra, -24
+    0x01000073,     # ecall
+    0xdeadbeef,
+]
+
+
+#----- tests
+@pytest.mark.parametrize("options", [ [], [ "--lexer", "table" ], [ "--lexer", "mmap" ], [ "--engine", "dispatch" ] ])
+def test_encodings(assemble, options):
+    """Every lexer & engine gives the same words"""
+    data = assemble(PROGRAM, options=options)
+    assert words(data[:40]) == ENCODED
+    assert data[40:] == bytes([ 0x34, 0x12, 1, 2 ]) + b"RV"
+
+def test_forward_label(assemble):
+    """A branch to a label defined later is encoded once the label is known"""
+    data = assemble("""
+    beq a0, a1, done
+    addi a0, a0, 1
+done:
+    ecall
+""")
+    assert words(data) == [ 0x00b50463, 0x00150513, 0x01000073 ]
+
+def test_unknown_label(assemble, capsys):
+    """A label never defined fails the assembly"""
+    with pytest.raises(SyntaxError):
+        assemble("    jal ra, nowhere\n")
+    assert "nowhere" in capsys.readouterr().out
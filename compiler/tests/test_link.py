@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Link of the modules through their global labels
+
+#----- imports
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from conftest import words
+from packages.driver import main
+from packages.simulator import Simulator
+
+
+#----- globals
+
+# the main module calls double, defined in the other one, both have a local loop
+MAIN = """
+    .global main
+main:
+    addi a0, zero, 5
+loop:
+    jal ra, double
+    addi a7, zero, 93
+    ecall
+"""
+
+DOUBLE = """
+    .global double
+loop:
+    addi zero, zero, 0
+double:
+    add a0, a0, a0
+    jalr zero, 0(ra)
+"""
+
+LINKED = [
+    0x00500513,     # addi a0, zero, 5
+    0x010000ef,     # jal ra, +16 (double at 0x14)
+    0x05d00893,     # addi a7, zero, 93
+    0x01000073,     # ecall
+    0x00000013,     # addi zero, zero, 0
+    0x00a50533,     # add a0, a0, a0
+    0x00008067,     # jalr zero, 0(ra)
+]
+
+
+#----- functions
+def run(data: bytes) -> int:
+    """The exit status of a program"""
+    simulator = Simulator(1 << 16, io.BytesIO())
+    simulator.load(data)
+    return simulator.run(1000)
+
+
+#----- tests
+def test_global(assemble):
+    """A global label is resolved in the module placed after the caller"""
+    data = assemble(MAIN, DOUBLE)
+    assert words(data) == LINKED
+    assert run(data) == 10
+
+def test_object_files(tmp_path, monkeypatch):
+    """The object files, written in the current directory, link into the
+    same program as the sources"""
+    monkeypatch.chdir(tmp_path)
+    sources = []
+    for name, source in (("main", MAIN), ("double", DOUBLE)):
+        path = tmp_path / f"{name}.s"
+        path.write_text(source)
+        sources.append(str(path))
+
+    assert main([ *sources, "-c" ]) == 0
+    assert main([ "main.o", "double.o", "-o", "out.bin" ]) == 0
+    assert words((tmp_path / "out.bin").read_bytes()) == LINKED
+
+def test_local_label(assemble, capsys):
+    """A label without .global is not visible from the other modules"""
+    with pytest.raises(SyntaxError):
+        assemble(MAIN, DOUBLE.replace(".global double", ".global loop"))
+    assert "double" in capsys.readouterr().out
+
+def test_global_clash(assemble, capsys):
+    """A global label is defined by a single module"""
+    with pytest.raises(SyntaxError):
+        assemble(MAIN, DOUBLE.replace(".global double", ".global main\nmain:"))
+    assert "Error: global label [main] is already defined!" in capsys.readouterr().out
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# vim: filetype=python
+#
+# This source file is subject to the MIT License
+# that is bundled with this package in the file LICENSE.txt.
+# It is also available through the Internet at this address:
+# https://opensource.org/license/mit
+#
+# @author	Sebastien LEGRAND
+# @license	MIT License
+#
+# @brief	Relaxation of the branches & jumps whose target is out of range
+
+#----- imports
+from __future__ import annotations
+
+import pytest
+
+from conftest import words
+
+
+#----- tests
+def test_far_branch(assemble):
+    """A branch beyond 4 KiB becomes the inverted branch over a jal"""
+    data = assemble("""
+    beq a0, a1, far
+    .space 0x2000
+far:
+    ecall
+""")
+    # bne a0, a1, +8 then jal x0, +0x2004, the label moved by 4 bytes
+    assert words(data[:8]) == [ 0x00b51463, 0x0040206f ]
+    assert words(data[0x2008:]) == [ 0x01000073 ]
+
+def test_far_backward_branch(assemble):
+    """The labels before a branch relaxed keep their address"""
+    data = assemble("""
+back:
+    addi a0, a0, 1
+    .space 0x2000
+    blt a0, a1, back
+    ecall
+""")
+    # bge a0, a1, +8 then jal x0, -0x2008
+    assert words(data[0x2004:]) == [ 0x00b55463, 0xff9fd06f, 0x01000073 ]
+
+def test_far_call(assemble):
+    """A jal that links beyond 1 MiB becomes auipc & jalr on its link register"""
+    data = assemble("""
+    jal ra, away
+    .space 0x200000
+away:
+    ecall
+""")
+    # auipc ra, 0x200 then jalr ra, 8(ra)
+    assert words(data[:8]) == [ 0x00200097, 0x008080e7 ]
+    assert words(data[0x200008:]) == [ 0x01000073 ]
+
+@pytest.mark.parametrize("jump", [ "jal x0, away", "beq a0, a1, away" ])
+def test_out_of_range(assemble, capsys, jump):
+    """A jump without link register & a branch beyond 1 MiB are rejected"""
+    with pytest.raises(SyntaxError):
+        assemble(f"""
+    {jump}
+    .space 0x200000
+away:
+    ecall
+""")
+    assert "Error: branch target out of range at address [0x0]!" in capsys.readouterr().out
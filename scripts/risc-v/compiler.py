@@ -43,32 +43,5 @@ args = parser.parse_args()
 tokenizer = Tokenizer(args.file)
 tokenizer.openFile()
 
-string = ""
-while(True):
-    c = tokenizer.next()
-    if not c:
-        break
-
-    # remove comments
-    if c in ['#', ";"]:
-        while(c != '\n'):
-            c = tokenizer.next()
-
-    # remove empty line and white space in front
-    if c in [' ', '\n', '\t'] and len(string) == 0:
-        continue
-
-    # special case for label
-    if c == ':':
-        string = string + c
-        token = tokenizer.identify(string)
-        printToken(token)
-        string = ""
-
-    elif c in [' ',',','(',')','\n']:
-        token = tokenizer.identify(string)
-        printToken(token)
-        string = ""
-
-    else:
-        string = string + c
+for token in tokenizer.tokens():
+    printToken(token)
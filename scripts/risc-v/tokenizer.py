@@ -5,8 +5,9 @@
 
 #----- imports
 from __future__ import annotations
-from typing import TextIO, Tuple, Set, Any
+from typing import TextIO, Tuple, Set, Any, Iterator
 
+import re
 from enum import IntEnum, auto
 
 from architecture import REGISTERS, OPCODES
@@ -23,6 +24,12 @@ class TOKEN_ID(IntEnum):
     DIRECTIVE = auto()
     UNKNOWN = (1 << 8) - 1
 
+# words are delimited by spaces, commas & parenthesis, labels end with ':'
+RE_WORDS = re.compile(r'[#;][^\n]*|([^\s,()#;:]+:?)')
+
+# size of the chunks read from the file
+CHUNK_SIZE = 1 << 20
+
 #----- class
 class Tokenizer:
     def __init__(self, filename: str) -> None:
@@ -33,13 +40,28 @@ class Tokenizer:
     def openFile(self) -> None:
         self.fh = open(self.filename, "r")
 
-    def next(self) -> str:
-        return self.fh.read(1)
-
-    def peek(self) -> str:
-        c = self.fh.read(1)
-        self.fh.seek(-1, 1)
-        return c
+    def tokens(self) -> Iterator[Tuple[TOKEN_ID, str, Any]]:
+        # read the file by chunks, only complete lines are scanned
+        pending = ""
+        while True:
+            chunk = self.fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            chunk = pending + chunk
+            end = chunk.rfind('\n') + 1
+            pending = chunk[end:]
+            yield from self.scan(chunk, end)
+
+        # last line without a newline
+        yield from self.scan(pending, len(pending))
+
+    def scan(self, chunk: str, end: int) -> Iterator[Tuple[TOKEN_ID, str, Any]]:
+        identify = self.identify
+        for match in RE_WORDS.finditer(chunk, 0, end):
+            word = match.group(1)
+            if word:
+                yield identify(word)
 
     def identify(self, string) -> Tuple[TOKEN_ID, str, Any]:
         if string in OPCODES: